@@ -0,0 +1,447 @@
+"""This module contains the animation support of PixelDraw.
+
+A script becomes an animation by separating its frames with `---` lines. The
+canvas carries over from one frame to the next, and the AnimationRecorder
+stores every frame as a delta against the previous one: the smallest
+rectangle holding the cells that changed, with their palette indices. The
+canvas keeps the bounding box of the cells drawn since the last frame, so
+capturing a frame only compares that box with a copy of the previous frame;
+memory and encoding time grow with how much changes between frames, not
+with the number of frames times the canvas size.
+
+Animations are exported as animated GIFs, whose image data is compressed by
+the pure-Python LZW encoder below and where every frame only covers its
+delta rectangle, or as a sequence of PPM images.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import os
+import struct
+from array import array
+
+from ColorsPD import resolve_color, rgb_bytes
+from ExportPD import BACKGROUND_COLOR, write_ppm
+from FramebufferPD import Framebuffer
+
+# Supported output formats by file extension (anything else is a directory of PPM frames)
+ANIMATION_FORMATS = {".gif": "gif"}
+
+GIF_MAX_COLORS = 256              # Entries of a GIF color table, background included
+GIF_MAX_SIDE = 0xFFFF             # Largest GIF width or height in pixels
+GIF_MAX_CODE = 1 << 12            # LZW codes are at most 12 bits wide
+GIF_BLOCK_SIZE = 255              # Largest image data sub-block
+
+
+class TrackingFramebuffer(Framebuffer):
+    """
+    Dense framebuffer that also keeps the bounding box of the cells drawn
+    since take_dirty() was last called.
+    """
+
+    def __init__(self, width: int, height: int):
+        super().__init__(width, height)
+        self.dirty = None             # (x0, y0, x1, y1) of the drawn cells, end exclusive
+
+    def _touch(self, x: int, y: int, w: int, h: int):
+        """Grows the dirty box to include a drawn rectangle."""
+        dirty = self.dirty
+        if dirty is None:
+            self.dirty = (x, y, x + w, y + h)
+        else:
+            self.dirty = (min(dirty[0], x), min(dirty[1], y), max(dirty[2], x + w), max(dirty[3], y + h))
+
+    def set_pixel(self, x: int, y: int, color):
+        super().set_pixel(x, y, color)
+        self._touch(x, y, 1, 1)
+
+    def fill_span(self, x: int, y: int, length: int, color):
+        if length > 0:
+            super().fill_span(x, y, length, color)
+            self._touch(x, y, length, 1)
+
+    def fill_rect(self, x: int, y: int, w: int, h: int, color):
+        if w > 0 and h > 0:
+            super().fill_rect(x, y, w, h, color)
+            self._touch(x, y, w, h)
+
+    def clear(self):
+        super().clear()
+        self._touch(0, 0, self.width, self.height)
+
+    def take_dirty(self):
+        """Returns the dirty box (None if nothing was drawn) and starts a new one."""
+        dirty = self.dirty
+        self.dirty = None
+        return dirty
+
+
+# pylint: disable=too-few-public-methods
+class AnimationFrame:
+    """This class holds one animation frame as a delta against the frame before it."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, x: int = 0, y: int = 0, width: int = 0, height: int = 0, cells: array = None):
+        self.x = x                    # Top-left cell of the changed rectangle
+        self.y = y
+        self.width = width            # Size of the changed rectangle, 0 when nothing changed
+        self.height = height
+        self.cells = cells            # Palette indices of the rectangle, row-major (None when unchanged)
+
+    def __repr__(self):
+        if self.cells is None:
+            return "AnimationFrame(unchanged)"
+        return f"AnimationFrame({self.x}, {self.y}, {self.width}x{self.height})"
+
+
+class Animation:
+    """
+    The frames of a compiled animation.
+
+    The first frame is a delta against an unpainted canvas, every other
+    frame against the frame before it. Palette indices refer to palette,
+    which is shared by all frames.
+    """
+
+    def __init__(self, width: int, height: int, palette: list, frames: list):
+        self.width = width
+        self.height = height
+        self.palette = palette
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __repr__(self):
+        return f"Animation({self.width}x{self.height}, {len(self.frames)} frames)"
+
+    def framebuffers(self):
+        """Yields the full canvas of every frame, in order.
+
+        A single framebuffer is updated in place with each delta, so it must
+        be used (or copied) before the next one is requested.
+
+        Yields:
+            Framebuffer: The canvas as shown by the frame
+        """
+        canvas = Framebuffer(self.width, self.height)
+        for color in self.palette[1:]:
+            canvas.color_index(color)
+        for frame in self.frames:
+            if frame.cells is not None:
+                _paste(canvas.cells, self.width, frame)
+            yield canvas
+
+
+def _paste(cells: array, width: int, frame: AnimationFrame):
+    """Writes the delta rectangle of a frame into a row-major cell array."""
+    rectangle = frame.cells
+    if rectangle.typecode != cells.typecode:
+        rectangle = array(cells.typecode, rectangle)
+    for row in range(frame.height):
+        start = (frame.y + row) * width + frame.x
+        cells[start:start + frame.width] = rectangle[row * frame.width:(row + 1) * frame.width]
+
+
+class AnimationRecorder:
+    """
+    Builds an Animation while a SemanticAnalyzer runs.
+
+    Pass new_canvas as the analyzer's framebuffer_factory and capture as its
+    on_frame hook, run the analyzer, then call finish().
+    """
+
+    def __init__(self):
+        self.framebuffer = None       # Canvas the analyzer draws into
+        self.previous = None          # Cells of the last captured frame
+        self.frames = []              # Captured AnimationFrame deltas
+
+    def new_canvas(self, width: int, height: int) -> TrackingFramebuffer:
+        """Framebuffer factory: the canvas of the first `size`, shared by every frame.
+
+        The analyzer only asks for a new canvas when the dimensions change.
+
+        Raises:
+            Exception: If a later `size` changes the canvas dimensions
+        """
+        if self.framebuffer is not None:
+            raise Exception("Semantic Error: Every frame of an animation must have the same canvas size.")
+        self.framebuffer = TrackingFramebuffer(width, height)
+        self.previous = array(self.framebuffer.typecode, [0]) * (width * height)
+        return self.framebuffer
+
+    def capture(self, analyzer=None):  # pylint: disable=unused-argument
+        """Store the canvas as the next frame (the analyzer's on_frame hook)."""
+        framebuffer = self.framebuffer
+        if framebuffer.typecode != self.previous.typecode:
+            # The palette outgrew one byte per cell
+            self.previous = array(framebuffer.typecode, self.previous)
+        self.frames.append(self._delta(framebuffer.take_dirty()))
+
+    def _delta(self, dirty) -> AnimationFrame:
+        """Returns the frame holding the cells of the dirty box that changed.
+
+        Every row of the box is compared with the previous frame as one
+        integer, whose lowest and highest set bits locate its first and last
+        changed cells; the box is shrunk to the changed cells and the previous
+        frame is updated with them.
+        """
+        if dirty is None:
+            return AnimationFrame()
+        x0, y0, x1, y1 = dirty
+        cells = self.framebuffer.cells
+        previous = self.previous
+        width = self.framebuffer.width
+        bits = 8 * cells.itemsize
+        left, right, top, bottom = x1, x0, None, None
+        for y in range(y0, y1):
+            start = y * width
+            row = cells[start + x0:start + x1]
+            old_row = previous[start + x0:start + x1]
+            if row == old_row:
+                continue
+            difference = int.from_bytes(row.tobytes(), "little") ^ int.from_bytes(old_row.tobytes(), "little")
+            left = min(left, x0 + ((difference & -difference).bit_length() - 1) // bits)
+            right = max(right, x0 + (difference.bit_length() - 1) // bits + 1)
+            if top is None:
+                top = y
+            bottom = y + 1
+        if top is None:
+            return AnimationFrame()
+        rectangle = array(cells.typecode)
+        for y in range(top, bottom):
+            start = y * width
+            row = cells[start + left:start + right]
+            rectangle.extend(row)
+            previous[start + left:start + right] = row
+        return AnimationFrame(left, top, right - left, bottom - top, rectangle)
+
+    def finish(self, analyzer) -> Animation:
+        """
+        Capture the last frame and return the animation.
+
+        The canvas at the end of the program is the last frame, unless
+        nothing was drawn after the last frame break.
+
+        Args:
+            analyzer (SemanticAnalyzer): The analyzer that ran the program
+
+        Returns:
+            Animation: Every captured frame
+
+        Raises:
+            Exception: If the canvas size was never defined
+        """
+        analyzer.result()
+        framebuffer = self.framebuffer
+        if not self.frames or framebuffer.dirty is not None:
+            self.capture(analyzer)
+        return Animation(framebuffer.width, framebuffer.height, framebuffer.palette, self.frames)
+
+
+def lzw_encode(data: bytes, min_code_size: int) -> bytes:
+    """Compresses palette indices with the variable-length LZW of GIF image data.
+
+    Codes start min_code_size + 1 bits wide and grow up to 12 bits; when the
+    code table is full a clear code starts a new one. Every table entry is
+    keyed by (prefix code << 8) | next index, so lookups are plain int keys.
+
+    Args:
+        data (bytes): One palette index per pixel, all below 1 << min_code_size
+        min_code_size (int): Bits of the palette indices, at least 2
+
+    Returns:
+        bytes: The codes packed least significant bit first, without the
+        sub-block framing
+    """
+    clear = 1 << min_code_size
+    end = clear + 1
+    output = bytearray()
+    # Every image starts with a clear code
+    bits = clear
+    bit_count = code_size = min_code_size + 1
+    next_code = end + 1
+    table = {}
+    prefix = data[0] if data else None
+    for index in data[1:]:
+        key = prefix << 8 | index
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        bits |= prefix << bit_count
+        bit_count += code_size
+        if next_code < GIF_MAX_CODE:
+            table[key] = next_code
+            next_code += 1
+            if next_code > 1 << code_size:
+                code_size += 1
+        else:
+            bits |= clear << bit_count
+            bit_count += code_size
+            table = {}
+            code_size = min_code_size + 1
+            next_code = end + 1
+        while bit_count >= 8:
+            output.append(bits & 0xFF)
+            bits >>= 8
+            bit_count -= 8
+        prefix = index
+    if prefix is not None:
+        bits |= prefix << bit_count
+        bit_count += code_size
+        # The decoder adds one last entry for this code, which may widen the end code
+        if next_code == 1 << code_size and code_size < 12:
+            code_size += 1
+    bits |= end << bit_count
+    bit_count += code_size
+    output += bits.to_bytes((bit_count + 7) // 8, "little")
+    return bytes(output)
+
+
+def _sub_blocks(data: bytes) -> bytes:
+    """Splits image data into length-prefixed sub-blocks, terminated by an empty one."""
+    blocks = [bytes((len(data[start:start + GIF_BLOCK_SIZE]),)) + data[start:start + GIF_BLOCK_SIZE]
+              for start in range(0, len(data), GIF_BLOCK_SIZE)]
+    return b"".join(blocks) + b"\x00"
+
+
+def _scaled_indices(cells: array, width: int, height: int, pixel_size: int) -> bytes:
+    """Returns the indices of a rectangle upscaled to pixel_size x pixel_size blocks, one byte each."""
+    # Wide cells are narrowed index by index: bytes(cells) would copy their 2-byte memory
+    data = cells.tobytes() if cells.itemsize == 1 else bytes(cells.tolist())
+    if pixel_size == 1:
+        return data
+    blocks = [bytes((index,)) * pixel_size for index in range(GIF_MAX_COLORS)]
+    scaled = bytearray()
+    for row in range(height):
+        scaled += b"".join([blocks[index] for index in data[row * width:(row + 1) * width]]) * pixel_size
+    return bytes(scaled)
+
+
+# pylint: disable=too-many-locals
+def write_gif(animation: Animation, stream, pixel_size: int = 1, delay: int = 100, loop: int = 0):
+    """Writes the animation as an animated GIF (GIF89a) to a binary stream.
+
+    The first frame covers the whole canvas; every later frame only covers
+    its delta rectangle and is drawn over the frame before it. Frames
+    without changes lengthen the display time of the frame before them.
+
+    Args:
+        animation (Animation): Compiled animation
+        stream: Writable binary file-like object
+        pixel_size (int): Size of each cell in image pixels
+        delay (int): Display time of every frame in milliseconds
+        loop (int): Times the animation is played, 0 for forever
+
+    Raises:
+        ValueError: If the animation uses too many colors or is too large for GIF
+    """
+    palette = animation.palette
+    if len(palette) > GIF_MAX_COLORS:
+        raise ValueError(f"GIF animations use at most {GIF_MAX_COLORS - 1} colors, "
+                         f"this one uses {len(palette) - 1}")
+    width = animation.width * pixel_size
+    height = animation.height * pixel_size
+    if not 0 < width <= GIF_MAX_SIDE or not 0 < height <= GIF_MAX_SIDE:
+        raise ValueError(f"GIF images are 1 to {GIF_MAX_SIDE} pixels wide and high, not {width}x{height}")
+
+    # Global color table: index 0 is the background of unpainted cells
+    bits = max(2, (len(palette) - 1).bit_length())
+    background = rgb_bytes(resolve_color(BACKGROUND_COLOR))
+    table = b"".join(background if color is None else rgb_bytes(color) for color in palette)
+    table += b"\x00" * (3 * (1 << bits) - len(table))
+    stream.write(b"GIF89a")
+    stream.write(struct.pack("<HHBBB", width, height, 0x80 | (bits - 1) << 4 | (bits - 1), 0, 0))
+    stream.write(table)
+    # NETSCAPE2.0 application extension: loop count
+    stream.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+
+    # Display time of every frame with changes, in hundredths of a second
+    centiseconds = max(0, round(delay / 10))
+    shown = []
+    for number, frame in enumerate(animation.frames):
+        if shown and frame.cells is None:
+            shown[-1][1] += centiseconds
+        else:
+            shown.append([number, centiseconds])
+
+    for number, duration in shown:
+        frame = animation.frames[number]
+        if number == 0:
+            # The first frame is drawn over the unpainted canvas
+            cells = array(Framebuffer.TYPECODE, [0]) * (animation.width * animation.height)
+            if frame.cells is not None:
+                _paste(cells, animation.width, frame)
+            frame = AnimationFrame(0, 0, animation.width, animation.height, cells)
+        # Graphic control extension: do not dispose, so the next delta is drawn over this frame
+        stream.write(b"\x21\xf9\x04\x04" + struct.pack("<H", min(duration, 0xFFFF)) + b"\x00\x00")
+        stream.write(b"\x2c" + struct.pack("<HHHHB", frame.x * pixel_size, frame.y * pixel_size,
+                                           frame.width * pixel_size, frame.height * pixel_size, 0))
+        indices = _scaled_indices(frame.cells, frame.width, frame.height, pixel_size)
+        stream.write(bytes((bits,)) + _sub_blocks(lzw_encode(indices, bits)))
+    stream.write(b"\x3b")
+
+
+def write_ppm_frames(animation: Animation, directory: str, pixel_size: int = 1, grid: bool = False,
+                     prefix: str = "frame") -> list:
+    """Writes every frame as a complete binary PPM image into a directory.
+
+    The frames are rebuilt one after the other in a single canvas, so
+    memory does not grow with the number of frames.
+
+    Args:
+        animation (Animation): Compiled animation
+        directory (str): Output directory, created if needed
+        pixel_size (int): Size of each cell in image pixels
+        grid (bool): Whether to draw the gray grid outline
+        prefix (str): File name prefix, followed by the frame number
+
+    Returns:
+        list: Paths of the written images, in frame order
+    """
+    os.makedirs(directory, exist_ok=True)
+    digits = max(4, len(str(len(animation.frames) - 1)))
+    paths = []
+    for number, framebuffer in enumerate(animation.framebuffers()):
+        path = os.path.join(directory, f"{prefix}_{number:0{digits}d}.ppm")
+        with open(path, "wb") as stream:
+            write_ppm(framebuffer, stream, pixel_size, grid)
+        paths.append(path)
+    return paths
+
+
+# pylint: disable=too-many-arguments
+def export_animation(animation: Animation, target, image_format: str = None, pixel_size: int = 1,
+                     grid: bool = False, delay: int = 100):
+    """Writes an animation as a GIF file or stream, or as a directory of PPM frames.
+
+    Args:
+        animation (Animation): Compiled animation
+        target: GIF file path or writable binary stream, or PPM output directory
+        image_format (str): "gif" or "ppm", guessed from the path when omitted
+            (paths not ending in .gif are PPM directories)
+        pixel_size (int): Size of each cell in image pixels
+        grid (bool): Whether to draw the gray grid outline (PPM frames only)
+        delay (int): Display time of every frame in milliseconds (GIF only)
+
+    Raises:
+        ValueError: If the format is unknown or the animation does not fit it
+    """
+    if image_format is None:
+        if not isinstance(target, (str, os.PathLike)):
+            raise ValueError("An animation format is required when writing to a stream.")
+        image_format = ANIMATION_FORMATS.get(os.path.splitext(os.fspath(target))[1].lower(), "ppm")
+    if image_format == "gif":
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "wb") as stream:
+                write_gif(animation, stream, pixel_size, delay)
+        else:
+            write_gif(animation, target, pixel_size, delay)
+    elif image_format == "ppm":
+        if not isinstance(target, (str, os.PathLike)):
+            raise ValueError("PPM frames are written to a directory, not a stream.")
+        write_ppm_frames(animation, os.fspath(target), pixel_size, grid)
+    else:
+        raise ValueError(f"Unsupported animation format: '{image_format}' (use gif or ppm)")
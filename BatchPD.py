@@ -0,0 +1,237 @@
+"""This module compiles many PixelDraw scripts at once over a process pool.
+
+Every worker process keeps its own CompilerPixelDraw configured like the
+template compiler, and scripts are fanned out to the workers a few at a time.
+Each script becomes a BatchResult holding either the compact raster
+(Framebuffer.to_bytes()), the path of the image written for it, or the error
+it raised, so one bad script never stops the batch.
+
+Usage:
+    for result in compile_many(["size 2x2\\ncolor red\\npoint 0 0", Path("logo.pd")]):
+        if result.error is None:
+            print(result.width, result.height)
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from CompilerPD import CompilerPixelDraw
+from FramebufferPD import Framebuffer
+
+# Compiler attributes copied from the template compiler into every worker. A
+# cache arrives empty but shares its disk tier; raster_workers is not copied,
+# since the batch already keeps the CPUs busy with whole scripts.
+SETTINGS = ("pixel_size", "budget", "optimize", "streaming", "cache", "max_dense_cells", "spill_dir")
+
+# Scripts submitted ahead per worker; bounds memory for very long batches
+PENDING_PER_WORKER = 4
+
+# Compiler of the current worker process, created by init_worker()
+_WORKER_COMPILER = None
+
+
+# pylint: disable=too-few-public-methods, too-many-instance-attributes
+class BatchResult:
+    """This class holds the outcome of compiling one script of a batch."""
+
+    def __init__(self, index: int, name: str):
+        self.index = index            # Position of the script in the batch
+        self.name = name              # Source path, or None for inline code
+        self.width = None             # Canvas width in cells
+        self.height = None            # Canvas height in cells
+        self.raster = None            # Framebuffer.to_bytes() when no file was written
+        self.output = None            # Path of the written image, if any
+        self.error = None             # Error message if the script failed
+        self.error_type = None        # Class name of that error
+
+    @property
+    def framebuffer(self) -> Framebuffer:
+        """The compiled canvas rebuilt from the raster (None without a raster)."""
+        return None if self.raster is None else Framebuffer.from_bytes(self.raster)
+
+    def __repr__(self):
+        if self.error is not None:
+            return f"BatchResult({self.index}, {self.name!r}, error={self.error!r})"
+        return f"BatchResult({self.index}, {self.name!r}, {self.width}x{self.height})"
+
+
+def init_worker(settings: dict):
+    """
+    Create the compiler used by this worker process (the pool initializer).
+
+    Args:
+        settings (dict): Values of the SETTINGS attributes of the template compiler
+    """
+    global _WORKER_COMPILER  # pylint: disable=global-statement
+    _WORKER_COMPILER = CompilerPixelDraw()
+    for name, value in settings.items():
+        setattr(_WORKER_COMPILER, name, value)
+
+
+# pylint: disable=too-many-arguments
+def _compile_one(index: int, source, stem: str, output_dir: str, image_format: str, grid: bool) -> BatchResult:
+    """
+    Compile one script inside a worker, capturing any error.
+
+    Args:
+        index (int): Position of the script in the batch
+        source: Source code (str) or path of a source file (os.PathLike)
+        stem (str): Name of the written image without its extension (see _output_stems())
+        output_dir (str): Directory to write the image to, None to return the raster
+        image_format (str): "png" or "ppm" for written images
+        grid (bool): Whether written images get the gray grid outline
+
+    Returns:
+        BatchResult: The outcome of the script
+    """
+    name = os.fspath(source) if isinstance(source, os.PathLike) else None
+    result = BatchResult(index, name)
+    try:
+        if name is not None:
+            with open(name, encoding="utf-8") as source_file:
+                code = source_file.read()
+        else:
+            code = source
+        compiler = _WORKER_COMPILER
+        if output_dir is None:
+            result.width, result.height, framebuffer = compiler.rasterize(code)
+            result.raster = framebuffer.to_bytes()
+        else:
+            result.output = os.path.join(output_dir, f"{stem}.{image_format}")
+            result.width, result.height = compiler.compile_to_image(code, result.output, image_format, grid)
+    except Exception as error:  # pylint: disable=broad-except
+        result.error = str(error)
+        result.error_type = type(error).__name__
+    return result
+
+
+def compile_chunk(jobs: list, output_dir: str, image_format: str, grid: bool) -> list:
+    """
+    Compile a chunk of (index, source, stem) jobs inside a worker set up by init_worker().
+
+    Args:
+        jobs (list): (index, source, stem) tuples, see _compile_one(); the
+            stem is only used when output_dir is given
+        output_dir (str): Directory to write the images to, None to return the rasters
+        image_format (str): "png" or "ppm" for written images
+        grid (bool): Whether written images get the gray grid outline
+
+    Returns:
+        list: One BatchResult per job, in the order of jobs
+    """
+    return [_compile_one(index, source, stem, output_dir, image_format, grid) for index, source, stem in jobs]
+
+
+def _output_stems(sources):
+    """
+    Yield (index, source, stem) jobs, the stem naming the image written for the source.
+
+    Images are named after the source file without its extension, or after
+    the batch index for inline code. A name already given to an earlier
+    script of the batch (compared case-insensitively, for file systems that
+    ignore case) gets the batch index appended, so no image overwrites
+    another.
+    """
+    used = set()
+    for index, source in enumerate(sources):
+        if isinstance(source, os.PathLike):
+            stem = os.path.splitext(os.path.basename(os.fspath(source)))[0]
+        else:
+            stem = str(index)
+        candidate = stem
+        suffix = 0
+        while candidate.casefold() in used:
+            suffix += 1
+            candidate = f"{stem}-{index}" if suffix == 1 else f"{stem}-{index}-{suffix}"
+        used.add(candidate.casefold())
+        yield index, source, candidate
+
+
+# pylint: disable=too-many-arguments, too-many-locals
+def compile_many(sources, output_dir: str = None, workers: int = None, ordered: bool = True,
+                 image_format: str = "png", grid: bool = False, compiler: CompilerPixelDraw = None,
+                 chunksize: int = 1):
+    """
+    Compile an iterable of scripts over a pool of worker processes.
+
+    Args:
+        sources: Iterable of source code strings and/or source file paths (os.PathLike)
+        output_dir (str): Write every image into this directory instead of
+            returning rasters; files are named after the source file (or the
+            batch index for inline code), with the batch index appended when
+            an earlier script already took the name
+        workers (int): Number of worker processes, defaults to the CPU count;
+            0 compiles in the calling process
+        ordered (bool): Yield results in input order, or as soon as they complete
+        image_format (str): "png" or "ppm" for written images
+        grid (bool): Whether written images get the gray grid outline
+        compiler (CompilerPixelDraw): Template whose settings the workers copy
+        chunksize (int): Scripts sent to a worker per task; larger chunks
+            amortize the inter-process overhead of many tiny scripts
+
+    Yields:
+        BatchResult: One result per script
+    """
+    template = compiler if compiler is not None else CompilerPixelDraw()
+    settings = {name: getattr(template, name) for name in SETTINGS}
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers == 0:
+        init_worker(settings)
+        for index, source, stem in _output_stems(sources):
+            yield _compile_one(index, source, stem, output_dir, image_format, grid)
+        return
+
+    limit = workers * PENDING_PER_WORKER
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(settings,)) as executor:
+        # (jobs, future) of the submitted chunks, oldest first
+        pending = deque()
+        chunk = []
+        for job in _output_stems(sources):
+            chunk.append(job)
+            if len(chunk) < chunksize:
+                continue
+            pending.append((chunk, executor.submit(compile_chunk, chunk, output_dir, image_format, grid)))
+            chunk = []
+            if len(pending) >= limit:
+                yield from _drain(pending, ordered, len(pending) - limit + 1)
+        if chunk:
+            pending.append((chunk, executor.submit(compile_chunk, chunk, output_dir, image_format, grid)))
+        yield from _drain(pending, ordered, len(pending))
+
+
+def _drain(pending: deque, ordered: bool, count: int):
+    """
+    Yield the results of count pending chunks.
+
+    In order, the oldest chunks are awaited; otherwise whichever finish first.
+    """
+    for _ in range(count):
+        if ordered:
+            entry = pending.popleft()
+        else:
+            done, _not_done = wait([future for _jobs, future in pending], return_when=FIRST_COMPLETED)
+            entry = next(entry for entry in pending if entry[1] in done)
+            pending.remove(entry)
+        yield from _results(*entry)
+
+
+def _results(jobs: list, future) -> list:
+    """Return the results of a chunk, turning a failed worker into error results."""
+    try:
+        return future.result()
+    except Exception as error:  # pylint: disable=broad-except
+        results = []
+        for index, source, _stem in jobs:
+            result = BatchResult(index, os.fspath(source) if isinstance(source, os.PathLike) else None)
+            result.error = str(error) or type(error).__name__
+            result.error_type = type(error).__name__
+            results.append(result)
+        return results
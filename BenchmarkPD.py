@@ -0,0 +1,394 @@
+"""This module contains the benchmark harness of the PixelDraw compiler.
+
+Programs are generated from a BenchmarkSpec (canvas size, instruction count,
+rectangle area distribution, repeat nesting, number of colors), so the same
+workload can be rebuilt on any version of the compiler. Every phase is timed
+on its own - LexicalAnalyzer.lex, SintacticAnalyzerPixelDraw.parse,
+SemanticAnalyzer.analyze and the headless image export - and reported as
+throughput (tokens/s, pixels/s) together with the peak memory it allocated.
+
+Usage:
+
+    python BenchmarkPD.py -o bench.json
+    python BenchmarkPD.py -o bench.json --compare baseline.json
+
+Timings are the best of several runs without memory tracing; the peak
+memory of every phase is measured in one extra run under tracemalloc,
+which would otherwise slow the timed runs down.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import argparse
+import io
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from ExportPD import export_image
+from LexicalPd import LexicalAnalyzer
+from SemanticPD import SemanticAnalyzer
+from SintacticPD import SintacticAnalyzerPixelDraw
+
+# Version of the result file layout
+FORMAT_VERSION = 1
+
+PHASES = ("lex", "parse", "analyze", "render")
+AREA_DISTRIBUTIONS = ("uniform", "loguniform")
+
+
+# pylint: disable=too-few-public-methods, too-many-instance-attributes
+class BenchmarkSpec:
+    """This class holds the parameters of one generated benchmark program."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, name: str, width: int = 256, height: int = 256, instructions: int = 10000,
+                 min_area: int = 1, max_area: int = 256, area_distribution: str = "loguniform",
+                 point_ratio: float = 0.25, repeat_ratio: float = 0.0, repeat_depth: int = 1,
+                 repeat_count: int = 4, colors: int = 8, seed: int = 0):
+        """
+        Args:
+            name (str): Name of the benchmark in the results
+            width (int): Canvas width in cells
+            height (int): Canvas height in cells
+            instructions (int): Number of statements to generate (size excluded)
+            min_area (int): Smallest rectangle area in cells
+            max_area (int): Largest rectangle area in cells
+            area_distribution (str): "uniform" or "loguniform" distribution of
+                the rectangle areas between min_area and max_area
+            point_ratio (float): Fraction of draws that are points instead of rectangles
+            repeat_ratio (float): Probability that a statement opens a repeat block
+            repeat_depth (int): Nesting depth of every repeat block
+            repeat_count (int): Iterations of every repeat
+            colors (int): Number of distinct colors used
+            seed (int): Seed of the random generator
+        """
+        if area_distribution not in AREA_DISTRIBUTIONS:
+            raise ValueError(f"Unknown area distribution: '{area_distribution}'")
+        self.name = name
+        self.width = width
+        self.height = height
+        self.instructions = instructions
+        self.min_area = min_area
+        self.max_area = max_area
+        self.area_distribution = area_distribution
+        self.point_ratio = point_ratio
+        self.repeat_ratio = repeat_ratio
+        self.repeat_depth = repeat_depth
+        self.repeat_count = repeat_count
+        self.colors = colors
+        self.seed = seed
+
+    def as_dict(self) -> dict:
+        """Returns the parameters as a plain dictionary (e.g. for JSON)."""
+        return dict(vars(self))
+
+    def __repr__(self):
+        return (f"BenchmarkSpec({self.name!r}, {self.width}x{self.height}, "
+                f"instructions={self.instructions}, colors={self.colors})")
+
+
+# Workloads run when no spec is given: one per hot path of the compiler
+DEFAULT_SUITE = (
+    BenchmarkSpec("small-rects", instructions=20000),
+    BenchmarkSpec("large-rects", width=1024, height=1024, instructions=5000,
+                  min_area=4096, max_area=262144, point_ratio=0.0),
+    BenchmarkSpec("points", instructions=50000, point_ratio=1.0, colors=2),
+    BenchmarkSpec("nested-repeats", instructions=20000, repeat_ratio=0.05, repeat_depth=3, repeat_count=3),
+    BenchmarkSpec("many-colors", instructions=20000, colors=200),
+)
+
+
+def _rectangle(rng: random.Random, spec: BenchmarkSpec) -> str:
+    """Returns a random rectangle statement that fits the canvas."""
+    if spec.area_distribution == "uniform":
+        area = rng.randint(spec.min_area, spec.max_area)
+    else:
+        area = round(spec.min_area * (spec.max_area / spec.min_area) ** rng.random())
+    # Random aspect ratio, clipped to the canvas
+    width = min(spec.width, max(1, round(area ** rng.uniform(0.25, 0.75))))
+    height = min(spec.height, max(1, area // width))
+    x = rng.randrange(spec.width - width + 1)
+    y = rng.randrange(spec.height - height + 1)
+    return f"rectangle {x} {y} {width} {height}"
+
+
+def generate_program(spec: BenchmarkSpec) -> str:
+    """
+    Generate the PixelDraw source of a benchmark.
+
+    The same spec always produces the same source.
+
+    Args:
+        spec (BenchmarkSpec): Parameters of the program
+
+    Returns:
+        str: PixelDraw source code
+    """
+    rng = random.Random(spec.seed)
+    palette = [f"#{rng.randrange(1 << 24):06X}" for _ in range(spec.colors)]
+    lines = [f"size {spec.width}x{spec.height}"]
+    depth = 0           # Repeat blocks currently open
+    remaining = 0       # Statements left in the innermost open block
+    for _ in range(spec.instructions):
+        indent = "    " * depth
+        roll = rng.random()
+        if depth == 0 and roll < spec.repeat_ratio:
+            for level in range(spec.repeat_depth):
+                lines.append("    " * level + f"repeat {spec.repeat_count} {{")
+            depth = spec.repeat_depth
+            remaining = rng.randint(1, 8)
+            continue
+        if roll < 0.1 and spec.colors:
+            lines.append(f"{indent}color {rng.choice(palette)}")
+        elif rng.random() < spec.point_ratio:
+            lines.append(f"{indent}point {rng.randrange(spec.width)} {rng.randrange(spec.height)}")
+        else:
+            lines.append(indent + _rectangle(rng, spec))
+        if depth:
+            remaining -= 1
+            if remaining == 0:
+                while depth:
+                    depth -= 1
+                    lines.append("    " * depth + "}")
+    while depth:
+        depth -= 1
+        lines.append("    " * depth + "}")
+    return "\n".join(lines) + "\n"
+
+
+def _phases(code: str, image_format: str):
+    """Yields (phase, seconds, result) while compiling and exporting a program."""
+    start = time.perf_counter()
+    tokens = LexicalAnalyzer.lex(code)
+    yield "lex", time.perf_counter() - start, tokens
+
+    start = time.perf_counter()
+    program = SintacticAnalyzerPixelDraw(tokens).parse()
+    yield "parse", time.perf_counter() - start, program
+
+    start = time.perf_counter()
+    analyzer = SemanticAnalyzer(program)
+    width, height, framebuffer = analyzer.analyze()
+    yield "analyze", time.perf_counter() - start, analyzer
+
+    start = time.perf_counter()
+    export_image(framebuffer, io.BytesIO(), image_format)
+    yield "render", time.perf_counter() - start, width * height
+
+
+def _peak_memory(code: str, image_format: str) -> dict:
+    """Returns the peak memory in bytes every phase allocated on top of the earlier phases."""
+    peaks = {}
+    tracemalloc.start()
+    try:
+        phases = _phases(code, image_format)
+        while True:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            try:
+                phase, _seconds, _result = next(phases)
+            except StopIteration:
+                break
+            peaks[phase] = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def run_benchmark(spec: BenchmarkSpec, runs: int = 3, image_format: str = "png",
+                  measure_memory: bool = True) -> dict:
+    """
+    Generate one program and benchmark every phase of its compile.
+
+    Args:
+        spec (BenchmarkSpec): Parameters of the program
+        runs (int): Timed runs; the fastest time of every phase is kept
+        image_format (str): Format of the headless export, "png" or "ppm"
+        measure_memory (bool): Whether to add a traced run for the peak memory
+
+    Returns:
+        dict: The spec, the work done and per-phase seconds, throughput and
+        peak memory, ready to be dumped as JSON
+    """
+    code = generate_program(spec)
+    best = dict.fromkeys(PHASES, float("inf"))
+    for _ in range(runs):
+        for phase, seconds, result in _phases(code, image_format):
+            best[phase] = min(best[phase], seconds)
+            if phase == "lex":
+                tokens = len(result)
+            elif phase == "analyze":
+                pixel_writes = result.pixel_writes
+            elif phase == "render":
+                cells = result
+    peaks = _peak_memory(code, image_format) if measure_memory else {}
+
+    # Work unit of every phase, the throughput is reported per second of it
+    work = {"lex": (tokens, "tokens/s"), "parse": (tokens, "tokens/s"),
+            "analyze": (pixel_writes, "pixels/s"), "render": (cells, "pixels/s")}
+    phases = {}
+    for phase in PHASES:
+        amount, unit = work[phase]
+        seconds = best[phase]
+        phases[phase] = {
+            "seconds": seconds,
+            "throughput": amount / seconds if seconds else None,
+            "unit": unit,
+            "peak_memory": peaks.get(phase),
+        }
+    return {
+        "name": spec.name,
+        "spec": spec.as_dict(),
+        "source_bytes": len(code.encode("utf-8")),
+        "tokens": tokens,
+        "pixel_writes": pixel_writes,
+        "canvas_cells": cells,
+        "phases": phases,
+    }
+
+
+def run_suite(specs=DEFAULT_SUITE, runs: int = 3, image_format: str = "png", measure_memory: bool = True,
+              progress=None) -> dict:
+    """
+    Benchmark several specs and collect the results with the environment.
+
+    Args:
+        specs: BenchmarkSpec objects to run
+        runs (int): Timed runs per benchmark
+        image_format (str): Format of the headless export
+        measure_memory (bool): Whether to measure the peak memory of every phase
+        progress: Optional hook receiving every benchmark result as it finishes
+
+    Returns:
+        dict: Results in the layout of the benchmark files
+    """
+    results = []
+    for spec in specs:
+        result = run_benchmark(spec, runs, image_format, measure_memory)
+        if progress is not None:
+            progress(result)
+        results.append(result)
+    return {
+        "format_version": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "runs": runs,
+        "image_format": image_format,
+        "benchmarks": results,
+    }
+
+
+def compare_results(baseline: dict, current: dict) -> list:
+    """
+    Compare the phase times of two benchmark files.
+
+    Only benchmarks present in both files are compared.
+
+    Args:
+        baseline (dict): Results of the reference version
+        current (dict): Results of the version under test
+
+    Returns:
+        list: (benchmark, phase, baseline seconds, current seconds, speedup)
+        tuples, where a speedup above 1 means the current version is faster
+    """
+    previous = {result["name"]: result for result in baseline["benchmarks"]}
+    rows = []
+    for result in current["benchmarks"]:
+        old = previous.get(result["name"])
+        if old is None:
+            continue
+        for phase, figures in result["phases"].items():
+            if phase not in old["phases"]:
+                continue
+            before = old["phases"][phase]["seconds"]
+            after = figures["seconds"]
+            rows.append((result["name"], phase, before, after, before / after if after else None))
+    return rows
+
+
+def _format_result(result: dict) -> str:
+    """Returns a one-line human-readable summary of a benchmark result."""
+    parts = []
+    for phase, figures in result["phases"].items():
+        memory = "" if figures["peak_memory"] is None else f", {figures['peak_memory'] / 1e6:.1f} MB"
+        parts.append(f"{phase} {figures['seconds'] * 1000:.1f} ms "
+                     f"({figures['throughput']:,.0f} {figures['unit']}{memory})")
+    return f"{result['name']}: " + "; ".join(parts)
+
+
+def main(argv=None):
+    """
+    Command-line entry point: run the benchmarks and write the results as JSON.
+
+    Args:
+        argv (list): Command-line arguments, defaults to sys.argv[1:]
+
+    Returns:
+        int: Process exit code
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the phases of the PixelDraw compiler.")
+    parser.add_argument("-o", "--output", help="JSON file receiving the results ('-' for stdout)")
+    parser.add_argument("--compare", help="earlier results file to compare the phase times with")
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per benchmark (default: 3)")
+    parser.add_argument("--format", choices=["png", "ppm"], default="png", help="headless export format")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement")
+    parser.add_argument("--only", action="append", metavar="NAME", help="run only the named suite benchmarks")
+    custom = parser.add_argument_group("custom benchmark", "replace the suite with one generated program")
+    custom.add_argument("--size", help="canvas size as WIDTHxHEIGHT")
+    custom.add_argument("--instructions", type=int, help="number of statements")
+    custom.add_argument("--area", help="rectangle areas as MIN-MAX cells")
+    custom.add_argument("--distribution", choices=AREA_DISTRIBUTIONS, help="rectangle area distribution")
+    custom.add_argument("--points", type=float, help="fraction of draws that are points")
+    custom.add_argument("--repeat-ratio", type=float, help="probability of opening a repeat block")
+    custom.add_argument("--repeat-depth", type=int, help="nesting depth of repeat blocks")
+    custom.add_argument("--repeat-count", type=int, help="iterations of every repeat")
+    custom.add_argument("--colors", type=int, help="number of distinct colors")
+    custom.add_argument("--seed", type=int, help="random seed")
+    args = parser.parse_args(argv)
+
+    options = {}
+    if args.size:
+        width, _, height = args.size.partition("x")
+        options["width"], options["height"] = int(width), int(height)
+    if args.area:
+        low, _, high = args.area.partition("-")
+        options["min_area"], options["max_area"] = int(low), int(high or low)
+    for option, value in (("instructions", args.instructions), ("area_distribution", args.distribution),
+                          ("point_ratio", args.points), ("repeat_ratio", args.repeat_ratio),
+                          ("repeat_depth", args.repeat_depth), ("repeat_count", args.repeat_count),
+                          ("colors", args.colors), ("seed", args.seed)):
+        if value is not None:
+            options[option] = value
+    if options:
+        specs = [BenchmarkSpec("custom", **options)]
+    else:
+        specs = [spec for spec in DEFAULT_SUITE if not args.only or spec.name in args.only]
+
+    # The summary goes to stderr when the JSON is written to stdout
+    report = sys.stderr if args.output == "-" else sys.stdout
+    results = run_suite(specs, args.runs, args.format, not args.no_memory,
+                        lambda result: print(_format_result(result), file=report))
+    if args.output == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        for name, phase, before, after, speedup in compare_results(baseline, results):
+            print(f"{name} {phase}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms ({speedup:.2f}x)", file=report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
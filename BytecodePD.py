@@ -0,0 +1,447 @@
+"""This module contains the compact binary instruction format of PixelDraw.
+
+A program is compiled once (lexed, parsed, optimized and its colors resolved)
+and written as bytecode; rendering nodes then memory-map the file and replay
+it straight into the semantic analyzer, without lexing or parsing anything.
+
+File layout, all little-endian:
+
+    header    magic "PDBC", format version, record fields, palette size,
+              record count
+    cost      the CostEstimate.FIELDS of the program, as unsigned 64-bit ints,
+              for tools inspecting the file; loaders never trust it and
+              recompute the cost from the records
+    palette   one unsigned 32-bit packed 0xRRGGBB color per entry
+    records   RECORD_FIELDS signed 32-bit ints per instruction: the opcode
+              and up to four operands (unused operands are 0)
+
+A repeat record holds the iteration count and the number of records of its
+body, which directly follows it; nested blocks are included in that number,
+so the end of a block is a jump range and never needs to be searched for.
+
+Loading checks the records in one pass that allocates no instruction nodes:
+malformed files (unknown opcodes, palette indices out of range, repeat bodies
+leaving their block or nested too deeply) are rejected with a ValueError
+before anything runs, and the cost used for budgets is added up on the way.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+
+from ColorsPD import hex_color, resolve_color
+from CostPD import (CostEstimate, add_counts, add_repeat, circle_writes, frame_writes, line_writes,
+                    rectangle_writes)
+from InstructionsPD import Circle, Clear, Color, Frame, FrameBreak, Line, Point, Rectangle, Repeat, Size
+
+MAGIC = b"PDBC"
+VERSION = 1
+SUFFIX = ".pdb"                        # File extension of bytecode files
+
+# Header: magic, version, fields per record, palette size, record count
+HEADER = struct.Struct("<4sHHII")
+COST = struct.Struct("<" + "Q" * len(CostEstimate.FIELDS))
+RECORD_FIELDS = 5
+RECORD_TYPECODE = "i"
+PALETTE_TYPECODE = "I"
+
+# Opcodes
+OP_SIZE = 1
+OP_COLOR = 2
+OP_POINT = 3
+OP_RECTANGLE = 4
+OP_REPEAT = 5
+OP_CLEAR = 6
+OP_LINE = 7
+OP_FRAME = 8
+OP_CIRCLE = 9
+OP_FRAME_BREAK = 10
+
+# Opcode and operand fields of every instruction type that maps to one record
+_OPERANDS = {
+    Size: (OP_SIZE, ("width", "height")),
+    Point: (OP_POINT, ("x", "y")),
+    Rectangle: (OP_RECTANGLE, ("x", "y", "width", "height")),
+    Clear: (OP_CLEAR, ()),
+    Line: (OP_LINE, ("x1", "y1", "x2", "y2")),
+    Frame: (OP_FRAME, ("x", "y", "width", "height")),
+    Circle: (OP_CIRCLE, ("x", "y", "radius")),
+    FrameBreak: (OP_FRAME_BREAK, ()),
+}
+
+# Instruction type and operand count of every opcode that maps to one record
+_DECODERS = {opcode: (instruction_type, len(fields)) for instruction_type, (opcode, fields) in _OPERANDS.items()}
+
+# Largest packed 0xRRGGBB color
+_MAX_COLOR = 0xFFFFFF
+
+# Deepest repeat nesting accepted; replaying recurses once per level
+MAX_DEPTH = 100
+
+
+def _little_endian(values: array) -> array:
+    """Returns the values in little-endian byte order (a copy on big-endian hosts)."""
+    if sys.byteorder == "big" and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+class _Encoder:
+    """Flattens an instruction tree into palette and record arrays."""
+
+    def __init__(self):
+        self.palette = array(PALETTE_TYPECODE)
+        self.colors = {}
+        self.records = array(RECORD_TYPECODE)
+
+    def block(self, instructions: list):
+        """Appends the records of a block, nested repeat bodies included."""
+        records = self.records
+        for instruction in instructions:
+            if isinstance(instruction, Repeat):
+                start = len(records)
+                records.extend((OP_REPEAT, instruction.count, 0, 0, 0))
+                self.block(instruction.body)
+                # Patch the body length now that it is known
+                records[start + 2] = (len(records) - start) // RECORD_FIELDS - 1
+                continue
+            if isinstance(instruction, Color):
+                operands = (self.color(instruction.value),)
+                opcode = OP_COLOR
+            else:
+                opcode, fields = _OPERANDS[type(instruction)]
+                operands = tuple(getattr(instruction, field) for field in fields)
+            try:
+                records.extend((opcode,) + operands + (0,) * (RECORD_FIELDS - 1 - len(operands)))
+            except OverflowError:
+                raise ValueError(f"Operand out of range for the bytecode format in {instruction!r}") from None
+
+    def color(self, value: str) -> int:
+        """Returns the palette index of a color value, resolving it on first use.
+
+        Raises:
+            Exception: If the color name is unknown
+        """
+        try:
+            color = resolve_color(value)
+        except ValueError as error:
+            raise Exception(f"Semantic Error: {error}.") from None
+        index = self.colors.get(color)
+        if index is None:
+            index = self.colors[color] = len(self.palette)
+            self.palette.append(color)
+        return index
+
+
+def encode(program: list, cost: CostEstimate) -> bytes:
+    """
+    Serializes a parsed program as bytecode.
+
+    Colors are resolved here, so an unknown color name is reported even if the
+    instruction would never run.
+
+    Args:
+        program (list): Instruction nodes, usually already optimized
+        cost (CostEstimate): Estimated cost of the program
+
+    Returns:
+        bytes: The bytecode, ready to be written to a file
+
+    Raises:
+        ValueError: If an operand does not fit in 32 bits
+        Exception: If a color name is unknown
+    """
+    encoder = _Encoder()
+    encoder.block(program)
+    palette = _little_endian(encoder.palette)
+    records = _little_endian(encoder.records)
+    header = HEADER.pack(MAGIC, VERSION, RECORD_FIELDS, len(palette), len(records) // RECORD_FIELDS)
+    return (header + COST.pack(*(getattr(cost, field) for field in CostEstimate.FIELDS))
+            + palette.tobytes() + records.tobytes())
+
+
+# pylint: disable=too-few-public-methods
+class _Block:
+    """A block of records being checked by BytecodeProgram: the program or a repeat body."""
+
+    __slots__ = ("start", "end", "count", "alive", "writes", "nested", "folded", "ends_frames")
+
+    def __init__(self, start: int, end: int, count: int, alive: bool):
+        self.start = start
+        self.end = end                # Record after the block
+        self.count = count            # Iterations of the repeat
+        self.alive = alive            # False if an enclosing repeat, or this one, never runs
+        self.writes = 0               # Pixel writes of the records of the block itself
+        self.nested = 0               # Records of the repeat bodies inside the block
+        self.folded = [0, 0, 0, 0]    # Counts of those bodies, multiplied by their iterations
+        self.ends_frames = False      # Whether running the block may end an animation frame
+
+    def counts(self) -> list:
+        """Returns (instructions, worst_instructions, writes, worst_writes) of one run of the block."""
+        own = self.end - self.start - self.nested
+        folded = self.folded
+        return [own + folded[0], own + folded[1], self.writes + folded[2], self.writes + folded[3]]
+
+
+class BytecodeProgram:
+    """
+    A bytecode program read from a buffer, ready to be replayed.
+
+    The palette and records are views over the buffer (a memory map when
+    created by load()), so nothing is copied: loading only checks the
+    records and adds up their cost, and replay() reads them in place. Use it
+    as a context manager, or call close(), to release a memory-mapped file.
+    """
+
+    def __init__(self, data, name: str = None):
+        """
+        Validate a bytecode buffer and estimate the cost of its program.
+
+        Args:
+            data: bytes, mmap or any other buffer holding the bytecode
+            name (str): Source of the buffer, for error messages
+
+        Raises:
+            ValueError: If the buffer is not bytecode of a supported version,
+                or if it is malformed: a palette entry that is not an RGB
+                color, or a record with an unknown opcode, a color outside
+                the palette, a repeat body leaving its block or repeat blocks
+                nested more than MAX_DEPTH deep
+        """
+        self.name = name or "bytecode"
+        self._data = data
+        self._views = []
+        try:
+            magic, version, fields, colors, count = HEADER.unpack_from(data)
+            COST.unpack_from(data, HEADER.size)
+        except struct.error as error:
+            raise ValueError(f"{self.name}: truncated bytecode header") from error
+        if magic != MAGIC:
+            raise ValueError(f"{self.name}: not a PixelDraw bytecode file")
+        if version != VERSION or fields != RECORD_FIELDS:
+            raise ValueError(f"{self.name}: unsupported bytecode version {version}")
+
+        palette_start = HEADER.size + COST.size
+        records_start = palette_start + colors * array(PALETTE_TYPECODE).itemsize
+        end = records_start + count * RECORD_FIELDS * array(RECORD_TYPECODE).itemsize
+        if len(data) != end:
+            raise ValueError(f"{self.name}: bytecode has {len(data)} bytes, expected {end}")
+        self.palette = self._view(palette_start, records_start, PALETTE_TYPECODE)
+        self.records = self._view(records_start, end, RECORD_TYPECODE)
+        self.count = count
+        try:
+            # The stored cost could be forged to get past a budget
+            self.cost = self._check()
+        except ValueError:
+            self.close()
+            raise
+
+    def _view(self, start: int, end: int, typecode: str):
+        """Returns the values stored in data[start:end], without copying when possible."""
+        if sys.byteorder == "big":
+            values = array(typecode)
+            values.frombytes(self._data[start:end])
+            values.byteswap()
+            return values
+        view = memoryview(self._data)[start:end].cast(typecode)
+        self._views.append(view)
+        return view
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the views and close the memory map, if any."""
+        for view in self._views:
+            view.release()
+        self._views = []
+        self.palette = self.records = None
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+
+    # pylint: disable=too-many-locals, too-many-branches, too-many-statements
+    def _check(self) -> CostEstimate:
+        """
+        Check the palette and every record, and estimate the cost of the program.
+
+        The records are read once, in order, and give the same estimate as
+        CostPD.add_cost() walking the decoded tree. The block being read only
+        counts its own pixel writes; its instructions are its records minus
+        those of the repeat bodies it contains. Enclosing blocks wait on a
+        stack until the body ends, when its counts are multiplied and added
+        to them (see CostPD.add_repeat()).
+
+        Returns:
+            CostEstimate: The cost a budget is checked against
+        """
+        for index, color in enumerate(self.palette):
+            if color > _MAX_COLOR:
+                raise ValueError(f"{self.name}: palette entry {index} is not an RGB color")
+        records = self.records
+        palette_size = len(self.palette)
+        cost = CostEstimate()
+        colors = set()
+        stack = []                    # _Block of every enclosing repeat body, innermost last
+        block = _Block(0, self.count, 1, True)
+        columns = [records[field::RECORD_FIELDS] for field in range(RECORD_FIELDS)]
+        writes = 0                    # Pixel writes of the records of the block itself
+        for index, opcode, first, second, third, fourth in zip(range(self.count), *columns):
+            while index == block.end:
+                block.writes = writes
+                block = self._close(stack, block)
+                writes = block.writes
+            if opcode == OP_POINT:
+                writes += 1
+            elif opcode == OP_RECTANGLE:
+                writes += rectangle_writes(third, fourth)
+            elif opcode == OP_LINE:
+                writes += line_writes(first, second, third, fourth)
+            elif opcode == OP_FRAME:
+                writes += frame_writes(third, fourth)
+            elif opcode == OP_CIRCLE:
+                writes += circle_writes(third)
+            elif opcode == OP_COLOR:
+                if not 0 <= first < palette_size:
+                    raise ValueError(f"{self.name}: color {first} of record {index} is not in the palette")
+                if block.alive:
+                    colors.add(first)
+            elif opcode == OP_REPEAT:
+                if not 0 <= second < block.end - index:
+                    raise ValueError(f"{self.name}: repeat body of record {index} leaves its block")
+                if len(stack) == MAX_DEPTH:
+                    raise ValueError(f"{self.name}: repeat blocks nested more than {MAX_DEPTH} deep")
+                block.writes = writes
+                stack.append(block)
+                block = _Block(index + 1, index + 1 + second, first, block.alive and first > 0)
+                writes = 0
+            elif opcode == OP_SIZE:
+                if block.alive:
+                    cost.canvas_cells = max(cost.canvas_cells, first * second)
+            elif opcode == OP_CLEAR:
+                # Bounded by the largest canvas seen so far
+                writes += cost.canvas_cells
+            elif opcode == OP_FRAME_BREAK:
+                block.ends_frames = True
+            else:
+                raise ValueError(f"{self.name}: unknown opcode {opcode} in record {index}")
+        block.writes = writes
+        while stack:
+            block = self._close(stack, block)
+        return add_counts(cost, block.counts(), len(colors))
+
+    @staticmethod
+    def _close(stack: list, body) -> "_Block":
+        """Adds the counts of a finished repeat body to its enclosing block and returns that block."""
+        block = stack.pop()
+        block.nested += body.end - body.start
+        if body.alive:
+            add_repeat(block.folded, body.counts(), body.count, body.ends_frames)
+            block.ends_frames = block.ends_frames or body.ends_frames
+        return block
+
+    def decode(self) -> list:
+        """
+        Rebuild the instruction tree of the program, for inspection tools.
+
+        Returns:
+            list: Instruction nodes running exactly like the records
+        """
+        return self._decode(0, self.count)
+
+    def _decode(self, start: int, end: int) -> list:
+        """Decodes the records [start, end), recursing into repeat bodies."""
+        records = self.records
+        palette = self.palette
+        block = []
+        index = start
+        while index < end:
+            base = index * RECORD_FIELDS
+            opcode = records[base]
+            index += 1
+            if opcode == OP_REPEAT:
+                length = records[base + 2]
+                block.append(Repeat(records[base + 1], self._decode(index, index + length)))
+                index += length
+            elif opcode == OP_COLOR:
+                block.append(Color(hex_color(palette[records[base + 1]])))
+            else:
+                instruction_type, arity = _DECODERS[opcode]
+                block.append(instruction_type(*records[base + 1:base + 1 + arity]))
+        return block
+
+    def replay(self, analyzer):
+        """
+        Run the program through the commands of a semantic analyzer.
+
+        Args:
+            analyzer (SemanticAnalyzer): Analyzer receiving the commands
+
+        Returns:
+            tuple: (width, height, framebuffer), see SemanticAnalyzer.analyze()
+        """
+        commands = {
+            OP_SIZE: (analyzer.set_size, 2),
+            OP_POINT: (analyzer.draw_point, 2),
+            OP_RECTANGLE: (analyzer.draw_rectangle, 4),
+            OP_CLEAR: (analyzer.clear_canvas, 0),
+            OP_LINE: (analyzer.draw_line, 4),
+            OP_FRAME: (analyzer.draw_frame, 4),
+            OP_CIRCLE: (analyzer.draw_circle, 3),
+            OP_FRAME_BREAK: (analyzer.end_frame, 0),
+        }
+        self._run(analyzer, commands, 0, self.count)
+        return analyzer.result()
+
+    def _run(self, analyzer, commands: dict, start: int, end: int):
+        """Replays the records [start, end), recursing into repeat bodies."""
+        records = self.records
+        palette = self.palette
+        index = start
+        while index < end:
+            base = index * RECORD_FIELDS
+            opcode = records[base]
+            index += 1
+            if opcode == OP_COLOR:
+                analyzer.set_color(palette[records[base + 1]])
+            elif opcode == OP_REPEAT:
+                body_start = index
+                index += records[base + 2]
+                analyzer.repeat(records[base + 1],
+                                lambda body_start=body_start, body_end=index:
+                                self._run(analyzer, commands, body_start, body_end))
+            else:
+                try:
+                    command, arity = commands[opcode]
+                except KeyError:
+                    raise ValueError(f"{self.name}: unknown opcode {opcode} in record {index - 1}") from None
+                command(*records[base + 1:base + 1 + arity])
+
+
+def load(path: str) -> BytecodeProgram:
+    """
+    Memory-map a bytecode file.
+
+    Args:
+        path (str): Path of the file
+
+    Returns:
+        BytecodeProgram: The mapped program; close it when done
+
+    Raises:
+        ValueError: If the file is not bytecode of a supported version
+    """
+    with open(path, "rb") as bytecode_file:
+        data = mmap.mmap(bytecode_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return BytecodeProgram(data, str(path))
+    except ValueError:
+        data.close()
+        raise
@@ -0,0 +1,247 @@
+"""This module contains the content-addressed compile cache of the PixelDraw compiler.
+
+Services often compile the same sources again and again (templates,
+thumbnails). The cache maps a hash of the normalized source and the compile
+options to the compiled raster, so a repeated compile skips the lexical,
+syntactic and semantic analysis and goes straight to the output.
+
+Entries live in an in-memory LRU tier and, optionally, in an on-disk tier
+shared between processes. Both tiers are bounded in bytes and evict the least
+recently used entries first.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import hashlib
+import os
+import re
+import struct
+import zlib
+from collections import OrderedDict
+
+from CostPD import CostEstimate
+from FramebufferPD import Framebuffer
+
+# Bumped whenever the entry format or the rasterization rules change
+CACHE_VERSION = 3
+
+# Runs of spaces and tabs, which separate tokens but never change their meaning
+_BLANKS = re.compile(r"[ \t]+")
+
+# Cost fields stored in front of every entry, so budgets can be checked on a hit
+_COST_FIELDS = CostEstimate.FIELDS
+_COST_HEADER = struct.Struct("<" + "Q" * len(_COST_FIELDS))
+
+# Suffix of the entry files of the disk tier
+_ENTRY_SUFFIX = ".pdc"
+
+
+def normalize_source(code: str) -> str:
+    """Returns a canonical form of a source that compiles to the same raster.
+
+    Runs of spaces and tabs become one space, lines are stripped and blank
+    lines are dropped. Only whitespace the lexer skips is touched.
+    """
+    lines = (_BLANKS.sub(" ", line).strip(" \t") for line in code.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def cache_key(code: str, options: tuple = ()) -> str:
+    """Returns the cache key of a source compiled with some options.
+
+    Args:
+        code (str): PixelDraw source code
+        options (tuple): Compile options that change the raster
+
+    Returns:
+        str: Hexadecimal SHA-256 digest
+    """
+    digest = hashlib.sha256(f"{CACHE_VERSION}\0{options!r}\0".encode("utf-8"))
+    digest.update(normalize_source(code).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def pack_entry(framebuffer: Framebuffer, cost: CostEstimate) -> bytes:
+    """Serializes a compiled raster and the cost of its program as a cache entry."""
+    header = _COST_HEADER.pack(*(getattr(cost, field) for field in _COST_FIELDS))
+    return zlib.compress(header + framebuffer.to_bytes(), 1)
+
+
+def unpack_entry(data: bytes) -> tuple:
+    """Rebuilds the (framebuffer, cost) stored by pack_entry().
+
+    Raises:
+        ValueError: If the entry is corrupted
+    """
+    try:
+        data = zlib.decompress(data)
+        values = _COST_HEADER.unpack_from(data)
+        framebuffer = Framebuffer.from_bytes(memoryview(data)[_COST_HEADER.size:])
+    except (zlib.error, struct.error, ValueError) as error:
+        raise ValueError(f"Corrupted cache entry: {error}") from error
+    cost = CostEstimate()
+    for field, value in zip(_COST_FIELDS, values):
+        setattr(cost, field, value)
+    return framebuffer, cost
+
+
+# pylint: disable=too-many-instance-attributes
+class CompileCache:
+    """
+    Two-tier LRU cache of compiled rasters keyed by cache_key().
+
+    Values are opaque byte strings (see pack_entry()). The memory tier keeps
+    at most max_bytes of entries. When a directory is given, entries are also
+    written there and kept up to max_disk_bytes; a memory miss that hits the
+    disk promotes the entry back into memory.
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20, directory: str = None, max_disk_bytes: int = 512 << 20):
+        """
+        Create an empty cache.
+
+        Args:
+            max_bytes (int): Size limit of the memory tier in bytes
+            directory (str): Directory of the disk tier, None for memory only
+            max_disk_bytes (int): Size limit of the disk tier in bytes
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self.size = 0               # Bytes held by the memory tier
+        self.hits = 0               # Lookups served from memory
+        self.disk_hits = 0          # Lookups served from disk
+        self.misses = 0             # Lookups found in neither tier
+        self.evictions = 0          # Entries evicted from either tier
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self):
+        # A copy sent to another process (a batch worker) starts empty and
+        # shares only the disk tier
+        return {"max_bytes": self.max_bytes, "directory": self.directory, "max_disk_bytes": self.max_disk_bytes}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state["max_bytes"], state["directory"], state["max_disk_bytes"])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or (self.directory is not None and os.path.exists(self._path(key)))
+
+    def _path(self, key: str) -> str:
+        """Path of the disk entry of a key."""
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    def get(self, key: str):
+        """
+        Look up an entry, refreshing its position in the LRU order.
+
+        Returns:
+            bytes: The entry, or None on a miss
+        """
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as entry_file:
+                    data = entry_file.read()
+                # The modification time orders the disk tier
+                os.utime(path)
+            except OSError:
+                data = None
+            if data is not None:
+                self.disk_hits += 1
+                self._remember(key, data)
+                return data
+        self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes):
+        """Store an entry in the memory tier and, if enabled, on disk."""
+        self._remember(key, data)
+        if self.directory is not None:
+            self._write(key, data)
+
+    def _remember(self, key: str, data: bytes):
+        """Insert an entry into the memory tier and evict down to max_bytes."""
+        if len(data) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= len(previous)
+        self._entries[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _key, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def _write(self, key: str, data: bytes):
+        """Write an entry to the disk tier atomically and evict old files."""
+        if len(data) > self.max_disk_bytes:
+            return
+        import tempfile  # pylint: disable=import-outside-toplevel
+        # Readers never see a partial file: write aside, then rename
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as entry_file:
+                entry_file.write(data)
+            os.replace(temporary, self._path(key))
+        except OSError:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Remove the least recently used disk entries beyond max_disk_bytes."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(_ENTRY_SUFFIX):
+                    try:
+                        info = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((info.st_mtime, info.st_size, entry.path))
+                    total += info.st_size
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every entry of both tiers (the counters are kept)."""
+        self._entries.clear()
+        self.size = 0
+        if self.directory is not None:
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.endswith(_ENTRY_SUFFIX):
+                        os.remove(entry.path)
+
+    def stats(self) -> dict:
+        """Returns the counters and sizes of the cache as a plain dictionary."""
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
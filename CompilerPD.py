@@ -1,20 +1,65 @@
 """This module contains the Compiler class for PixelDraw.
 
 The PixelDraw compiler processes source code through three main phases:
+
 1. Lexical Analysis - Breaks code into tokens
-2. Syntactic Analysis - Validates token structure
-3. Semantic Analysis - Generates drawing instructions
-4. Visualization - Displays the pixel art using Tkinter
+2. Syntactic Analysis - Validates token structure and builds the instruction tree,
+   which is then checked against the resource budget and optionally optimized
+3. Semantic Analysis - Runs the instruction tree into a framebuffer
+4. Visualization - Displays the pixel art using Tkinter, or exports it as an
+   image (PNG/PPM) without Tkinter
+
+Compiled rasters can be kept in a CompileCache, so compiling the same source
+again skips the analysis phases.
+
+The module can also be run from the command line to export images headlessly:
+
+    python CompilerPD.py drawing.pd -o drawing.png --pixel-size 20 --grid
+
+Several files are compiled in parallel into an output directory:
+
+    python CompilerPD.py *.pd -o images/ --jobs 8
+
+A script can be compiled once to bytecode and rendered elsewhere without
+being lexed or parsed again:
+
+    python CompilerPD.py drawing.pd -o drawing.pdb
+    python CompilerPD.py drawing.pdb -o drawing.png
+
+Scripts whose frames are separated by `---` lines are exported as an
+animated GIF, or as a directory of PPM frames:
+
+    python CompilerPD.py sprite.pd -o sprite.gif --animate --frame-delay 80
+
+While editing, a script can be watched in a live window that is updated
+incrementally on every save:
+
+    python CompilerPD.py drawing.pd --watch
 
 Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
          Daniel Mateo Montoya González <20202020098>
 """
 
-import tkinter as tk
+import itertools
+import os
+import sys
+import time
 
+import BytecodePD
+from AnimationPD import AnimationRecorder, export_animation
+from CachePD import CompileCache, cache_key, pack_entry, unpack_entry
+from ColorsPD import hex_color
+from CostPD import Budget, BudgetExceededError, CostEstimate, add_cost, estimate_cost
+from ExportPD import export_image
+from FramebufferPD import Framebuffer
 from LexicalPd import LexicalAnalyzer
+from MetricsPD import CompileStats, count_instructions
+from OptimizerPD import OcclusionOptimizer
+from ParallelPD import PARALLEL_MIN_CELLS, PARALLEL_MIN_WRITES, DisplayList, TiledRasterizer
+from ProgressivePD import ProgressiveRender
 from SintacticPD import SintacticAnalyzerPixelDraw
 from SemanticPD import SemanticAnalyzer
+from SparsePD import SparseFramebuffer
 
 
 class CompilerPixelDraw:
@@ -35,10 +80,29 @@ class CompilerPixelDraw:
         """
         self.canvas_size = (500, 500)  # Default window size in pixels
         self.pixel_size = 20           # Default size of each pixel block in pixels
-        self.current_color = "#000000" # Default color (black)
+        self.current_color = 0x000000  # Default color (black, packed RGB)
         self.grid = []                 # Grid to store pixel data
+        self.render_mode = "runs"      # "runs" (merged rectangles) or "photo" (single image)
+        self.show_grid = True          # Draw the gray grid overlay on screen
+        self.max_canvas_size = (1600, 1000)  # Larger outputs open in the tiled viewer
+        self.budget = None             # Optional CostPD.Budget checked before rasterizing
+        self.keep_pixels = False       # Also record the (x, y, color) pixel log
+        self.pixels = None             # Pixel log of the last compile (keep_pixels only)
+        self.last_cost = None          # CostEstimate of the last compiled program
+        self.optimize = False          # Drop draws hidden by later draws before rasterizing (see OptimizerPD)
+        self.saved_writes = 0          # Pixel writes the optimizer saved in the last compile
+        self.trace = None              # Hook for per-instruction messages (e.g. print)
+        self.profiler = None           # Hook wrapping each phase: profiler(phase, func, *args)
+        self.track_memory = False      # Record peak memory in the stats (uses tracemalloc)
+        self.last_stats = None         # CompileStats of the last compile that collected them
+        self.streaming = False         # Lex, parse and rasterize as one streaming pipeline
+        self.cache = None              # Optional CachePD.CompileCache of compiled rasters
+        self.raster_workers = 0        # Processes filling tiles of huge canvases (0: serial)
+        self._rasterizer = None        # TiledRasterizer whose pool is reused across compiles
+        self.max_dense_cells = 1 << 26 # Larger canvases are stored as sparse chunks
+        self.spill_dir = None          # Directory memory-mapping the sparse chunks (None: in memory)
 
-    def compile(self, code: str):
+    def compile(self, code: str, collect_stats: bool = False):
         """
         Compile PixelDraw source code into visual output.
         
@@ -50,42 +114,656 @@ class CompilerPixelDraw:
         
         Args:
             code (str): The PixelDraw source code to compile
+            collect_stats (bool): Whether to time the phases and count the work
+            
+        Returns:
+            CompileStats: Statistics of the compile, or None if not collected.
+            The render time covers building the window, not filling it in
+            nor the time it stays open.
             
         Raises:
             RuntimeError: If lexical analysis fails
             SyntaxError: If syntactic analysis fails
             Exception: If semantic analysis or visualization fails
         """
+        stats = self._start_stats(collect_stats)
+
+        # Phases 1-3: Analyze the code into a framebuffer
+        width, height, framebuffer = self.rasterize(code, stats)
+
+        # Phase 4: Draw the pixel art on screen
+        root = self._run_phase(stats, "render", self.build_window, width, height, framebuffer)
+        self._finish_stats(stats)
+        root.mainloop()
+        return stats
+
+    def _start_stats(self, collect_stats: bool):
+        """Create the stats of a new compile and start memory tracing if requested."""
+        if not collect_stats:
+            return None
+        if self.track_memory:
+            import tracemalloc  # pylint: disable=import-outside-toplevel
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        return CompileStats()
+
+    def _finish_stats(self, stats):
+        """Record the peak memory of a compile and keep its stats."""
+        if stats is None:
+            return
+        if self.track_memory:
+            import tracemalloc  # pylint: disable=import-outside-toplevel
+            if tracemalloc.is_tracing():
+                stats.peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        self.last_stats = stats
+
+    def _run_phase(self, stats, phase: str, func, *args):
+        """
+        Run one phase through the profiler hook and record its wall time.
+        
+        Args:
+            stats (CompileStats): Stats to update, or None
+            phase (str): Name of the phase
+            func (callable): Function implementing the phase
+            
+        Returns:
+            The result of func(*args)
+        """
+        if stats is None and self.profiler is None:
+            return func(*args)
+        start = time.perf_counter()
+        result = self.profiler(phase, func, *args) if self.profiler is not None else func(*args)
+        if stats is not None:
+            stats.times[phase] += time.perf_counter() - start
+        return result
+
+    def rasterize(self, code, stats: CompileStats = None):
+        """
+        Run the analysis phases and return the compiled canvas.
+        
+        Sources given as text file-like objects, or any source when streaming
+        is enabled, go through rasterize_stream(), and BytecodePD programs
+        through rasterize_bytecode(). When a cache is set, a source compiled
+        before with the same raster options is served from it without any
+        analysis; the pixel log is not cached, so keep_pixels compiles always
+        run.
+        
+        Args:
+            code: The PixelDraw source code (str), a text file-like object or a
+                BytecodePD.BytecodeProgram
+            stats (CompileStats): Optional stats updated with timings and counters
+            
+        Returns:
+            tuple: (width, height, framebuffer)
+            
+        Raises:
+            RuntimeError: If lexical analysis fails
+            SyntaxError: If syntactic analysis fails
+            BudgetExceededError: If the program would exceed the budget
+            Exception: If semantic analysis fails
+        """
+        if isinstance(code, BytecodePD.BytecodeProgram):
+            return self.rasterize_bytecode(code, stats)
+        if self.streaming or not isinstance(code, str):
+            return self.rasterize_stream(code, stats)
+
+        key = None
+        if self.cache is not None and not self.keep_pixels:
+            key = cache_key(code, self.raster_options())
+            cached = self._run_phase(stats, "cache", self.cache.get, key)
+            if cached is not None:
+                try:
+                    return self._from_cache(cached, stats)
+                except ValueError:
+                    # Corrupted entry: compile again and overwrite it
+                    pass
+
         # Phase 1: Lexical analysis - Convert code to tokens
+        tokens = self._run_phase(stats, "lex", LexicalAnalyzer.lex, code)
+
+        # Phase 2: Syntactic analysis - Validate tokens and build the instruction tree
+        sintactic_analyzer = SintacticAnalyzerPixelDraw(tokens, self.trace)
+        program = self._run_phase(stats, "parse", sintactic_analyzer.parse)
+        if stats is not None:
+            stats.token_count = len(tokens)
+            stats.instruction_count = count_instructions(program)
+
+        # Check the estimated cost against the budget before running anything
+        keep_pixels, sparse = self.check_budget(program)
+
+        # Drop hidden draws; the pixel log must record every write, so not with keep_pixels
+        self.saved_writes = 0
+        if self.optimize and not keep_pixels:
+            optimizer = OcclusionOptimizer()
+            program = self._run_phase(stats, "optimize", optimizer.optimize, program)
+            self.saved_writes = optimizer.saved_writes
+
+        # Phase 3: Semantic analysis - Run the instruction tree into a framebuffer
+        result = self._run_semantic(program, SemanticAnalyzer.analyze, keep_pixels, sparse, stats)
+
+        # Sparse canvases are too large to be cached densely
+        if key is not None and not isinstance(result[2], SparseFramebuffer):
+            self._run_phase(stats, "cache", self.cache.put, key, pack_entry(result[2], self.last_cost))
+        return result
+
+    # pylint: disable=too-many-arguments
+    def _run_semantic(self, program, run, keep_pixels: bool, sparse: bool, stats: CompileStats = None):
+        """
+        Run the semantic phase of a checked program into a framebuffer.
+        
+        Huge canvases are only recorded and then filled tile by tile in parallel.
+        
+        Args:
+            program (list): Instruction nodes given to the SemanticAnalyzer
+            run (callable): run(analyzer) -> (width, height, framebuffer), e.g.
+                SemanticAnalyzer.analyze or BytecodeProgram.replay
+            keep_pixels (bool): Whether to record the pixel log
+            sparse (bool): Whether the canvas must be sparse
+            stats (CompileStats): Optional stats updated with timings and counters
+            
+        Returns:
+            tuple: (width, height, framebuffer)
+        """
+        parallel = self.use_tiles(sparse)
+        factory = DisplayList if parallel else self.framebuffer_factory(sparse)
+        semantic_analyzer = SemanticAnalyzer(program, keep_pixels, self.trace, factory)
+        result = self._run_phase(stats, "semantic", run, semantic_analyzer)
+        if parallel:
+            framebuffer = self._run_phase(stats, "semantic", self.rasterize_tiles, result[2])
+            result = (result[0], result[1], framebuffer)
+        self.pixels = semantic_analyzer.pixels
+
+        if isinstance(result[2], SparseFramebuffer):
+            result[2].compact()
+        if stats is not None:
+            stats.pixel_writes = semantic_analyzer.pixel_writes
+            stats.unique_pixels = result[2].painted_cells()
+            stats.saved_writes = self.saved_writes
+            stats.skipped_iterations = semantic_analyzer.skipped_iterations
+        return result
+
+    def compile_to_bytecode(self, code: str, target=None) -> bytes:
+        """
+        Lex, parse and optimize a source once and serialize it as bytecode.
+        
+        The budget is checked like in rasterize(), and the estimated cost is
+        stored in the bytecode so it can be enforced again where it is replayed.
+        
+        Args:
+            code (str): The PixelDraw source code
+            target: Optional output file path or writable binary stream
+            
+        Returns:
+            bytes: The bytecode (see BytecodePD)
+            
+        Raises:
+            RuntimeError: If lexical analysis fails
+            SyntaxError: If syntactic analysis fails
+            BudgetExceededError: If the program would exceed the budget
+            ValueError: If an operand does not fit the bytecode format
+            Exception: If a color name is unknown
+        """
         tokens = LexicalAnalyzer.lex(code)
+        program = SintacticAnalyzerPixelDraw(tokens, self.trace).parse()
+        keep_pixels, _sparse = self.check_budget(program)
+        self.saved_writes = 0
+        if self.optimize and not keep_pixels:
+            optimizer = OcclusionOptimizer()
+            program = optimizer.optimize(program)
+            self.saved_writes = optimizer.saved_writes
+        data = BytecodePD.encode(program, self.last_cost)
+        if isinstance(target, (str, os.PathLike)):
+            with open(target, "wb") as bytecode_file:
+                bytecode_file.write(data)
+        elif target is not None:
+            target.write(data)
+        return data
 
-        # Phase 2: Syntactic analysis - Validate token structure
-        sintactic_analyzer = SintacticAnalyzerPixelDraw(tokens)
-        sintactic_analyzer.parse()
+    def rasterize_bytecode(self, program, stats: CompileStats = None):
+        """
+        Replay a bytecode program into a framebuffer, without lexing or parsing.
+        
+        The budget is enforced with the cost estimated from the checked
+        records when the program was loaded, never with the cost stored in
+        the file.
+        
+        Args:
+            program: BytecodePD.BytecodeProgram, or the path of a bytecode
+                file, which is memory-mapped for the duration of the call
+            stats (CompileStats): Optional stats updated with timings and counters
+            
+        Returns:
+            tuple: (width, height, framebuffer)
+            
+        Raises:
+            ValueError: If the bytecode is malformed
+            BudgetExceededError: If the program would exceed the budget
+            Exception: If semantic analysis fails
+        """
+        if not isinstance(program, BytecodePD.BytecodeProgram):
+            with self._run_phase(stats, "load", BytecodePD.load, program) as loaded:
+                return self.rasterize_bytecode(loaded, stats)
+        self.last_cost = program.cost
+        keep_pixels, sparse = self.enforce_budget(program.cost, self.keep_pixels)
+        self.saved_writes = 0
+        if stats is not None:
+            stats.instruction_count = program.count
+        return self._run_semantic([], program.replay, keep_pixels, sparse, stats)
 
-        # Phase 3: Semantic analysis - Generate drawing instructions
-        semantic_analyzer = SemanticAnalyzer(tokens)
-        width, height, pixels = semantic_analyzer.analyze()
+    def framebuffer_factory(self, sparse: bool = False):
+        """
+        Return the callable the semantic analyzer uses to create canvases.
+        
+        Canvases with more than max_dense_cells cells, or every canvas when
+        sparse is set, are SparseFramebuffers spilling to spill_dir.
+        
+        Args:
+            sparse (bool): Whether every canvas should be sparse
+            
+        Returns:
+            callable: factory(width, height) -> Framebuffer
+        """
+        max_dense_cells = self.max_dense_cells
+        spill_dir = self.spill_dir
 
-        # Phase 4: Draw the pixel art on screen
-        self.draw_canvas(width, height, pixels)
+        def create(width: int, height: int):
+            if sparse or width * height > max_dense_cells:
+                return SparseFramebuffer(width, height, spill_dir=spill_dir)
+            return Framebuffer(width, height)
+        return create
+
+    def rasterize_tiles(self, display_list: DisplayList) -> Framebuffer:
+        """
+        Fill a recorded canvas with raster_workers processes, tile by tile.
+        
+        Args:
+            display_list (DisplayList): Draws recorded by the semantic analyzer
+            
+        Returns:
+            Framebuffer: The compiled canvas
+        """
+        rasterizer = self._rasterizer
+        if rasterizer is None or rasterizer.workers != self.raster_workers:
+            # The pool is started once and kept for the next compiles
+            self.close()
+            rasterizer = self._rasterizer = TiledRasterizer(self.raster_workers)
+        return rasterizer.rasterize(display_list)
+
+    def use_tiles(self, sparse: bool = False) -> bool:
+        """
+        Tell whether the last estimated program is rasterized by tile workers.
+        
+        Workers only pay off with several CPUs, on a huge dense canvas and
+        with enough drawing to outweigh sending the recorded operations to
+        them; everything else is drawn serially.
+        
+        Args:
+            sparse (bool): Whether the canvas must be sparse
+        """
+        cost = self.last_cost
+        return (self.raster_workers > 0 and not sparse and (os.cpu_count() or 1) > 1
+                and PARALLEL_MIN_CELLS <= cost.canvas_cells <= self.max_dense_cells
+                and cost.pixel_writes >= PARALLEL_MIN_WRITES)
+
+    def close(self):
+        """Shut down the worker pool kept for tiled rasterization, if any."""
+        if self._rasterizer is not None:
+            self._rasterizer.close()
+            self._rasterizer = None
+
+    def raster_options(self) -> tuple:
+        """
+        Return the options that change the compiled raster, for the cache key.
+        
+        The optimizer may skip colors whose draws are all hidden, which
+        changes the palette. Sparse canvases are never cached and tiled
+        rasterization produces the same cells as serial drawing, so the
+        other settings do not change a cached raster.
+        """
+        return ("optimize", self.optimize)
+
+    def _from_cache(self, data: bytes, stats: CompileStats = None):
+        """
+        Rebuild a compiled canvas from a cache entry.
+        
+        The budget is still enforced with the cost stored in the entry.
+        
+        Returns:
+            tuple: (width, height, framebuffer)
+            
+        Raises:
+            ValueError: If the entry is corrupted
+            BudgetExceededError: If the program would exceed the budget
+        """
+        framebuffer, cost = unpack_entry(data)
+        self.last_cost = cost
+        self.enforce_budget(cost, False)
+        self.pixels = None
+        self.saved_writes = 0
+        if stats is not None:
+            stats.cache_hit = True
+            stats.unique_pixels = framebuffer.painted_cells()
+        return framebuffer.width, framebuffer.height, framebuffer
+
+    def rasterize_stream(self, source, stats: CompileStats = None):
+        """
+        Compile a source as a pipeline of generators.
+        
+        The lexer reads the source lazily, the parser yields one top-level
+        instruction at a time and each instruction is applied to the
+        framebuffer as soon as it is parsed. Peak memory is bounded by the
+        canvas plus the repeat block being parsed, not by the script length.
+        The optimizer needs the whole program and is skipped; the budget is
+        enforced incrementally, instruction by instruction. In the stats the
+        interleaved lex, parse and semantic time is reported as semantic.
+        
+        Args:
+            source: The PixelDraw source code (str) or a text file-like object
+            stats (CompileStats): Optional stats updated with timings and counters
+            
+        Returns:
+            tuple: (width, height, framebuffer)
+        """
+        tokens = LexicalAnalyzer.iter_tokens(source)
+        if stats is not None:
+            tokens = self._counted(tokens, stats)
+        sintactic_analyzer = SintacticAnalyzerPixelDraw(tokens, self.trace)
+        instructions = sintactic_analyzer.iter_instructions()
+        if self.budget is not None or stats is not None:
+            instructions = self._budgeted(instructions, stats)
+
+        semantic_analyzer = SemanticAnalyzer(instructions, self.keep_pixels, self.trace,
+                                             self.framebuffer_factory())
+        result = self._run_phase(stats, "semantic", semantic_analyzer.analyze)
+        self.pixels = semantic_analyzer.pixels
+        self.saved_writes = 0
+        if isinstance(result[2], SparseFramebuffer):
+            result[2].compact()
+
+        if stats is not None:
+            stats.pixel_writes = semantic_analyzer.pixel_writes
+            stats.unique_pixels = result[2].painted_cells()
+            stats.skipped_iterations = semantic_analyzer.skipped_iterations
+        return result
+
+    @staticmethod
+    def _counted(tokens, stats: CompileStats):
+        """Pass tokens through while counting them."""
+        for token in tokens:
+            stats.token_count += 1
+            yield token
+
+    def _budgeted(self, instructions, stats: CompileStats = None):
+        """
+        Pass instructions through while enforcing the budget on the running total.
+        
+        Raises:
+            BudgetExceededError: As soon as the instructions seen so far exceed it
+        """
+        total = CostEstimate()
+        colors = set()
+        for instruction in instructions:
+            # One running estimate, so a clear is bounded by the canvas sized
+            # before it and the cell size follows every color seen so far
+            add_cost(total, [instruction], colors)
+            if stats is not None:
+                stats.instruction_count += count_instructions([instruction])
+            if self.budget is not None:
+                violations = self.budget.violations(total, self.keep_pixels)
+                if violations:
+                    raise BudgetExceededError("Budget exceeded: " + ", ".join(violations) + ".")
+            yield instruction
+        self.last_cost = total
+
+    def check_budget(self, program: list) -> tuple:
+        """
+        Estimate the cost of a program and enforce the configured budget.
+        
+        When the budget allows downgrading, a job exceeding it only because of
+        the keep_pixels log runs in framebuffer-only mode, and a job exceeding
+        it only because of the dense canvas size runs on a sparse canvas.
+        
+        Args:
+            program (list): Instruction nodes from the syntactic analyzer
+            
+        Returns:
+            tuple: (keep_pixels, sparse) - whether the pixel log should be
+            kept and whether the canvas must be sparse
+            
+        Raises:
+            BudgetExceededError: If the program would exceed the budget
+        """
+        cost = estimate_cost(program)
+        self.last_cost = cost
+        return self.enforce_budget(cost, self.keep_pixels)
+
+    def enforce_budget(self, cost, keep_pixels: bool) -> tuple:
+        """
+        Check an estimated cost against the configured budget.
+        
+        Args:
+            cost (CostEstimate): Estimated cost of the program
+            keep_pixels (bool): Whether the pixel log was requested
+            
+        Returns:
+            tuple: (keep_pixels, sparse), see check_budget()
+            
+        Raises:
+            BudgetExceededError: If the program would exceed the budget
+        """
+        sparse = False
+        if self.budget is None:
+            return keep_pixels, sparse
+
+        violations = self.budget.violations(cost, keep_pixels)
+        if violations and self.budget.on_exceed == "downgrade":
+            if keep_pixels:
+                # Retry without the pixel log: idempotent repeat iterations are skipped
+                keep_pixels = False
+                violations = self.budget.violations(cost, keep_pixels)
+            if violations:
+                # Retry on a sparse canvas, which only stores the drawn chunks
+                sparse = True
+                violations = self.budget.violations(cost, keep_pixels, sparse)
+        if violations:
+            raise BudgetExceededError("Budget exceeded: " + ", ".join(violations) + ".")
+        return keep_pixels, sparse
+
+    def compile_to_image(self, code: str, target, image_format: str = None, grid: bool = False,
+                         collect_stats: bool = False):
+        """
+        Compile PixelDraw source code and write the result as an image.
+        
+        This is the headless counterpart of compile(): no window is opened
+        and Tkinter is never imported.
+        
+        Args:
+            code: The PixelDraw source code to compile, or any other source
+                rasterize() accepts
+            target: Output file path or writable binary stream
+            image_format (str): "png" or "ppm", guessed from the path when omitted
+            grid (bool): Whether to draw the gray grid outline
+            collect_stats (bool): Whether to time the phases and count the work;
+                the stats are stored in last_stats
+            
+        Returns:
+            tuple: (width, height) of the compiled canvas in cells
+        """
+        stats = self._start_stats(collect_stats)
+        width, height, framebuffer = self.rasterize(code, stats)
+        self._run_phase(stats, "render", self.export, framebuffer, target, image_format, grid)
+        self._finish_stats(stats)
+        return width, height
+
+    def animate(self, code, stats: CompileStats = None):
+        """
+        Run a script whose frames are separated by `---` into an animation.
+        
+        The canvas carries over from one frame to the next and every frame is
+        stored as a delta against the previous one (see AnimationPD).
+        Animations are always drawn on a dense canvas and never cached.
+        
+        Args:
+            code: The PixelDraw source code (str) or a BytecodePD.BytecodeProgram
+            stats (CompileStats): Optional stats updated with timings and counters
+            
+        Returns:
+            AnimationPD.Animation: The frames of the script
+            
+        Raises:
+            RuntimeError: If lexical analysis fails
+            SyntaxError: If syntactic analysis fails
+            BudgetExceededError: If the program would exceed the budget
+            Exception: If semantic analysis fails
+        """
+        if isinstance(code, BytecodePD.BytecodeProgram):
+            program, run, cost = [], code.replay, code.cost
+            self.last_cost = cost
+        else:
+            tokens = self._run_phase(stats, "lex", LexicalAnalyzer.lex, code)
+            sintactic_analyzer = SintacticAnalyzerPixelDraw(tokens, self.trace)
+            program = self._run_phase(stats, "parse", sintactic_analyzer.parse)
+            if stats is not None:
+                stats.token_count = len(tokens)
+                stats.instruction_count = count_instructions(program)
+            run, cost = SemanticAnalyzer.analyze, estimate_cost(program)
+            self.last_cost = cost
+        if self.enforce_budget(cost, False)[1]:
+            raise BudgetExceededError("Budget exceeded: an animation canvas must fit the canvas bytes limit.")
 
-    def draw_canvas(self, width: int, height: int, pixels: list):
+        self.saved_writes = 0
+        if self.optimize and program:
+            optimizer = OcclusionOptimizer()
+            program = self._run_phase(stats, "optimize", optimizer.optimize, program)
+            self.saved_writes = optimizer.saved_writes
+
+        recorder = AnimationRecorder()
+        semantic_analyzer = SemanticAnalyzer(program, False, self.trace, recorder.new_canvas, recorder.capture)
+        self._run_phase(stats, "semantic", run, semantic_analyzer)
+        animation = recorder.finish(semantic_analyzer)
+        self.pixels = None
+        if stats is not None:
+            stats.pixel_writes = semantic_analyzer.pixel_writes
+            stats.unique_pixels = recorder.framebuffer.painted_cells()
+            stats.saved_writes = self.saved_writes
+            stats.skipped_iterations = semantic_analyzer.skipped_iterations
+        return animation
+
+    # pylint: disable=too-many-arguments
+    def compile_to_animation(self, code, target, image_format: str = None, delay: int = 100,
+                             grid: bool = False, collect_stats: bool = False) -> int:
         """
-        Create and display the pixel art using Tkinter.
+        Compile an animated script and write it as a GIF or as PPM frames.
         
-        This method creates a graphical window showing the compiled pixel art.
-        Each pixel is drawn as a colored rectangle on the canvas.
+        Args:
+            code: The PixelDraw source code (str) or a BytecodePD.BytecodeProgram
+            target: GIF file path or writable binary stream, or PPM output directory
+            image_format (str): "gif" or "ppm", guessed from the path when omitted
+            delay (int): Display time of every frame in milliseconds (GIF only)
+            grid (bool): Whether to draw the gray grid outline (PPM frames only)
+            collect_stats (bool): Whether to time the phases and count the work;
+                the stats are stored in last_stats
+            
+        Returns:
+            int: Number of frames
+        """
+        stats = self._start_stats(collect_stats)
+        animation = self.animate(code, stats)
+        self._run_phase(stats, "render", export_animation, animation, target, image_format,
+                        self.pixel_size, grid, delay)
+        self._finish_stats(stats)
+        return len(animation)
+
+    # pylint: disable=too-many-arguments
+    def compile_many(self, sources, output_dir: str = None, workers: int = None, ordered: bool = True,
+                     image_format: str = "png", grid: bool = False, chunksize: int = 1):
+        """
+        Compile many scripts over a process pool with this compiler's settings.
+        
+        See BatchPD.compile_many() for the arguments.
+        
+        Returns:
+            generator: One BatchResult per script
+        """
+        from BatchPD import compile_many  # pylint: disable=import-outside-toplevel
+        return compile_many(sources, output_dir, workers, ordered, image_format, grid, self, chunksize)
+
+    def export(self, framebuffer, target, image_format: str = None, grid: bool = False):
+        """
+        Write a compiled canvas as an image scaled by pixel_size.
+        
+        Args:
+            framebuffer (Framebuffer): Compiled canvas
+            target: Output file path or writable binary stream
+            image_format (str): "png" or "ppm", guessed from the path when omitted
+            grid (bool): Whether to draw the gray grid outline
+        """
+        export_image(framebuffer, target, image_format, self.pixel_size, grid)
+
+    def draw_canvas(self, width: int, height: int, framebuffer):
+        """
+        Display the pixel art in a Tkinter window until it is closed.
         
         Args:
             width (int): Width of the pixel grid
             height (int): Height of the pixel grid
-            pixels (list): List of (x, y, color) tuples representing the pixel art
+            framebuffer (Framebuffer): Final color of every cell of the pixel art
+        """
+        self.build_window(width, height, framebuffer).mainloop()
+
+    def watch(self, path: str, poll_ms: int = 200):
+        """
+        Follow a source file in one live window until it is closed.
+        
+        Every save is compiled incrementally by a LiveSession and only the
+        rows that changed are repainted; errors are shown in the window's
+        status line while the last good drawing stays on screen.
+        
+        Args:
+            path (str): PixelDraw source file to follow
+            poll_ms (int): Delay in milliseconds between two checks of the file
+        """
+        # Tkinter is only needed for on-screen output
+        import tkinter as tk  # pylint: disable=import-outside-toplevel
+        from LivePD import LivePreview  # pylint: disable=import-outside-toplevel
+
+        root = tk.Tk()
+        LivePreview(root, path, self.pixel_size, self.show_grid, poll_ms)
+        root.mainloop()
+
+    def build_window(self, width: int, height: int, framebuffer):
+        """
+        Create the Tkinter window showing the pixel art, without running it.
+        
+        Only the final visible color of every cell is drawn. Outputs larger than
+        max_canvas_size open in a scrollable TiledViewer of canvas_size pixels. In "runs" mode
+        each horizontal run of same-colored cells becomes one rectangle item;
+        in "photo" mode the raster is pushed into a single PhotoImage, one put()
+        per row, and zoomed by pixel_size. The gray grid is drawn on top as lines
+        when show_grid is enabled.
+        
+        The canvas is filled in progressively by a ProgressiveRender once the
+        main loop runs, a few rows per time slice, so the first rows show up
+        at once and the window stays responsive. The status line shows the
+        progress; Escape stops rendering and closing the window stops it
+        cleanly at any point.
+        
+        Args:
+            width (int): Width of the pixel grid
+            height (int): Height of the pixel grid
+            framebuffer (Framebuffer): Final color of every cell of the pixel art
+            
+        Returns:
+            tk.Tk: The window, ready for mainloop()
             
         Note:
             The canvas size is automatically adjusted based on the grid dimensions
-            and pixel size. Each grid cell becomes a pixel_size x pixel_size rectangle.
+            and pixel size. Each grid cell becomes a pixel_size x pixel_size block.
         """
+        # Tkinter is only needed for on-screen output
+        import tkinter as tk  # pylint: disable=import-outside-toplevel
+
         # Create the main Tkinter window
         root = tk.Tk()
         root.title("PixelDraw Output")
@@ -94,20 +772,248 @@ class CompilerPixelDraw:
         canvas_width = width * self.pixel_size
         canvas_height = height * self.pixel_size
         
+        # Canvases larger than the screen are shown tile by tile in a scrollable view
+        if canvas_width > self.max_canvas_size[0] or canvas_height > self.max_canvas_size[1]:
+            from ViewerPD import TiledViewer  # pylint: disable=import-outside-toplevel
+            TiledViewer(root, framebuffer, self.pixel_size, self.canvas_size, show_grid=self.show_grid)
+            return root
+
         # Create the drawing canvas with white background
         canvas = tk.Canvas(root, width=canvas_width, height=canvas_height, bg="white")
         canvas.pack()
+        status = tk.Label(root, anchor="w")
+        status.pack(fill="x")
+
+        # One drawing step per row, then one per grid line, run in time slices
+        if self.render_mode == "photo":
+            steps = self._draw_photo(tk, canvas, framebuffer)
+        else:
+            steps = self._draw_runs(canvas, framebuffer)
+        total = height
+        if self.show_grid:
+            steps = itertools.chain(steps, self._draw_grid(canvas, width, height))
+            total += width + height + 2
+        renderer = ProgressiveRender(root, steps, total, status)
+        root.bind("<Escape>", lambda _event: renderer.cancel())
+        root.protocol("WM_DELETE_WINDOW", renderer.close)
+        renderer.start()
+        # Keep the renderer reachable from the window, e.g. to wait for it or cancel it
+        root.renderer = renderer
+
+        return root
 
-        # Draw each pixel as a colored rectangle
-        for (x, y, color) in pixels:
-            # Calculate pixel coordinates in canvas space
-            x1 = x * self.pixel_size
-            y1 = y * self.pixel_size
-            x2 = x1 + self.pixel_size
-            y2 = y1 + self.pixel_size
+    def _draw_runs(self, canvas, framebuffer):
+        """
+        Draw every run of same-colored cells as one rectangle item.
+        
+        Args:
+            canvas (tk.Canvas): Target canvas
+            framebuffer (Framebuffer): Compiled canvas
             
-            # Draw the pixel rectangle with specified color and gray border
-            canvas.create_rectangle(x1, y1, x2, y2, fill=color, outline="gray")
+        Yields:
+            int: The row just drawn
+        """
+        size = self.pixel_size
+        colors = [None if color is None else hex_color(color) for color in framebuffer.palette]
+        for y in range(framebuffer.height):
+            y1 = y * size
+            for x, length, index in framebuffer.runs(y):
+                # Unpainted cells already show the canvas background
+                if index:
+                    x1 = x * size
+                    canvas.create_rectangle(x1, y1, x1 + length * size, y1 + size,
+                                            fill=colors[index], outline="")
+            yield y
 
-        # Start the Tkinter event loop to display the window
-        root.mainloop()
+    def _draw_photo(self, tk, canvas, framebuffer):
+        """
+        Draw the whole raster as a single zoomed PhotoImage.
+        
+        Every row is put into an unzoomed image and copied, zoomed by
+        pixel_size, into the image shown on the canvas, so rows appear as
+        they are drawn. The shown image is kept as canvas.image so Tkinter
+        does not discard it.
+        
+        Args:
+            tk (module): The tkinter module
+            canvas (tk.Canvas): Target canvas
+            framebuffer (Framebuffer): Compiled canvas
+            
+        Yields:
+            int: The row just drawn
+        """
+        size = self.pixel_size
+        width = framebuffer.width
+        image = tk.PhotoImage(width=width, height=framebuffer.height)
+        zoomed = tk.PhotoImage(width=width * size, height=framebuffer.height * size) if size > 1 else image
+        canvas.image = zoomed
+        canvas.create_image(0, 0, anchor="nw", image=zoomed)
+        # Unpainted cells use the canvas background color
+        colors = ["white" if color is None else hex_color(color) for color in framebuffer.palette]
+        for y in range(framebuffer.height):
+            row = " ".join([colors[index] for index in framebuffer.row(y)])
+            image.put("{" + row + "}", to=(0, y))
+            if size > 1:
+                zoomed.tk.call(zoomed, "copy", image, "-from", 0, y, width, y + 1,
+                               "-to", 0, y * size, "-zoom", size)
+            yield y
+
+    def _draw_grid(self, canvas, width: int, height: int):
+        """
+        Draw the gray grid overlay as one line per cell boundary.
+        
+        Args:
+            canvas (tk.Canvas): Target canvas
+            width (int): Width of the pixel grid
+            height (int): Height of the pixel grid
+            
+        Yields:
+            int: The canvas coordinate of the line just drawn
+        """
+        size = self.pixel_size
+        canvas_width = width * size
+        canvas_height = height * size
+        for x in range(0, canvas_width + 1, size):
+            canvas.create_line(x, 0, x, canvas_height, fill="gray")
+            yield x
+        for y in range(0, canvas_height + 1, size):
+            canvas.create_line(0, y, canvas_width, y, fill="gray")
+            yield y
+
+
+def main(argv=None):
+    """
+    Command-line entry point: compile a PixelDraw file to an image.
+    
+    Args:
+        argv (list): Command-line arguments, defaults to sys.argv[1:]
+        
+    Returns:
+        int: Process exit code
+    """
+    # Only the command line needs argparse; importing the compiler stays fast
+    import argparse  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description="Compile a PixelDraw script to a PNG or PPM image.")
+    parser.add_argument("source", nargs="+",
+                        help="PixelDraw source file(s) or compiled .pdb bytecode ('-' reads standard input)")
+    parser.add_argument("-o", "--output",
+                        help="output image (.png or .ppm, '-' for stdout), bytecode (.pdb), "
+                             "or directory in batch mode")
+    parser.add_argument("-f", "--format", choices=["png", "ppm", "gif"],
+                        help="image format (default: from extension; gif only with --animate)")
+    parser.add_argument("-s", "--pixel-size", type=int,
+                        help="size of each cell in image pixels (default: 1, or 20 with --watch)")
+    parser.add_argument("--grid", action="store_true", help="draw the gray grid outline")
+    parser.add_argument("--max-pixel-writes", type=int, help="reject scripts writing more pixels")
+    parser.add_argument("--max-canvas-bytes", type=int, help="reject scripts needing a larger framebuffer")
+    parser.add_argument("--max-instructions", type=int, help="reject scripts running more instructions")
+    parser.add_argument("--cache-dir", help="reuse compiled rasters cached in this directory")
+    parser.add_argument("--batch", action="store_true", help="batch mode, implied by several sources")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes in batch mode (default: CPU count)")
+    parser.add_argument("--raster-jobs", type=int, default=0,
+                        help="processes rasterizing huge canvases tile by tile (default: serial; "
+                             "not in batch mode, whose workers already compile scripts in parallel)")
+    parser.add_argument("--spill-dir", help="memory-map the chunks of huge sparse canvases in this directory")
+    parser.add_argument("--stream", action="store_true", help="lex, parse and rasterize the file as a stream")
+    parser.add_argument("--optimize", action="store_true",
+                        help="drop draws hidden by later draws (pays off for bytecode rendered many times)")
+    parser.add_argument("--stats", action="store_true", help="print compile statistics to stderr")
+    parser.add_argument("--verbose", action="store_true", help="print every analyzed instruction to stderr")
+    parser.add_argument("--animate", action="store_true",
+                        help="export the frames separated by '---' as a GIF (-o *.gif) or a directory of PPM frames")
+    parser.add_argument("--frame-delay", type=int, default=100, help="display time of every GIF frame in ms")
+    parser.add_argument("--watch", action="store_true",
+                        help="show the source in a live window, updated on every save")
+    args = parser.parse_args(argv)
+    if args.watch:
+        if len(args.source) > 1 or args.source[0] == "-" or args.source[0].endswith(BytecodePD.SUFFIX):
+            parser.error("--watch needs a single source file")
+    elif args.output is None:
+        parser.error("the following arguments are required: -o/--output")
+    batch = args.batch or len(args.source) > 1
+    if batch and args.raster_jobs:
+        parser.error("--raster-jobs cannot be used in batch mode")
+
+    compiler = CompilerPixelDraw()
+    compiler.streaming = args.stream
+    compiler.optimize = args.optimize
+    compiler.raster_workers = args.raster_jobs
+    compiler.spill_dir = args.spill_dir
+    if args.pixel_size is not None:
+        compiler.pixel_size = args.pixel_size
+    elif not args.watch:
+        # Exported images default to one image pixel per cell
+        compiler.pixel_size = 1
+    compiler.track_memory = args.stats
+    if args.cache_dir:
+        compiler.cache = CompileCache(directory=args.cache_dir)
+    if args.verbose:
+        compiler.trace = lambda message: print(message, file=sys.stderr)
+    if args.max_pixel_writes is not None or args.max_canvas_bytes is not None or args.max_instructions is not None:
+        compiler.budget = Budget(args.max_pixel_writes, args.max_canvas_bytes, args.max_instructions)
+    if args.watch:
+        compiler.watch(args.source[0])
+        return 0
+    if batch:
+        return _main_batch(compiler, args)
+    try:
+        if args.source[0].endswith(BytecodePD.SUFFIX):
+            # Compiled bytecode is memory-mapped and replayed, never parsed
+            with BytecodePD.load(args.source[0]) as program:
+                _main_output(compiler, program, args)
+        else:
+            with (sys.stdin if args.source[0] == "-" else open(args.source[0], encoding="utf-8")) as source_file:
+                if args.output.endswith(BytecodePD.SUFFIX):
+                    compiler.compile_to_bytecode(source_file.read(), args.output)
+                    return 0
+                # Streaming reads the file lazily, otherwise it is read at once
+                code = source_file if args.stream and not args.animate else source_file.read()
+                _main_output(compiler, code, args)
+    except Exception as error:  # pylint: disable=broad-except
+        print(error, file=sys.stderr)
+        return 1
+    if args.stats:
+        print(compiler.last_stats, file=sys.stderr)
+    return 0
+
+
+def _main_output(compiler: CompilerPixelDraw, code, args):
+    """Compile one source or bytecode program to the output image (or stdout)."""
+    if args.animate:
+        output = sys.stdout.buffer if args.output == "-" else args.output
+        image_format = "gif" if args.output == "-" else args.format
+        compiler.compile_to_animation(code, output, image_format, args.frame_delay, args.grid, args.stats)
+    elif args.output == "-":
+        compiler.compile_to_image(code, sys.stdout.buffer, args.format or "png", args.grid, args.stats)
+    else:
+        compiler.compile_to_image(code, args.output, args.format, args.grid, args.stats)
+
+
+def _main_batch(compiler: CompilerPixelDraw, args) -> int:
+    """
+    Compile every source file into the output directory over a process pool.
+    
+    Failed scripts are reported on stderr without stopping the batch.
+    
+    Returns:
+        int: Process exit code, 1 if any script failed
+    """
+    from pathlib import Path  # pylint: disable=import-outside-toplevel
+
+    image_format = args.format or "png"
+    failed = 0
+    start = time.perf_counter()
+    results = compiler.compile_many([Path(source) for source in args.source], args.output, args.jobs,
+                                    False, image_format, args.grid)
+    for result in results:
+        if result.error is not None:
+            failed += 1
+            print(f"{result.name}: {result.error}", file=sys.stderr)
+    if args.stats:
+        print(f"{len(args.source)} scripts, {failed} failed, {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
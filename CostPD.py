@@ -0,0 +1,236 @@
+"""This module estimates the cost of a PixelDraw program before it is executed.
+
+The estimate is computed from the instruction tree in one walk (repeat bodies
+are visited once and multiplied by their count), so even hostile programs such
+as `repeat 100000 { rectangle 0 0 500 500 }` are measured instantly. The
+compiler compares the estimate against a Budget and rejects, or downgrades,
+jobs that would exceed it.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+from array import array
+
+from FramebufferPD import Framebuffer
+from InstructionsPD import Circle, Clear, Color, Frame, FrameBreak, Line, Point, Rectangle, Repeat, Size
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised when a program would exceed the configured resource budget."""
+
+
+# pylint: disable=too-few-public-methods
+class CostEstimate:
+    """This class holds the estimated cost of running a program.
+
+    Two figures are kept for instructions and pixel writes: the worst case,
+    where every repeat iteration runs (as needed for the keep_pixels log), and
+    the framebuffer-only case, where idempotent repeat iterations are skipped
+    by the semantic analyzer.
+    """
+
+    # Figures stored alongside compiled output (cache entries, bytecode)
+    FIELDS = ("instructions", "worst_instructions", "pixel_writes",
+              "worst_pixel_writes", "canvas_cells", "canvas_bytes")
+
+    def __init__(self):
+        self.instructions = 0          # Instructions executed in framebuffer-only mode
+        self.worst_instructions = 0    # Instructions executed when every iteration runs
+        self.pixel_writes = 0          # Cell writes in framebuffer-only mode
+        self.worst_pixel_writes = 0    # Cell writes when every iteration runs
+        self.canvas_cells = 0          # Cells of the largest canvas allocated
+        self.canvas_bytes = 0          # Bytes of the largest framebuffer allocated
+
+    def __repr__(self):
+        return (f"CostEstimate(instructions={self.instructions}, worst_instructions={self.worst_instructions}, "
+                f"pixel_writes={self.pixel_writes}, worst_pixel_writes={self.worst_pixel_writes}, "
+                f"canvas_bytes={self.canvas_bytes})")
+
+
+# pylint: disable=too-few-public-methods
+class Budget:
+    """This class represents the resource limits of one compile job.
+
+    A limit set to None is not enforced. With on_exceed="downgrade" a job is
+    not rejected when it exceeds the budget only because of the keep_pixels
+    log (it compiles in framebuffer-only mode) or only because of the dense
+    canvas size (it compiles on a sparse canvas).
+    """
+
+    def __init__(self, max_pixel_writes: int = None, max_canvas_bytes: int = None,
+                 max_instructions: int = None, on_exceed: str = "reject"):
+        if on_exceed not in ("reject", "downgrade"):
+            raise ValueError(f"on_exceed must be 'reject' or 'downgrade', not '{on_exceed}'")
+        self.max_pixel_writes = max_pixel_writes
+        self.max_canvas_bytes = max_canvas_bytes
+        self.max_instructions = max_instructions
+        self.on_exceed = on_exceed
+
+    def violations(self, cost: CostEstimate, keep_pixels: bool = False, sparse: bool = False) -> list:
+        """Returns a description of every limit the estimated cost exceeds.
+
+        Args:
+            cost (CostEstimate): Estimated cost of the program
+            keep_pixels (bool): Whether every repeat iteration will run
+            sparse (bool): Whether the canvas is sparse, so the dense canvas
+                size is not allocated
+
+        Returns:
+            list: One message per exceeded limit (empty if within budget)
+        """
+        writes = cost.worst_pixel_writes if keep_pixels else cost.pixel_writes
+        instructions = cost.worst_instructions if keep_pixels else cost.instructions
+        violations = []
+        if self.max_pixel_writes is not None and writes > self.max_pixel_writes:
+            violations.append(f"{writes} pixel writes (limit {self.max_pixel_writes})")
+        if self.max_instructions is not None and instructions > self.max_instructions:
+            violations.append(f"{instructions} instructions (limit {self.max_instructions})")
+        if not sparse and self.max_canvas_bytes is not None and cost.canvas_bytes > self.max_canvas_bytes:
+            violations.append(f"{cost.canvas_bytes} canvas bytes (limit {self.max_canvas_bytes})")
+        return violations
+
+
+def _ends_frames(instructions: list) -> bool:
+    """Tells whether running the instructions may end an animation frame."""
+    for instruction in instructions:
+        if isinstance(instruction, FrameBreak):
+            return True
+        if isinstance(instruction, Repeat) and instruction.count > 0 and _ends_frames(instruction.body):
+            return True
+    return False
+
+
+def rectangle_writes(width: int, height: int) -> int:
+    """Returns the cells a filled rectangle writes."""
+    return max(0, width) * max(0, height)
+
+
+def line_writes(x1: int, y1: int, x2: int, y2: int) -> int:
+    """Returns the cells a line writes."""
+    return max(abs(x2 - x1), abs(y2 - y1)) + 1
+
+
+def frame_writes(width: int, height: int) -> int:
+    """Returns the cells the outline of a rectangle writes."""
+    width, height = max(0, width), max(0, height)
+    return width * height if width <= 2 or height <= 2 else 2 * (width + height) - 4
+
+
+def circle_writes(radius: int) -> int:
+    """Returns an upper bound of the cells a circle writes: its enclosing square."""
+    return (2 * radius + 1) ** 2
+
+
+def add_repeat(total: list, body: list, count: int, ends_frames: bool):
+    """Adds the counts of a repeat block to the counts of its enclosing block.
+
+    Mirrors SemanticAnalyzer.repeat: in framebuffer-only mode the body runs
+    count times if it ends frames, else once.
+
+    Args:
+        total (list): (instructions, worst_instructions, writes, worst_writes), updated in place
+        body (list): The same counts for one run of the body
+        count (int): Iterations of the block, more than 0
+        ends_frames (bool): Whether running the body may end an animation frame
+    """
+    runs = count if ends_frames else 1
+    total[0] += body[0] * runs
+    total[1] += body[1] * count
+    total[2] += body[2] * runs
+    total[3] += body[3] * count
+
+
+def _estimate(instructions: list, cost: CostEstimate, colors: set):
+    """Returns (instructions, worst_instructions, writes, worst_writes) of one block.
+
+    The color values the block uses are added to colors.
+    """
+    total = [0, 0, 0, 0]
+    for instruction in instructions:
+        total[0] += 1
+        total[1] += 1
+        if isinstance(instruction, Color):
+            colors.add(instruction.value)
+        elif isinstance(instruction, Point):
+            total[2] += 1
+            total[3] += 1
+        elif isinstance(instruction, Rectangle):
+            area = rectangle_writes(instruction.width, instruction.height)
+            total[2] += area
+            total[3] += area
+        elif isinstance(instruction, Line):
+            length = line_writes(instruction.x1, instruction.y1, instruction.x2, instruction.y2)
+            total[2] += length
+            total[3] += length
+        elif isinstance(instruction, Frame):
+            outline = frame_writes(instruction.width, instruction.height)
+            total[2] += outline
+            total[3] += outline
+        elif isinstance(instruction, Circle):
+            area = circle_writes(instruction.radius)
+            total[2] += area
+            total[3] += area
+        elif isinstance(instruction, Clear):
+            # Bounded by the largest canvas seen so far
+            total[2] += cost.canvas_cells
+            total[3] += cost.canvas_cells
+        elif isinstance(instruction, Size):
+            cells = instruction.width * instruction.height
+            cost.canvas_cells = max(cost.canvas_cells, cells)
+        elif isinstance(instruction, Repeat) and instruction.count > 0:
+            body = _estimate(instruction.body, cost, colors)
+            add_repeat(total, body, instruction.count, _ends_frames(instruction.body))
+    return total
+
+
+def estimate_cost(program: list) -> CostEstimate:
+    """Estimates the cost of running a program without executing it.
+
+    Args:
+        program (list): Instruction nodes from the syntactic analyzer
+
+    Returns:
+        CostEstimate: Upper bounds of the work and memory the program needs
+    """
+    return add_cost(CostEstimate(), program, set())
+
+
+def add_cost(cost: CostEstimate, instructions: list, colors: set) -> CostEstimate:
+    """Adds the cost of running more instructions after the ones already estimated.
+
+    Used to estimate a program instruction by instruction as it is parsed:
+    the largest canvas seen so far (which bounds a clear) is kept in cost and
+    the color values seen so far (which decide the framebuffer cell size) in
+    colors, so the running total equals the estimate of the whole program.
+
+    Args:
+        cost (CostEstimate): Estimate of the instructions run before, updated in place
+        instructions (list): Instruction nodes run next
+        colors (set): Color values used so far, updated in place
+
+    Returns:
+        CostEstimate: The updated cost
+    """
+    return add_counts(cost, _estimate(instructions, cost, colors), len(colors))
+
+
+def add_counts(cost: CostEstimate, counts: list, color_count: int) -> CostEstimate:
+    """Adds the counts of a block of instructions to a cost (see add_cost()).
+
+    Args:
+        cost (CostEstimate): Estimate of the instructions run before, updated in place
+        counts (list): (instructions, worst_instructions, writes, worst_writes) of the block
+        color_count (int): Distinct colors used so far
+
+    Returns:
+        CostEstimate: The updated cost
+    """
+    cost.instructions += counts[0]
+    cost.worst_instructions += counts[1]
+    cost.pixel_writes += counts[2]
+    cost.worst_pixel_writes += counts[3]
+    # Cells take one byte unless more colors than fit in a byte may be used
+    typecode = Framebuffer.TYPECODE if color_count <= Framebuffer.NARROW_COLORS else Framebuffer.WIDE_TYPECODE
+    cost.canvas_bytes = cost.canvas_cells * array(typecode).itemsize
+    return cost
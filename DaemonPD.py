@@ -0,0 +1,540 @@
+"""This module contains the PixelDraw compile daemon.
+
+Starting Python and importing the compiler costs more than compiling a small
+script, so pipelines rendering many scripts can keep one daemon running and
+send it compile requests over localhost HTTP instead of starting a process
+per script. The daemon keeps its state warm between requests: the compiled
+lexer patterns, a compiler whose cache holds the rasters of recent scripts,
+a cache of the encoded images and, optionally, a pool of worker processes.
+
+Requests are handled by one thread each and queued for a single batching
+thread. Every batch serves cached images first, compiles each distinct
+script once however many requests asked for it, runs small scripts in the
+daemon itself and sends the large ones of the batch to the worker pool as
+one chunk, so concurrent requests share the cost of a round trip.
+
+Usage:
+
+    python DaemonPD.py --port 8765 --jobs 2
+    curl --data-binary @drawing.pd "http://127.0.0.1:8765/compile?format=png&pixel_size=20" -o drawing.png
+
+From Python, request_compile() sends one request and returns the image bytes.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from AnimationPD import export_animation
+from BatchPD import SETTINGS, compile_chunk, init_worker
+from CachePD import CompileCache, cache_key
+from CompilerPD import CompilerPixelDraw
+from CostPD import Budget
+from ExportPD import export_image
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Formats a request can ask for, with the Content-Type of the response
+CONTENT_TYPES = {"png": "image/png", "ppm": "image/x-portable-pixmap", "gif": "image/gif"}
+
+MAX_SOURCE_BYTES = 16 << 20       # Larger request bodies are rejected
+MAX_PIXEL_SIZE = 64               # Largest accepted cell size in image pixels
+MAX_IMAGE_PIXELS = 1 << 26        # Largest image (or GIF frame) encoded, in image pixels
+INLINE_SOURCE_BYTES = 64 << 10    # Smaller scripts are compiled in the daemon, larger ones in the pool
+REQUEST_TIMEOUT = 120             # Seconds a request handler waits for its image
+
+# Budget of daemons whose compiler has none: clients must not be able to
+# make the daemon allocate or draw without bound
+MAX_PIXEL_WRITES = 1 << 31
+MAX_CANVAS_BYTES = 256 << 20
+MAX_INSTRUCTIONS = 1 << 26
+
+
+class CompileFailed(Exception):
+    """A script failed to compile; error_type names the original exception class."""
+
+    def __init__(self, message: str, error_type: str):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+# pylint: disable=too-few-public-methods
+class CompileRequest:
+    """This class holds one queued compile request and the future of its image."""
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, code: str, image_format: str, pixel_size: int, grid: bool, delay: int):
+        self.code = code
+        self.image_format = image_format  # "png", "ppm" or "gif" (animation)
+        self.pixel_size = pixel_size
+        self.grid = grid
+        self.delay = delay                # Frame delay in milliseconds (gif only)
+        self.key = cache_key(code, (image_format, pixel_size, grid, delay if image_format == "gif" else None))
+        self.future = Future()            # Resolves to the image bytes
+
+
+# pylint: disable=too-many-instance-attributes
+class CompileDaemon:
+    """
+    Compiles queued requests in batches with warm caches and workers.
+
+    The daemon is usable without its HTTP server: submit() queues a request
+    and returns a Future of the image bytes.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, compiler: CompilerPixelDraw = None, workers: int = 0, cache_dir: str = None,
+                 max_cache_bytes: int = 64 << 20, max_batch: int = 64, batch_window: float = 0.0,
+                 request_timeout: float = REQUEST_TIMEOUT):
+        """
+        Start the batching thread and, with workers, the worker pool.
+
+        Args:
+            compiler (CompilerPixelDraw): Template compiler (budget, optimize...);
+                a new one by default. Its raster cache is created if missing,
+                and a compiler without a budget gets default_budget().
+            workers (int): Worker processes for large scripts, 0 to compile
+                everything in the daemon
+            cache_dir (str): Directory keeping compiled rasters across restarts
+            max_cache_bytes (int): Size limit of the in-memory image cache
+            max_batch (int): Most requests handled by one batch
+            batch_window (float): Seconds a batch waits for more requests after
+                its first one; 0 only takes the requests already queued
+            request_timeout (float): Seconds the HTTP handlers wait for an image
+        """
+        self.compiler = compiler if compiler is not None else CompilerPixelDraw()
+        if self.compiler.cache is None:
+            self.compiler.cache = CompileCache(max_cache_bytes, cache_dir)
+        if self.compiler.budget is None:
+            self.compiler.budget = default_budget()
+        self.outputs = CompileCache(max_cache_bytes)  # Encoded images by request key
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.request_timeout = request_timeout
+        self.requests = 0             # Requests submitted
+        self.batches = 0              # Batches run
+        self.compiles = 0             # Scripts compiled in the daemon
+        self.offloaded = 0            # Scripts compiled by the worker pool
+        self.shared = 0               # Requests answered by another request's compile
+        self.restarts = 0             # Worker pools replaced after a worker died
+        self.workers = workers
+        self._lock = threading.Lock()  # Guards the image cache and counters shared with other threads
+        self._queue = queue.Queue()
+        self._executor = None
+        if workers:
+            self._start_pool()
+            # Start every worker now rather than on the first large request
+            for future in [self._executor.submit(compile_chunk, [(0, "size 1x1", None)], None, "png", False)
+                           for _ in range(workers)]:
+                future.result()
+        self._thread = threading.Thread(target=self._serve, name="pixeldraw-batcher", daemon=True)
+        self._thread.start()
+
+    # pylint: disable=too-many-arguments
+    def submit(self, code: str, image_format: str = "png", pixel_size: int = 1, grid: bool = False,
+               delay: int = 100) -> Future:
+        """
+        Queue a compile request.
+
+        Args:
+            code (str): PixelDraw source code
+            image_format (str): "png" or "ppm", or "gif" to compile an animation
+            pixel_size (int): Size of each cell in image pixels
+            grid (bool): Whether to draw the gray grid outline
+            delay (int): Display time of every GIF frame in milliseconds
+
+        Returns:
+            Future: The image bytes, or the compile error as its exception
+
+        Raises:
+            ValueError: If the format or the pixel size is not accepted
+        """
+        if image_format not in CONTENT_TYPES:
+            raise ValueError(f"Unsupported image format: '{image_format}' (use png, ppm or gif)")
+        if not 1 <= pixel_size <= MAX_PIXEL_SIZE:
+            raise ValueError(f"The pixel size must be between 1 and {MAX_PIXEL_SIZE}")
+        request = CompileRequest(code, image_format, pixel_size, grid, delay)
+        with self._lock:
+            self.requests += 1
+        self._queue.put(request)
+        return request.future
+
+    # pylint: disable=too-many-arguments
+    def compile(self, code: str, image_format: str = "png", pixel_size: int = 1, grid: bool = False,
+                delay: int = 100) -> bytes:
+        """Compile a script through the batching queue and wait for its image bytes."""
+        return self.submit(code, image_format, pixel_size, grid, delay).result()
+
+    def close(self):
+        """Finish the queued requests, then stop the batching thread and the worker pool."""
+        self._queue.put(None)
+        self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def stats(self) -> dict:
+        """Returns the counters of the daemon and its caches as a plain dictionary."""
+        with self._lock:
+            outputs = self.outputs.stats()
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "compiles": self.compiles,
+            "offloaded": self.offloaded,
+            "shared": self.shared,
+            "restarts": self.restarts,
+            "pending": self._queue.qsize(),
+            "workers": self.workers,
+            "image_cache": outputs,
+            "raster_cache": self.compiler.cache.stats(),
+        }
+
+    def _serve(self):
+        """Batching thread: take the queued requests in batches until close()."""
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.monotonic() + self.batch_window
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    timeout = deadline - time.monotonic()
+                    request = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+            try:
+                self._run_batch(batch)
+            except Exception as error:  # pylint: disable=broad-except
+                # This thread serves every request: fail the batch, not the daemon
+                self._fail(batch, CompileFailed(str(error) or type(error).__name__, type(error).__name__))
+            if stop:
+                return
+
+    def _run_batch(self, batch: list):
+        """Answer one batch: cached images, then one compile per distinct request key."""
+        self.batches += 1
+        groups = {}
+        for request in batch:
+            with self._lock:
+                image = self.outputs.get(request.key)
+            if image is not None:
+                request.future.set_result(image)
+            elif request.key in groups:
+                groups[request.key].append(request)
+                self.shared += 1
+            else:
+                groups[request.key] = [request]
+
+        # Large still images go to the pool as one chunk; everything else is compiled here
+        offload = []
+        for requests in groups.values():
+            request = requests[0]
+            if (self._executor is not None and request.image_format != "gif"
+                    and len(request.code) > INLINE_SOURCE_BYTES):
+                offload.append(requests)
+            else:
+                self._compile_here(requests)
+        if offload:
+            self.offloaded += len(offload)
+            jobs = [(index, requests[0].code, None) for index, requests in enumerate(offload)]
+            try:
+                future = self._executor.submit(compile_chunk, jobs, None, "png", False)
+            except BrokenProcessPool:
+                # A worker died: the requests it had already failed, this chunk goes to a new pool
+                self._restart_pool()
+                future = self._executor.submit(compile_chunk, jobs, None, "png", False)
+            future.add_done_callback(lambda done: self._finish_offloaded(offload, done))
+
+    def _start_pool(self):
+        """Create the worker pool, its workers configured like the daemon's compiler."""
+        settings = {name: getattr(self.compiler, name) for name in SETTINGS}
+        self._executor = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=(settings,))
+
+    def _restart_pool(self):
+        """Replace a broken worker pool; the futures it still held have already failed."""
+        self._executor.shutdown(wait=False)
+        self.restarts += 1
+        self._start_pool()
+
+    def _compile_here(self, requests: list):
+        """Compile the script of a group of identical requests with the daemon's compiler."""
+        request = requests[0]
+        self.compiles += 1
+        try:
+            stream = io.BytesIO()
+            if request.image_format == "gif":
+                animation = self.compiler.animate(request.code)
+                check_image_size(animation.width, animation.height, request.pixel_size)
+                export_animation(animation, stream, "gif", request.pixel_size, request.grid, request.delay)
+            else:
+                width, height, framebuffer = self.compiler.rasterize(request.code)
+                check_image_size(width, height, request.pixel_size)
+                export_image(framebuffer, stream, request.image_format, request.pixel_size, request.grid)
+        except Exception as error:  # pylint: disable=broad-except
+            self._fail(requests, CompileFailed(str(error), type(error).__name__))
+            return
+        self._answer(requests, stream.getvalue())
+
+    def _finish_offloaded(self, offload: list, future):
+        """Encode the rasters a worker returned and answer their requests (pool callback)."""
+        try:
+            results = future.result()
+        except Exception as error:  # pylint: disable=broad-except
+            for requests in offload:
+                self._fail(requests, CompileFailed(str(error) or type(error).__name__, type(error).__name__))
+            return
+        for result in results:
+            requests = offload[result.index]
+            if result.error is not None:
+                self._fail(requests, CompileFailed(result.error, result.error_type))
+                continue
+            request = requests[0]
+            stream = io.BytesIO()
+            try:
+                check_image_size(result.width, result.height, request.pixel_size)
+                export_image(result.framebuffer, stream, request.image_format, request.pixel_size, request.grid)
+            except Exception as error:  # pylint: disable=broad-except
+                self._fail(requests, CompileFailed(str(error), type(error).__name__))
+                continue
+            self._answer(requests, stream.getvalue())
+
+    def _answer(self, requests: list, image: bytes):
+        """Cache an image and resolve every request waiting for it."""
+        with self._lock:
+            self.outputs.put(requests[0].key, image)
+        for request in requests:
+            request.future.set_result(image)
+
+    @staticmethod
+    def _fail(requests: list, error: CompileFailed):
+        """Resolve every unanswered request of a group with the same compile error."""
+        for request in requests:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP front end of a CompileDaemon.
+
+    POST /compile?format=png&pixel_size=1&grid=0&delay=100 with the source as
+    the body answers the image; GET /stats answers the daemon counters as
+    JSON and GET /health answers "ok". Compile errors and malformed requests
+    are answered with status 400 and a JSON body {"error": message, "type":
+    exception class}; requests not compiled within the daemon's
+    request_timeout with status 503.
+    """
+
+    compile_daemon = None             # CompileDaemon serving the requests, set by serve()
+    protocol_version = "HTTP/1.1"     # Keep-alive, so clients reuse one connection
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answer /stats and /health."""
+        path = urlsplit(self.path).path
+        if path == "/health":
+            self._reply(200, "text/plain", b"ok")
+        elif path == "/stats":
+            self._reply(200, "application/json", json.dumps(self.compile_daemon.stats()).encode())
+        else:
+            self._error(404, f"Unknown path: {path}", "NotFound")
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Answer /compile with the compiled image."""
+        url = urlsplit(self.path)
+        if url.path != "/compile":
+            self._error(404, f"Unknown path: {url.path}", "NotFound")
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            # The body cannot be skipped, so the connection cannot be reused
+            self.close_connection = True
+            self._error(400, f"Invalid Content-Length: {self.headers.get('Content-Length')}", "ValueError")
+            return
+        if length > MAX_SOURCE_BYTES:
+            self.close_connection = True
+            self._error(413, f"Sources are limited to {MAX_SOURCE_BYTES} bytes", "ValueError")
+            return
+        body = self.rfile.read(length)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            code = body.decode("utf-8")
+            image_format = query.get("format", "png")
+            future = self.compile_daemon.submit(code, image_format, int(query.get("pixel_size", 1)),
+                                        query.get("grid", "0") not in ("0", "false", ""),
+                                        int(query.get("delay", 100)))
+        except ValueError as error:
+            self._error(400, str(error), type(error).__name__)
+            return
+        try:
+            image = future.result(timeout=self.compile_daemon.request_timeout)
+        except CompileFailed as error:
+            self._error(400, str(error), error.error_type)
+            return
+        except TimeoutError:
+            self._error(503, f"Not compiled within {self.compile_daemon.request_timeout} seconds", "TimeoutError")
+            return
+        self._reply(200, CONTENT_TYPES[image_format], image)
+
+    def _reply(self, status: int, content_type: str, body: bytes):
+        """Send a complete response."""
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str, error_type: str):
+        """Send an error response with a JSON body."""
+        self._reply(status, "application/json", json.dumps({"error": message, "type": error_type}).encode())
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Requests are not logged; the daemon serves many small ones."""
+
+
+def check_image_size(width: int, height: int, pixel_size: int):
+    """
+    Reject canvases whose image would be too large to encode.
+
+    The budget bounds the canvas cells, but every cell becomes pixel_size^2
+    image pixels.
+
+    Raises:
+        ValueError: If the image has more than MAX_IMAGE_PIXELS pixels
+    """
+    pixels = width * height * pixel_size * pixel_size
+    if pixels > MAX_IMAGE_PIXELS:
+        raise ValueError(f"A {width}x{height} canvas with pixel size {pixel_size} makes a {pixels}-pixel "
+                         f"image (limit {MAX_IMAGE_PIXELS})")
+
+
+def default_budget() -> Budget:
+    """Returns the budget of daemons whose compiler has none (see MAX_PIXEL_WRITES)."""
+    return Budget(MAX_PIXEL_WRITES, MAX_CANVAS_BYTES, MAX_INSTRUCTIONS)
+
+
+def serve(daemon: CompileDaemon, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """
+    Create the HTTP server of a daemon, without running it.
+
+    Args:
+        daemon (CompileDaemon): Daemon compiling the requests
+        host (str): Address to listen on; keep the default to accept only local clients
+        port (int): Port to listen on, 0 for any free port
+
+    Returns:
+        ThreadingHTTPServer: The server, ready for serve_forever()
+    """
+    handler = type("PixelDrawHandler", (DaemonRequestHandler,), {"compile_daemon": daemon})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+# pylint: disable=too-many-arguments
+def request_compile(code: str, image_format: str = "png", pixel_size: int = 1, grid: bool = False,
+                    delay: int = 100, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                    timeout: float = 60) -> bytes:
+    """
+    Compile a script on a running daemon.
+
+    Args:
+        code (str): PixelDraw source code
+        image_format (str): "png", "ppm" or "gif"
+        pixel_size (int): Size of each cell in image pixels
+        grid (bool): Whether to draw the gray grid outline
+        delay (int): Display time of every GIF frame in milliseconds
+        host (str): Address of the daemon
+        port (int): Port of the daemon
+        timeout (float): Seconds to wait for the answer
+
+    Returns:
+        bytes: The image
+
+    Raises:
+        CompileFailed: If the daemon rejected the request or the script failed to compile
+    """
+    import http.client  # pylint: disable=import-outside-toplevel
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        path = f"/compile?format={image_format}&pixel_size={pixel_size}&grid={int(grid)}&delay={delay}"
+        connection.request("POST", path, code.encode("utf-8"), {"Content-Type": "text/plain; charset=utf-8"})
+        response = connection.getresponse()
+        body = response.read()
+    finally:
+        connection.close()
+    if response.status != 200:
+        error = json.loads(body)
+        raise CompileFailed(error["error"], error["type"])
+    return body
+
+
+def main(argv=None):
+    """
+    Command-line entry point: run a compile daemon until interrupted.
+
+    Args:
+        argv (list): Command-line arguments, defaults to sys.argv[1:]
+
+    Returns:
+        int: Process exit code
+    """
+    import argparse  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description="Serve PixelDraw compile requests over localhost HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("-j", "--jobs", type=int, default=0,
+                        help="worker processes for large scripts (default: compile in the daemon)")
+    parser.add_argument("--cache-dir", help="keep compiled rasters in this directory across restarts")
+    parser.add_argument("--cache-bytes", type=int, default=64 << 20, help="size of the in-memory caches")
+    parser.add_argument("--batch-window", type=float, default=0.0,
+                        help="milliseconds a batch waits for more requests (default: 0)")
+    parser.add_argument("--max-pixel-writes", type=int, default=MAX_PIXEL_WRITES,
+                        help=f"reject scripts writing more pixels (default: {MAX_PIXEL_WRITES})")
+    parser.add_argument("--max-canvas-bytes", type=int, default=MAX_CANVAS_BYTES,
+                        help=f"reject scripts needing a larger framebuffer (default: {MAX_CANVAS_BYTES})")
+    parser.add_argument("--max-instructions", type=int, default=MAX_INSTRUCTIONS,
+                        help=f"reject scripts running more instructions (default: {MAX_INSTRUCTIONS})")
+    args = parser.parse_args(argv)
+
+    compiler = CompilerPixelDraw()
+    compiler.budget = Budget(args.max_pixel_writes, args.max_canvas_bytes, args.max_instructions)
+    daemon = CompileDaemon(compiler, args.jobs, args.cache_dir, args.cache_bytes,
+                           batch_window=args.batch_window / 1000)
+    server = serve(daemon, args.host, args.port)
+    print(f"PixelDraw daemon listening on http://{args.host}:{server.server_address[1]} (pid {os.getpid()})",
+          file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
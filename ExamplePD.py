@@ -54,6 +54,23 @@ def example3(compiler_: CompilerPixelDraw):
     compiler_.compile(input_text)
 
 
+def example4(compiler_: CompilerPixelDraw):
+    """This function draws a sun over the horizon using lines, frames and circles."""
+    input_text = """
+    size 30x20
+    color #87CEEB
+    rectangle 0 0 30 20
+    color #FFD700
+    circle (15,12) radius 6
+    color #228B22
+    rectangle 0 14 30 6
+    color #8B4513
+    line (0,14) to (29,14)
+    frame (0,0) (30,20)
+    """
+    compiler_.compile(input_text)
+
+
 if __name__ == "__main__":
     compiler = CompilerPixelDraw()
     # example1(compiler)  # Run first example - RANDOM
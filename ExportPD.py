@@ -0,0 +1,170 @@
+"""This module exports compiled PixelDraw canvases as raster images.
+
+Export does not depend on Tkinter, so it can run on headless machines. Images
+are written as binary PPM (P6) or PNG. PNG data is compressed with the standard
+library zlib module and written chunk by chunk. Both formats are streamed one
+scanline at a time, so a full-size copy of the upscaled image never exists in
+memory.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import os
+import struct
+import zlib
+
+from ColorsPD import resolve_color, rgb_bytes
+
+# Colors used for cells that were never painted and for the grid outline
+BACKGROUND_COLOR = "white"
+GRID_COLOR = "gray"
+
+# Supported output formats by file extension
+IMAGE_FORMATS = {".png": "png", ".ppm": "ppm"}
+
+# Size of the compressed data carried by each PNG IDAT chunk
+PNG_CHUNK_SIZE = 1 << 16
+
+
+def image_format_for(path) -> str:
+    """Returns the image format matching the extension of a path.
+
+    Args:
+        path: Output file path
+
+    Raises:
+        ValueError: If the extension is not a supported image format
+    """
+    extension = os.path.splitext(os.fspath(path))[1].lower()
+    if extension not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format: '{extension}' (use .png or .ppm)")
+    return IMAGE_FORMATS[extension]
+
+
+def scanlines(framebuffer, pixel_size: int = 1, grid: bool = False):
+    """Yields the upscaled image one RGB scanline at a time.
+
+    Every cell becomes a pixel_size x pixel_size block (nearest-neighbor).
+    With grid=True the top row and left column of every block are drawn in
+    the grid color, like the outline of the Tk viewer.
+
+    Args:
+        framebuffer (Framebuffer): Compiled canvas
+        pixel_size (int): Size of each cell in image pixels
+        grid (bool): Whether to draw the gray grid outline
+
+    Yields:
+        bytes: One scanline of width * pixel_size RGB pixels
+    """
+    grid = grid and pixel_size > 1
+    background = rgb_bytes(resolve_color(BACKGROUND_COLOR))
+    grid_rgb = rgb_bytes(resolve_color(GRID_COLOR))
+
+    # One pre-built block of bytes per palette index
+    blocks = []
+    for color in framebuffer.palette:
+        rgb = background if color is None else rgb_bytes(color)
+        blocks.append(grid_rgb + rgb * (pixel_size - 1) if grid else rgb * pixel_size)
+
+    grid_line = grid_rgb * (framebuffer.width * pixel_size)
+    repeats = pixel_size - 1 if grid else pixel_size
+    previous_row = None
+    for y in range(framebuffer.height):
+        row = framebuffer.row(y)
+        # Rows repeat a lot (backgrounds, uniform chunks of sparse canvases)
+        if row != previous_row:
+            line = b"".join([blocks[index] for index in row])
+            previous_row = row
+        if grid:
+            yield grid_line
+        for _ in range(repeats):
+            yield line
+
+
+def write_ppm(framebuffer, stream, pixel_size: int = 1, grid: bool = False):
+    """Writes the canvas as a binary PPM (P6) image to a binary stream.
+
+    Args:
+        framebuffer (Framebuffer): Compiled canvas
+        stream: Writable binary file-like object
+        pixel_size (int): Size of each cell in image pixels
+        grid (bool): Whether to draw the gray grid outline
+    """
+    width = framebuffer.width * pixel_size
+    height = framebuffer.height * pixel_size
+    stream.write(f"P6\n{width} {height}\n255\n".encode("ascii"))
+    for line in scanlines(framebuffer, pixel_size, grid):
+        stream.write(line)
+
+
+def _png_chunk(stream, chunk_type: bytes, data: bytes):
+    """Writes one PNG chunk (length, type, data and CRC)."""
+    stream.write(struct.pack(">I", len(data)))
+    stream.write(chunk_type)
+    stream.write(data)
+    stream.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+
+def write_png(framebuffer, stream, pixel_size: int = 1, grid: bool = False):
+    """Writes the canvas as an 8-bit RGB PNG image to a binary stream.
+
+    Scanlines are compressed as they are produced and flushed as IDAT chunks
+    of roughly PNG_CHUNK_SIZE bytes.
+
+    Args:
+        framebuffer (Framebuffer): Compiled canvas
+        stream: Writable binary file-like object
+        pixel_size (int): Size of each cell in image pixels
+        grid (bool): Whether to draw the gray grid outline
+    """
+    width = framebuffer.width * pixel_size
+    height = framebuffer.height * pixel_size
+    stream.write(b"\x89PNG\r\n\x1a\n")
+    _png_chunk(stream, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    compressor = zlib.compressobj(6)
+    pending = []
+    pending_size = 0
+    for line in scanlines(framebuffer, pixel_size, grid):
+        # Filter type 0 (None) before every scanline
+        data = compressor.compress(b"\x00" + line)
+        if data:
+            pending.append(data)
+            pending_size += len(data)
+            if pending_size >= PNG_CHUNK_SIZE:
+                _png_chunk(stream, b"IDAT", b"".join(pending))
+                pending = []
+                pending_size = 0
+    pending.append(compressor.flush())
+    _png_chunk(stream, b"IDAT", b"".join(pending))
+    _png_chunk(stream, b"IEND", b"")
+
+
+def export_image(framebuffer, target, image_format: str = None, pixel_size: int = 1, grid: bool = False):
+    """Writes the canvas to a file path or a binary stream.
+
+    Args:
+        framebuffer (Framebuffer): Compiled canvas
+        target: Output file path or writable binary file-like object
+        image_format (str): "png" or "ppm", guessed from the path when omitted
+        pixel_size (int): Size of each cell in image pixels
+        grid (bool): Whether to draw the gray grid outline
+
+    Raises:
+        ValueError: If the format is unknown or a color cannot be resolved
+    """
+    if image_format is None:
+        if not isinstance(target, (str, os.PathLike)):
+            raise ValueError("An image format is required when writing to a stream.")
+        image_format = image_format_for(target)
+    writers = {"png": write_png, "ppm": write_ppm}
+    if image_format not in writers:
+        raise ValueError(f"Unsupported image format: '{image_format}' (use png or ppm)")
+    writer = writers[image_format]
+
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, "wb") as stream:
+            writer(framebuffer, stream, pixel_size, grid)
+    else:
+        writer(framebuffer, target, pixel_size, grid)
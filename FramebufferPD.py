@@ -0,0 +1,298 @@
+"""This module represents the framebuffer used by the PixelDraw semantic analyzer.
+
+The framebuffer is a fixed width x height raster that stores one palette index
+per canvas cell. Drawing commands write into it directly, so memory stays bounded
+by the canvas size no matter how many times the script draws over the same cells.
+The palette holds packed 0xRRGGBB colors, already resolved by the semantic
+analyzer, and cells take a single byte until more than 255 colors are used.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import struct
+import sys
+from array import array
+from itertools import groupby
+
+from ColorsPD import rgb_bytes
+
+
+class Framebuffer:
+    """This class represents a palette-indexed raster for PixelDraw.
+
+    Cells are stored row-major in a flat ``array`` of palette indices. Index 0
+    is reserved for cells that were never painted (they show the canvas
+    background), every other index refers to an entry of ``palette``. The
+    cells start as unsigned bytes (``typecode`` "B") and are widened to 16
+    bits when the 256th palette entry is added.
+    """
+
+    # Unsigned 8-bit cells up to 255 colors, 16-bit cells up to 65535 colors
+    TYPECODE = "B"
+    WIDE_TYPECODE = "H"
+    NARROW_COLORS = 0xFF
+    MAX_COLORS = 0xFFFF
+
+    # Serialized header: width, height, number of colors and bytes per cell
+    HEADER = struct.Struct("<IIIB")
+
+    def __init__(self, width: int, height: int):
+        """
+        Initialize an empty framebuffer.
+
+        Args:
+            width (int): Width of the canvas in cells
+            height (int): Height of the canvas in cells
+        """
+        self.width = width
+        self.height = height
+
+        # Palette of packed RGB colors, index 0 means "not painted"
+        self.palette = [None]
+        self._palette_lookup = {}
+
+        # One palette index per cell, all cells start unpainted
+        self.typecode = self.TYPECODE
+        self.cells = array(self.typecode, [0]) * (width * height)
+
+    def color_index(self, color: int) -> int:
+        """Returns the palette index of a color, adding it to the palette if needed.
+
+        Args:
+            color (int): Packed 0xRRGGBB color
+
+        Returns:
+            int: Palette index of the color
+
+        Raises:
+            Exception: If the palette is full
+        """
+        index = self._palette_lookup.get(color)
+        if index is None:
+            index = len(self.palette)
+            if index > self.MAX_COLORS:
+                raise Exception(f"Semantic Error: Too many distinct colors (maximum {self.MAX_COLORS}).")
+            if index > self.NARROW_COLORS and self.typecode != self.WIDE_TYPECODE:
+                self._widen()
+            self.palette.append(color)
+            self._palette_lookup[color] = index
+        return index
+
+    def _widen(self):
+        """Switches the cells to 16-bit palette indices."""
+        self.typecode = self.WIDE_TYPECODE
+        self.cells = array(self.typecode, self.cells)
+
+    def set_pixel(self, x: int, y: int, color):
+        """Paints a single cell. Coordinates must already be validated.
+
+        Args:
+            x (int): X coordinate of the cell
+            y (int): Y coordinate of the cell
+            color (int): Packed RGB color to paint
+        """
+        self.cells[y * self.width + x] = self.color_index(color)
+
+    def fill_span(self, x: int, y: int, length: int, color):
+        """Paints a horizontal run of cells with one slice write.
+
+        Coordinates must already be validated. This is the fast path shared by
+        every filled primitive.
+
+        Args:
+            x (int): X coordinate of the first cell
+            y (int): Y coordinate of the row
+            length (int): Number of cells to paint
+            color (int): Packed RGB color to paint
+        """
+        # Resolve the color first: a new palette entry may widen the cells
+        index = self.color_index(color)
+        start = y * self.width + x
+        self.cells[start:start + length] = array(self.typecode, [index]) * length
+
+    def fill_rect(self, x: int, y: int, w: int, h: int, color):
+        """Paints a filled rectangle with one slice write per row.
+
+        Coordinates must already be validated. A rectangle spanning whole rows
+        is written with a single slice.
+
+        Args:
+            x (int): X coordinate of the top-left cell
+            y (int): Y coordinate of the top-left cell
+            w (int): Width of the rectangle in cells
+            h (int): Height of the rectangle in cells
+            color (int): Packed RGB color to paint
+        """
+        if w <= 0 or h <= 0:
+            return
+        # Resolve the color first: a new palette entry may widen the cells
+        index = self.color_index(color)
+        cells = self.cells
+        width = self.width
+        if x == 0 and w == width:
+            # Full-width rectangle: the rows are contiguous in memory
+            start = y * width
+            cells[start:start + w * h] = array(self.typecode, [index]) * (w * h)
+            return
+        run = array(self.typecode, [index]) * w
+        start = y * width + x
+        for row_start in range(start, start + h * width, width):
+            cells[row_start:row_start + w] = run
+
+    def copy_from(self, source):
+        """Paints the painted cells of another framebuffer that fit in this one.
+
+        Used when a later `size` changes the canvas dimensions: what was drawn
+        is kept, clipped to the new canvas. The palette of source is added
+        first, so its colors keep their indices in a new framebuffer.
+
+        Args:
+            source (Framebuffer): Framebuffer of the previous canvas
+        """
+        palette = source.palette
+        for color in palette[1:]:
+            self.color_index(color)
+        for x0, y0, width, height, value in source.chunks():
+            w = min(width, self.width - x0)
+            h = min(height, self.height - y0)
+            if w <= 0 or h <= 0:
+                continue
+            if isinstance(value, int):
+                if value:
+                    self.fill_rect(x0, y0, w, h, palette[value])
+                continue
+            for row in range(h):
+                x = x0
+                start = row * width
+                for index, run in groupby(value[start:start + w]):
+                    length = sum(1 for _ in run)
+                    if index:
+                        self.fill_span(x, y0 + row, length, palette[index])
+                    x += length
+
+    def clear(self):
+        """Marks every cell as unpainted with a single buffer write.
+
+        The palette is kept, so colors drawn again reuse their indices.
+        """
+        self.cells[:] = array(self.typecode, [0]) * len(self.cells)
+
+    def get_pixel(self, x: int, y: int):
+        """Returns the packed RGB color of a cell, or None if it was never painted.
+
+        Args:
+            x (int): X coordinate of the cell
+            y (int): Y coordinate of the cell
+        """
+        return self.palette[self.cells[y * self.width + x]]
+
+    def row(self, y: int, x0: int = 0, x1: int = None):
+        """Returns the palette indices of one row, or part of it, as an array slice.
+
+        Args:
+            y (int): Y coordinate of the row
+            x0 (int): First column to include
+            x1 (int): Column after the last one to include (defaults to the width)
+        """
+        start = y * self.width
+        return self.cells[start + x0:start + (self.width if x1 is None else x1)]
+
+    def runs(self, y: int):
+        """Yields the same-color horizontal runs of one row.
+
+        Args:
+            y (int): Y coordinate of the row
+
+        Yields:
+            tuple: (x, length, palette_index) for every run, unpainted runs included
+        """
+        x = 0
+        for index, run in groupby(self.row(y)):
+            length = sum(1 for _ in run)
+            yield x, length, index
+            x += length
+
+    def uniform_index(self, x0: int, y0: int, x1: int, y1: int):
+        """Returns the palette index shared by every cell of a region, else None.
+
+        A dense framebuffer does not track uniform regions, so it never
+        reports one; see SparseFramebuffer.
+        """
+        return None
+
+    def chunks(self):
+        """Yields the canvas as a single chunk (x, y, width, height, cells).
+
+        See SparseFramebuffer.chunks(), which skips the untouched regions.
+        """
+        yield 0, 0, self.width, self.height, self.cells
+
+    def painted_cells(self) -> int:
+        """Returns how many cells were painted."""
+        return len(self.cells) - self.cells.count(0)
+
+    def pixels(self):
+        """Yields the final visible pixels as (x, y, color) tuples.
+
+        Unpainted cells are skipped and every painted cell is reported exactly
+        once, in row-major order.
+        """
+        width = self.width
+        palette = self.palette
+        for offset, index in enumerate(self.cells):
+            if index:
+                yield offset % width, offset // width, palette[index]
+
+    def to_bytes(self) -> bytes:
+        """Serializes the framebuffer: header, RGB palette and little-endian cells.
+
+        Returns:
+            bytes: Data that from_bytes() turns back into an equal framebuffer
+        """
+        palette = b"".join(rgb_bytes(color) for color in self.palette[1:])
+        cells = self.cells
+        if sys.byteorder == "big" and cells.itemsize > 1:
+            cells = array(self.typecode, cells)
+            cells.byteswap()
+        header = self.HEADER.pack(self.width, self.height, len(self.palette) - 1, cells.itemsize)
+        return header + palette + cells.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """Rebuilds a framebuffer serialized by to_bytes().
+
+        Args:
+            data (bytes): Serialized framebuffer
+
+        Returns:
+            Framebuffer: The deserialized framebuffer
+
+        Raises:
+            ValueError: If the data is truncated or malformed
+        """
+        try:
+            width, height, colors, itemsize = cls.HEADER.unpack_from(data)
+        except struct.error as error:
+            raise ValueError(f"Framebuffer data is truncated: {error}") from error
+        offset = cls.HEADER.size + 3 * colors
+        palette = bytes(data[cls.HEADER.size:offset])
+        if len(palette) != 3 * colors:
+            raise ValueError(f"Framebuffer data has {len(palette) // 3} palette colors, expected {colors}")
+        framebuffer = cls(0, 0)
+        framebuffer.width = width
+        framebuffer.height = height
+        for start in range(0, len(palette), 3):
+            framebuffer.color_index(int.from_bytes(palette[start:start + 3], "big"))
+        cells = array(framebuffer.typecode)
+        if cells.itemsize != itemsize:
+            raise ValueError(f"Framebuffer data has {itemsize}-byte cells for {colors} colors")
+        cells.frombytes(memoryview(data)[offset:])
+        if len(cells) != width * height:
+            raise ValueError(f"Framebuffer data has {len(cells)} cells, expected {width * height}")
+        if sys.byteorder == "big" and itemsize > 1:
+            cells.byteswap()
+        if cells and max(cells) >= len(framebuffer.palette):
+            raise ValueError(f"Framebuffer data has cell index {max(cells)} for {len(framebuffer.palette)} colors")
+        framebuffer.cells = cells
+        return framebuffer
@@ -0,0 +1,126 @@
+"""This module defines the instruction tree shared by the PixelDraw compiler phases.
+
+The syntactic analyzer builds these nodes while validating the tokens, with all
+numeric fields already converted to integers. Repeat blocks keep their body as
+child nodes. Later phases walk this tree instead of re-reading token strings.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+
+class Instruction:
+    """Base class of all PixelDraw instructions.
+
+    Subclasses list their fields in __slots__; equality and the string
+    representation are derived from them.
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self):
+        fields = ", ".join(repr(getattr(self, name)) for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Size(Instruction):
+    """size WxH - sets the canvas dimensions."""
+
+    __slots__ = ("width", "height")
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+
+
+class Color(Instruction):
+    """color <value> - sets the current drawing color."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: str):
+        self.value = value
+
+
+class Point(Instruction):
+    """point X Y - draws a single pixel."""
+
+    __slots__ = ("x", "y")
+
+    def __init__(self, x: int, y: int):
+        self.x = x
+        self.y = y
+
+
+class Rectangle(Instruction):
+    """rectangle X Y W H - draws a filled rectangle."""
+
+    __slots__ = ("x", "y", "width", "height")
+
+    def __init__(self, x: int, y: int, width: int, height: int):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+
+class Clear(Instruction):
+    """clear - erases every cell of the canvas back to the background."""
+
+    __slots__ = ()
+
+
+class Line(Instruction):
+    """line (X1,Y1) to (X2,Y2) - draws a line between two cells, both included."""
+
+    __slots__ = ("x1", "y1", "x2", "y2")
+
+    def __init__(self, x1: int, y1: int, x2: int, y2: int):
+        self.x1 = x1
+        self.y1 = y1
+        self.x2 = x2
+        self.y2 = y2
+
+
+class Frame(Instruction):
+    """frame (X,Y) (W,H) - draws the outline of a rectangle."""
+
+    __slots__ = ("x", "y", "width", "height")
+
+    def __init__(self, x: int, y: int, width: int, height: int):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+
+class Circle(Instruction):
+    """circle (X,Y) radius R - draws a filled circle centered on a cell."""
+
+    __slots__ = ("x", "y", "radius")
+
+    def __init__(self, x: int, y: int, radius: int):
+        self.x = x
+        self.y = y
+        self.radius = radius
+
+
+class FrameBreak(Instruction):
+    """--- - ends the current animation frame; the canvas carries over to the next one."""
+
+    __slots__ = ()
+
+
+class Repeat(Instruction):
+    """repeat N { ... } - runs the body instructions N times."""
+
+    __slots__ = ("count", "body")
+
+    def __init__(self, count: int, body: list):
+        self.count = count
+        self.body = body
@@ -5,21 +5,92 @@ Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
 """
 
 import re
+from collections import deque
+
+
+# Define token patterns using regular expressions
+# Order is important: more specific patterns should come before general ones
+TOKEN_SPECIFICATION = [
+
+                # Drawing Characteristics
+    ("CLEAR",      r"clear"),                                    # clear - clears the canvas
+    ("PIXEL",      r"pixel"),                                    # pixel - draws a single pixel
+    ("LINE",       r"line"),                                     # line - draws a line
+    ("FRAME",      r"frame"),                                    # frame - draws an empty rectangle
+    ("CIRCLE",     r"circle"),                                   # circle - draws a circle
+    ("TO",         r"to"),                                       # to - used for coordinates (e.g., "to (10,20)")
+    ("RADIUS",     r"radius"),                                   # radius - sets circle radius
+    ("COLOR",      r"color\s+(#[0-9a-fA-F]{6}|[a-zA-Z]+)"),     # color #FF0000 or color red
+    
+    # Space set patterns
+    ("SIZE",    r"size\s+\d+x\d+"),                         # size WxH - sets canvas size
+    ("POINT",      r"point\s+\d+\s+\d+"),                         # point X Y - draws a point
+    ("RECTANGLE", r"rectangle\s+\d+\s+\d+\s+\d+\s+\d+"),        # rectangle X Y W H - draws rectangle
+    ("REPEAT_INI",r"repeat\s+\d+\s+\{"),                        # repeat N { - start repeat block
+    ("REPEAT_END",r"\}"),                                        # } - end repeat block
+    ("FRAME_BREAK",r"---"),                                      # --- - ends an animation frame
+    
+    # Punctuation and symbols
+    ("LPAREN",     r"\("),                                       # ( - left parenthesis
+    ("RPAREN",     r"\)"),                                       # ) - right parenthesis
+    ("COMMA",      r","),                                        # , - comma separator
+    
+    # Numeric and coordinate patterns
+    ("NUMBER",     r"\d+"),                                      # integers - any sequence of digits
+    ("COORDINATE", r"\(\s*\d+\s*,\s*\d+\s*\)"),                  # (X,Y) - coordinate pair with optional spaces
+    ("DIMENSION",  r"\(\s*\d+\s*,\s*\d+\s*\)"),                  # (W,H) - dimension pair (same pattern as coordinate)
+    
+    # Color value patterns (must be after COLOR)
+    ("COLORNAME",  r"[a-zA-Z]+"),                                # color names like red, blue, green, etc.
+    ("COLORHEX",   r"#[0-9a-fA-F]{6}"),                         # hex colors like #FF0000, #00FF00, etc.
+    
+    # Comments and whitespace (to be ignored)
+    ("COMMENT",    r"#.*"),                                      # # comment - everything from # to end of line
+    ("SKIP",       r"[ \t\n]+"),                                  # Skip spaces, tabs, newlines
+    ("MISMATCH",   r"."),                                         # Any other character - will cause error
+]
+
+# Combine all patterns into a single regex, compiled once when the module is imported
+MASTER_PATTERN = re.compile("|".join(
+    f"(?P<{pair[0]}>{pair[1]})" for pair in TOKEN_SPECIFICATION
+))
+
+# Integer kind of every token type, its position in TOKEN_SPECIFICATION; the
+# parser dispatches on these instead of comparing type names
+TOKEN_KINDS = {name: kind for kind, (name, _pattern) in enumerate(TOKEN_SPECIFICATION)}
+
+# A token decision never looks further than a few whitespace-separated words
+# ahead (the longest pattern, rectangle X Y W H, has five). When reading a
+# stream in chunks, tokens are only emitted while at least this many words of
+# lookahead are buffered, which makes the result identical to lexing the whole
+# source at once.
+LOOKAHEAD_WORDS = 8
+WORD_PATTERN = re.compile(r"\S+")
 
 
 # pylint: disable=too-few-public-methods
 class Token:
     """This class represents the data structure of a token.
-    It means: a type of token and its value (lexeme)."""
+    It means: a type of token, its value (lexeme) and where it starts
+    in the source (1-based line and column)."""
 
-    def __init__(self, type_: str, value):
+    __slots__ = ("type_", "kind", "value", "line", "column")
+
+    def __init__(self, type_: str, value, line: int = None, column: int = None):
         # Initialize token with its type (e.g., "NUMBER", "COLOR") and value (e.g., "42", "red")
         self.type_ = type_
+        # Integer form of the type (see TOKEN_KINDS)
+        self.kind = TOKEN_KINDS[type_]
         self.value = value
+        # Source position of the first character of the token
+        self.line = line
+        self.column = column
 
     def __repr__(self):
         # String representation for debugging and logging
-        return f"Token({self.type_}, {self.value})"
+        if self.line is None:
+            return f"Token({self.type_}, {self.value})"
+        return f"Token({self.type_}, {self.value}) at line {self.line}, column {self.column}"
 
 
 class LexicalAnalyzer:
@@ -29,6 +100,9 @@ class LexicalAnalyzer:
     that can be processed by the syntactic analyzer.
     """
 
+    # Characters read at a time from file-like sources
+    CHUNK_SIZE = 1 << 16
+
     @staticmethod
     def lex(code):
         """This method receives a code and returns a list of tokens.
@@ -42,74 +116,86 @@ class LexicalAnalyzer:
         Raises:
             RuntimeError: If an unrecognized character or token is found
         """
-        tokens = []
+        return list(LexicalAnalyzer.iter_tokens(code))
+
+    @staticmethod
+    def iter_tokens(source, chunk_size: int = None):
+        """This method lazily yields the tokens of a string or a text stream.
         
-        # Define token patterns using regular expressions
-        # Order is important: more specific patterns should come before general ones
-        token_specification = [
-
-                        # Drawing Characteristics
-            ("CLEAR",      r"clear"),                                    # clear - clears the canvas
-            ("PIXEL",      r"pixel"),                                    # pixel - draws a single pixel
-            ("LINE",       r"line"),                                     # line - draws a line
-            ("FRAME",      r"frame"),                                    # frame - draws an empty rectangle
-            ("CIRCLE",     r"circle"),                                   # circle - draws a circle
-            ("TO",         r"to"),                                       # to - used for coordinates (e.g., "to (10,20)")
-            ("RADIUS",     r"radius"),                                   # radius - sets circle radius
-            ("COLOR",      r"color\s+(#[0-9a-fA-F]{6}|[a-zA-Z]+)"),     # color #FF0000 or color red
-            
-            # Space set patterns
-            ("SIZE",    r"size\s+\d+x\d+"),                         # size WxH - sets canvas size
-            ("POINT",      r"point\s+\d+\s+\d+"),                         # point X Y - draws a point
-            ("RECTANGLE", r"rectangle\s+\d+\s+\d+\s+\d+\s+\d+"),        # rectangle X Y W H - draws rectangle
-            ("REPEAT_INI",r"repeat\s+\d+\s+\{"),                        # repeat N { - start repeat block
-            ("REPEAT_END",r"\}"),                                        # } - end repeat block
-            
-            # Punctuation and symbols
-            ("LPAREN",     r"\("),                                       # ( - left parenthesis
-            ("RPAREN",     r"\)"),                                       # ) - right parenthesis
-            ("COMMA",      r","),                                        # , - comma separator
-            
-            # Numeric and coordinate patterns
-            ("NUMBER",     r"\d+"),                                      # integers - any sequence of digits
-            ("COORDINATE", r"\(\s*\d+\s*,\s*\d+\s*\)"),                  # (X,Y) - coordinate pair with optional spaces
-            ("DIMENSION",  r"\(\s*\d+\s*,\s*\d+\s*\)"),                  # (W,H) - dimension pair (same pattern as coordinate)
-            
-            # Color value patterns (must be after COLOR)
-            ("COLORNAME",  r"[a-zA-Z]+"),                                # color names like red, blue, green, etc.
-            ("COLORHEX",   r"#[0-9a-fA-F]{6}"),                         # hex colors like #FF0000, #00FF00, etc.
+        File-like sources are read chunk by chunk, so memory use does not
+        depend on the size of the source.
+        
+        Args:
+            source: Source code as a str, or a text file-like object with read()
+            chunk_size (int): Characters read at a time (defaults to CHUNK_SIZE)
             
-            # Comments and whitespace (to be ignored)
-            ("COMMENT",    r"#.*"),                                      # # comment - everything from # to end of line
-            ("SKIP",       r"[ \t\n]+"),                                  # Skip spaces, tabs, newlines
-            ("MISMATCH",   r"."),                                         # Any other character - will cause error
-        ]
-
-        # Combine all patterns into a single regex for efficient matching
-        tok_regex = "|".join(
-            f"(?P<{pair[0]}>{pair[1]})" for pair in token_specification
-        )
-
-        # Iterate through all matches in the input code
-        for mo in re.finditer(tok_regex, code):
-            kind = mo.lastgroup  # Get the name of the matched group
-            value = mo.group()   # Get the actual matched text
-
-            if kind is None:
-                # This should not happen with our regex, but just in case
-                raise RuntimeError(f"Unexpected regex match without group: '{value}'")
+        Yields:
+            Token: Tokens in source order, with their line and column
             
-            if kind == "MISMATCH":
-                # Throw an error if the character is not recognized by any pattern
-                raise RuntimeError(f"Unexpected token: '{value}'")
-            if kind == "SKIP":
-                # Skip whitespace - don't create tokens for spaces, tabs, newlines
-                continue
-            if kind == "COMMENT":
-                # Skip comments - don't create tokens for comment lines
-                continue
+        Raises:
+            RuntimeError: If an unrecognized character or token is found
+        """
+        if isinstance(source, str):
+            buffer, read, eof = source, None, True
+        else:
+            buffer, read, eof = "", source.read, False
+            chunk_size = chunk_size or LexicalAnalyzer.CHUNK_SIZE
+
+        pos = 0          # Position of the next token in the buffer
+        line = 1         # Line of the character at pos
+        line_start = 0   # Buffer position where that line starts (may be negative)
+
+        while True:
+            if not eof:
+                chunk = read(chunk_size)
+                if chunk:
+                    # Drop the consumed text and append the new chunk
+                    buffer = buffer[pos:] + chunk
+                    line_start -= pos
+                    pos = 0
+                else:
+                    eof = True
+            limit = len(buffer) if eof else LexicalAnalyzer._safe_limit(buffer, pos)
+
+            # Iterate through the matches in the safe part of the buffer
+            for mo in MASTER_PATTERN.finditer(buffer, pos):
+                start = mo.start()
+                if not eof and (start >= limit or mo.end() >= len(buffer)):
+                    # The token could still change with the next chunk
+                    break
+                kind = mo.lastgroup  # Get the name of the matched group
+                value = mo.group()   # Get the actual matched text
+
+                if kind is None:
+                    # This should not happen with our regex, but just in case
+                    raise RuntimeError(f"Unexpected regex match without group: '{value}'")
                 
-            # Create a token for the matched pattern and add it to the list
-            tokens.append(Token(kind, value.strip()))
+                if kind == "MISMATCH":
+                    # Throw an error if the character is not recognized by any pattern
+                    raise RuntimeError(f"Unexpected token: '{value}' at line {line}, "
+                                       f"column {start - line_start + 1}")
+                if kind != "SKIP" and kind != "COMMENT":
+                    # Skip whitespace and comments - create tokens for everything else
+                    yield Token(kind, value.strip(), line, start - line_start + 1)
+
+                # Keep track of the current line
+                newlines = value.count("\n")
+                if newlines:
+                    line += newlines
+                    line_start = start + value.rindex("\n") + 1
+                pos = mo.end()
 
-        return tokens 
\ No newline at end of file
+            if eof:
+                return
+
+    @staticmethod
+    def _safe_limit(buffer: str, pos: int) -> int:
+        """Returns the buffer position before which tokens can be emitted safely.
+        
+        Tokens starting before the LOOKAHEAD_WORDS-th last word of the buffer
+        have enough lookahead to be decided without the rest of the stream.
+        """
+        last_words = deque(WORD_PATTERN.finditer(buffer, pos), maxlen=LOOKAHEAD_WORDS)
+        if len(last_words) < LOOKAHEAD_WORDS:
+            return pos
+        return last_words[0].start()
@@ -0,0 +1,472 @@
+"""This module contains the incremental compiler and live preview of PixelDraw.
+
+LiveSession keeps the source, tokens and instruction tree of the last compile
+indexed by source line. When the source changes, only the lines around the
+edit are lexed again: lexing restarts a few words before the first changed
+line and stops as soon as it reaches a token boundary of the unchanged tail,
+from which the old tokens are reused. Parsing resynchronizes the same way on
+top-level instruction boundaries. The semantic analysis then resumes from the
+last framebuffer checkpoint before the first changed instruction, and the
+rows whose cells changed are reported as the dirty region.
+
+LivePreview keeps one Tk window on a source file and repaints only the
+canvas items of the dirty rows after every save.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import os
+import time
+from array import array
+from itertools import islice
+
+import tkinter as tk
+
+from ColorsPD import hex_color
+from FramebufferPD import Framebuffer
+from LexicalPd import LOOKAHEAD_WORDS, WORD_PATTERN, LexicalAnalyzer
+from SemanticPD import SemanticAnalyzer
+from SintacticPD import SintacticAnalyzerPixelDraw
+
+
+class _LineReader:
+    """Text file-like object reading a list of lines from a given line on."""
+
+    def __init__(self, lines: list, start: int):
+        self._last = len(lines) - 1
+        self._lines = enumerate(islice(lines, start, None), start)
+
+    def read(self, size: int) -> str:
+        pieces = []
+        total = 0
+        for number, line in self._lines:
+            piece = line if number == self._last else line + "\n"
+            pieces.append(piece)
+            total += len(piece)
+            if total >= size:
+                break
+        return "".join(pieces)
+
+
+def _first_difference(old: list, new: list) -> int:
+    """Returns the length of the common prefix of two lists (binary search on slices)."""
+    low, high = 0, min(len(old), len(new))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[low:middle] == new[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix(old: list, new: list, limit: int) -> int:
+    """Returns the length of the common suffix of two lists, at most limit."""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[len(old) - middle:len(old) - low] == new[len(new) - middle:len(new) - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+# pylint: disable=too-many-instance-attributes
+class LiveSession:
+    """
+    Incremental compiler of one changing source.
+
+    All state is indexed by source line, so an edit only touches the lists
+    of the lines it changed; lines after it are reused without renumbering.
+    Only dense canvases are supported.
+    """
+
+    MIN_CHECKPOINT_INTERVAL = 64      # Top-level instructions between two checkpoints at first
+    MAX_CHECKPOINTS = 64              # Checkpoints kept; beyond that they are thinned out
+
+    def __init__(self):
+        self.lines = []               # Source lines of the last accepted source
+        self.line_tokens = []         # Tokens starting on every line
+        self.line_starts = []         # (token offset, node) of top-level instructions starting on every line
+        self.framebuffer = None       # Canvas of the last run
+        self.width = None             # Canvas size of the last run
+        self.height = None
+        self.checkpoints = [(0, None)]  # (line, state) sorted by line; state before the line runs
+        self.interval = self.MIN_CHECKPOINT_INTERVAL
+        self.failed = True            # Whether the canvas is stale (nothing run yet, or the last run raised)
+        self.rerun_from = None        # Line the last run resumed from
+        self._shown = None            # (width, height, cells) of the last reported canvas
+
+    def update(self, code: str):
+        """
+        Bring the compiled canvas up to date with a new version of the source.
+
+        When lexing or parsing fails, nothing changes and the next update is
+        compared with the last accepted source. When the semantic analysis
+        fails, the new source is accepted and the next update runs again.
+
+        Args:
+            code (str): The complete new source
+
+        Returns:
+            tuple: (x0, y0, x1, y1) bounding box of the changed cells, end
+            exclusive, or None if no cell changed
+
+        Raises:
+            RuntimeError: If lexical analysis fails
+            SyntaxError: If syntactic analysis fails
+            Exception: If semantic analysis fails
+        """
+        lines = code.split("\n")
+        old = self.lines
+        first = _first_difference(old, lines)
+        if first == len(old) == len(lines) and not self.failed:
+            return None
+        tail = _common_suffix(old, lines, min(len(old), len(lines)) - first)
+        delta = len(lines) - len(old)
+
+        restart = self._restart_line(first)
+        line_tokens, resync = self._relex(lines, restart, len(lines) - tail, delta)
+        line_starts, changed = self._reparse(line_tokens, restart, resync, delta)
+
+        self.lines = lines
+        self.line_tokens = line_tokens
+        self.line_starts = line_starts
+        # Checkpoints after the re-lexed lines may be keyed by shifted lines
+        limit = restart if changed is None else min(restart, changed)
+        self.checkpoints = [checkpoint for checkpoint in self.checkpoints if checkpoint[0] <= limit]
+        if changed is None and not self.failed:
+            return None
+        self._run()
+        return self._dirty()
+
+    def _restart_line(self, first: int) -> int:
+        """Returns the line lexing restarts from for a change starting at a line.
+
+        Tokens look at most LOOKAHEAD_WORDS words ahead, so the ones that start
+        that many words before the change cannot change; the restart line is
+        also moved back so that it never falls inside a multi-line token.
+        """
+        line = min(first, len(self.lines))
+        words = 0
+        while line > 0 and words < LOOKAHEAD_WORDS:
+            line -= 1
+            words += len(WORD_PATTERN.findall(self.lines[line]))
+        while line > 0:
+            previous = line - 1
+            while previous >= 0 and not self.line_tokens[previous]:
+                previous -= 1
+            if previous < 0 or previous + self.line_tokens[previous][-1].value.count("\n") < line:
+                break
+            line = previous
+        return line
+
+    def _relex(self, lines: list, restart: int, tail_start: int, delta: int) -> tuple:
+        """
+        Lex the new lines from the restart line until the old tokens line up again.
+
+        Args:
+            lines (list): New source lines
+            restart (int): First line to lex
+            tail_start (int): First line of the unchanged tail, in new numbering
+            delta (int): Number of lines added by the edit
+
+        Returns:
+            tuple: (line_tokens, resync) - the tokens of every new line and,
+            when old tokens are reused, (line, new token offset, old token
+            offset) of the first reused token, or None
+        """
+        relexed = []
+        resync = None
+        for token in LexicalAnalyzer.iter_tokens(_LineReader(lines, restart), 4096):
+            line = restart + token.line - 1
+            if line >= tail_start:
+                old_tokens = self.line_tokens[line - delta]
+                offset = next((index for index, old_token in enumerate(old_tokens)
+                               if old_token.column == token.column), None)
+                if offset is not None:
+                    resync = (line, offset)
+                    break
+            token.line = line + 1
+            while len(relexed) <= line - restart:
+                relexed.append([])
+            relexed[line - restart].append(token)
+        if resync is None:
+            relexed.extend([] for _ in range(len(lines) - restart - len(relexed)))
+            return self.line_tokens[:restart] + relexed, None
+        relexed.extend([] for _ in range(resync[0] - restart + 1 - len(relexed)))
+        line, offset = resync
+        reused = self.line_tokens[line - delta]
+        merged = relexed[line - restart] + reused[offset:]
+        line_tokens = (self.line_tokens[:restart] + relexed[:line - restart] + [merged]
+                       + self.line_tokens[line - delta + 1:])
+        return line_tokens, (line, len(relexed[line - restart]), offset)
+
+    def _parse_start(self, restart: int) -> tuple:
+        """Returns the (line, token offset) of the last top-level instruction starting before the restart line."""
+        for line in range(min(restart, len(self.line_starts) - 1), -1, -1):
+            starts = [offset for offset, _node in self.line_starts[line] if line < restart or offset == 0]
+            if starts:
+                return line, starts[-1]
+        return 0, 0
+
+    # pylint: disable=too-many-locals
+    def _reparse(self, line_tokens: list, restart: int, resync, delta: int) -> tuple:
+        """
+        Parse the new tokens from the instruction around the restart line on.
+
+        Parsing stops at the first top-level instruction that starts on a
+        reused old token where an old instruction started too; the old
+        instructions are reused from there.
+
+        Returns:
+            tuple: (line_starts, changed) - the instruction starts of every new
+            line and the first line whose instructions differ, or None
+        """
+        start_line, start_offset = self._parse_start(restart)
+        positions = []
+
+        def feed():
+            for line in range(start_line, len(line_tokens)):
+                tokens = line_tokens[line]
+                for offset in range(start_offset if line == start_line else 0, len(tokens)):
+                    token = tokens[offset]
+                    # Reused tokens keep their old line until they are parsed again
+                    token.line = line + 1
+                    positions.append((line, offset))
+                    yield token
+
+        parsed = []
+        end = None
+        parser = SintacticAnalyzerPixelDraw(feed())
+        while parser.current_token is not None:
+            line, offset = positions[parser.pos]
+            if resync is not None and (line, offset) >= resync[:2]:
+                old_offset = offset - resync[1] + resync[2] if line == resync[0] else offset
+                old_starts = self.line_starts[line - delta]
+                index = next((i for i, start in enumerate(old_starts) if start[0] == old_offset), None)
+                if index is not None:
+                    end = (line, offset, index)
+                    break
+            parsed.append((line, offset, parser.instruccion()))
+
+        # Old instructions replaced by the parsed ones, in order
+        old_nodes = []
+        for line in range(start_line, len(self.line_starts) if end is None else end[0] - delta + 1):
+            for offset, node in self.line_starts[line]:
+                if line == start_line and offset < start_offset:
+                    continue
+                if end is not None and line == end[0] - delta and offset >= self.line_starts[line][end[2]][0]:
+                    break
+                old_nodes.append(node)
+        changed = None
+        for index, (line, _offset, node) in enumerate(parsed):
+            if index >= len(old_nodes) or old_nodes[index] != node:
+                changed = line
+                break
+        if changed is None and len(old_nodes) != len(parsed):
+            changed = len(line_tokens) if end is None else end[0]
+
+        new_starts = [[] for _ in range((len(line_tokens) if end is None else end[0] + 1) - start_line)]
+        new_starts[0] = [start for start in self.line_starts[start_line] if start[0] < start_offset] \
+            if start_line < len(self.line_starts) else []
+        for line, offset, node in parsed:
+            new_starts[line - start_line].append((offset, node))
+        if end is None:
+            return self.line_starts[:start_line] + new_starts, changed
+        line, offset, index = end
+        shift = offset - self.line_starts[line - delta][index][0]
+        new_starts[-1].extend((old_offset + shift, node) for old_offset, node in self.line_starts[line - delta][index:])
+        return self.line_starts[:start_line] + new_starts + self.line_starts[line - delta + 1:], changed
+
+    def _new_canvas(self, width: int, height: int) -> Framebuffer:
+        """Framebuffer factory keeping the palette of the previous canvas.
+
+        Palette indices never change between runs, so cells of different runs
+        can be compared directly.
+        """
+        framebuffer = Framebuffer(width, height)
+        if self.framebuffer is not None:
+            for color in self.framebuffer.palette[1:]:
+                framebuffer.color_index(color)
+        self.framebuffer = framebuffer
+        return framebuffer
+
+    def _run(self):
+        """Run the instructions from the last valid checkpoint to the end."""
+        line, state = self.checkpoints[-1]
+        self.rerun_from = line
+        analyzer = SemanticAnalyzer([], framebuffer_factory=self._new_canvas)
+        analyzer.program = self._instructions(line, analyzer)
+        if state is not None:
+            width, height, color, cells = state
+            framebuffer = self.framebuffer
+            framebuffer.width = width
+            framebuffer.height = height
+            framebuffer.cells = array(framebuffer.typecode, cells)
+            analyzer.canvas_width = width
+            analyzer.canvas_height = height
+            analyzer.current_color = color
+            analyzer.framebuffer = framebuffer
+        self.failed = True
+        self.width, self.height, self.framebuffer = analyzer.analyze()
+        self.failed = False
+
+    def _instructions(self, first: int, analyzer: SemanticAnalyzer):
+        """Yields the top-level instructions from a line on, taking checkpoints."""
+        since = 0
+        for line in range(first, len(self.line_starts)):
+            starts = self.line_starts[line]
+            if not starts:
+                continue
+            if since >= self.interval:
+                self._checkpoint(line, analyzer)
+                since = 0
+            for _offset, node in starts:
+                yield node
+            since += len(starts)
+
+    def _checkpoint(self, line: int, analyzer: SemanticAnalyzer):
+        """Snapshot the analyzer state before a line runs."""
+        if analyzer.framebuffer is None:
+            state = None
+        else:
+            state = (analyzer.canvas_width, analyzer.canvas_height, analyzer.current_color,
+                     analyzer.framebuffer.cells[:])
+        self.checkpoints.append((line, state))
+        if len(self.checkpoints) > self.MAX_CHECKPOINTS:
+            # Keep every other checkpoint (the first one included) and space them out
+            self.checkpoints = self.checkpoints[::2]
+            self.interval *= 2
+
+    def _dirty(self):
+        """Returns the bounding box of the cells that changed since the last call."""
+        framebuffer = self.framebuffer
+        width, height = framebuffer.width, framebuffer.height
+        shown = self._shown
+        self._shown = (width, height, framebuffer.cells[:])
+        if shown is None or shown[:2] != (width, height):
+            return (0, 0, width, height)
+        cells = framebuffer.cells
+        old = shown[2]
+        x0, y0, x1, y1 = width, None, 0, None
+        for start in range(0, width * height, width):
+            row = cells[start:start + width]
+            old_row = old[start:start + width]
+            if row == old_row:
+                continue
+            if y0 is None:
+                y0 = start // width
+            y1 = start // width + 1
+            # First and last differing columns of the row
+            x0 = min(x0, _first_difference(row, old_row))
+            x1 = max(x1, width - _common_suffix(row, old_row, width))
+        if y0 is None:
+            return None
+        return x0, y0, x1, y1
+
+
+class LivePreview:
+    """
+    Tk window following a source file and repainting only what changed.
+
+    The file is polled every poll_ms milliseconds. Every horizontal run of
+    same-colored cells is one canvas item tagged with its row, so after an
+    update only the items of the dirty rows are deleted and created again.
+    Errors are shown in the status line while the last good drawing stays.
+    """
+
+    def __init__(self, root, path: str, pixel_size: int = 20, show_grid: bool = True, poll_ms: int = 200):
+        """
+        Create the preview widgets and compile the file for the first time.
+
+        Args:
+            root (tk.Tk): Parent window
+            path (str): Source file to follow
+            pixel_size (int): Size of each cell in screen pixels
+            show_grid (bool): Whether to draw the gray grid
+            poll_ms (int): Delay between two checks of the file
+        """
+        self.root = root
+        self.path = path
+        self.pixel_size = pixel_size
+        self.show_grid = show_grid
+        self.poll_ms = poll_ms
+        self.session = LiveSession()
+        self._stamp = None
+        self._colors = [None]         # Tk color of every palette index
+
+        root.title(f"PixelDraw Live - {os.path.basename(path)}")
+        self.canvas = tk.Canvas(root, width=pixel_size, height=pixel_size, bg="white")
+        self.canvas.pack()
+        self.status = tk.Label(root, anchor="w")
+        self.status.pack(fill="x")
+        self.poll()
+
+    def poll(self):
+        """Recompile the file if it changed since the last poll, then poll again."""
+        try:
+            info = os.stat(self.path)
+            stamp = (info.st_mtime_ns, info.st_size)
+        except OSError as error:
+            self.status.configure(text=str(error), fg="red")
+            stamp = self._stamp
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self.reload()
+        self.root.after(self.poll_ms, self.poll)
+
+    def reload(self):
+        """Read the file, update the session and repaint the dirty rows."""
+        start = time.perf_counter()
+        try:
+            with open(self.path, encoding="utf-8") as source_file:
+                code = source_file.read()
+            dirty = self.session.update(code)
+        except Exception as error:  # pylint: disable=broad-except
+            self.status.configure(text=str(error), fg="red")
+            return
+        if dirty is not None:
+            self.repaint(*dirty)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.status.configure(text=f"Updated in {elapsed:.1f} ms", fg="black")
+
+    def repaint(self, x0: int, y0: int, x1: int, y1: int):
+        """Recreate the canvas items of the rows y0 to y1 (exclusive).
+
+        A dirty region covering the whole canvas also resizes the window
+        and redraws the grid.
+        """
+        framebuffer = self.session.framebuffer
+        size = self.pixel_size
+        canvas = self.canvas
+        # The palette only grows between updates
+        self._colors.extend(hex_color(color) for color in framebuffer.palette[len(self._colors):])
+        full = (x0, y0, x1, y1) == (0, 0, framebuffer.width, framebuffer.height)
+        if full:
+            canvas.delete("all")
+            canvas.configure(width=framebuffer.width * size, height=framebuffer.height * size)
+        colors = self._colors
+        for y in range(y0, y1):
+            tag = f"row{y}"
+            if not full:
+                canvas.delete(tag)
+            top = y * size
+            for x, length, index in framebuffer.runs(y):
+                # Unpainted cells already show the canvas background
+                if index:
+                    canvas.create_rectangle(x * size, top, (x + length) * size, top + size,
+                                            fill=colors[index], outline="", tags=tag)
+        if full and self.show_grid:
+            self._draw_grid(framebuffer.width, framebuffer.height)
+        canvas.tag_raise("grid")
+
+    def _draw_grid(self, width: int, height: int):
+        """Draw the gray grid overlay, tagged so it can stay on top."""
+        size = self.pixel_size
+        for x in range(0, width * size + 1, size):
+            self.canvas.create_line(x, 0, x, height * size, fill="gray", tags="grid")
+        for y in range(0, height * size + 1, size):
+            self.canvas.create_line(0, y, width * size, y, fill="gray", tags="grid")
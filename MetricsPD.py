@@ -0,0 +1,88 @@
+"""This module contains the compile statistics collected by the PixelDraw compiler.
+
+CompilerPixelDraw can time each phase of a compile (cache, load, lex, parse,
+optimize, semantic, render) and count the work done. A profiler hook can wrap every
+phase, e.g. CProfileHook to collect cProfile statistics per phase.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+# pylint: disable=too-few-public-methods, too-many-instance-attributes
+class CompileStats:
+    """This class holds the timings and counters of one compile."""
+
+    PHASES = ("cache", "load", "lex", "parse", "optimize", "semantic", "render")
+
+    def __init__(self):
+        # Wall time in seconds of every phase
+        self.times = dict.fromkeys(self.PHASES, 0.0)
+        self.token_count = 0          # Tokens produced by the lexer
+        self.instruction_count = 0    # Instruction nodes in the parsed program
+        self.pixel_writes = 0         # Cell writes performed by the semantic phase
+        self.unique_pixels = 0        # Painted cells in the final framebuffer
+        self.saved_writes = 0         # Cell writes removed by the optimizer
+        self.skipped_iterations = 0   # Repeat iterations skipped as idempotent
+        self.peak_memory = None       # Peak traced memory in bytes (track_memory only)
+        self.cache_hit = False        # Whether the raster came from the compile cache
+
+    @property
+    def total_time(self) -> float:
+        """Sum of the wall time of all phases."""
+        return sum(self.times.values())
+
+    def as_dict(self) -> dict:
+        """Returns the statistics as a plain dictionary (e.g. for JSON)."""
+        return {
+            "times": dict(self.times),
+            "total_time": self.total_time,
+            "token_count": self.token_count,
+            "instruction_count": self.instruction_count,
+            "pixel_writes": self.pixel_writes,
+            "unique_pixels": self.unique_pixels,
+            "saved_writes": self.saved_writes,
+            "skipped_iterations": self.skipped_iterations,
+            "peak_memory": self.peak_memory,
+            "cache_hit": self.cache_hit,
+        }
+
+    def __repr__(self):
+        times = ", ".join(f"{phase}={seconds * 1000:.2f}ms" for phase, seconds in self.times.items())
+        return (f"CompileStats({times}, tokens={self.token_count}, instructions={self.instruction_count}, "
+                f"pixel_writes={self.pixel_writes}, unique_pixels={self.unique_pixels}, "
+                f"peak_memory={self.peak_memory}, cache_hit={self.cache_hit})")
+
+
+class CProfileHook:
+    """Profiler hook that runs every compile phase under its own cProfile.Profile.
+
+    Usage:
+        compiler.profiler = CProfileHook()
+        compiler.compile_to_image(code, "out.png")
+        compiler.profiler.print_stats("semantic")
+    """
+
+    def __init__(self):
+        self.profiles = {}
+
+    def __call__(self, phase: str, func, *args):
+        # The profiler modules are only imported when profiling, so importing the compiler stays fast
+        import cProfile  # pylint: disable=import-outside-toplevel
+        profile = self.profiles.setdefault(phase, cProfile.Profile())
+        return profile.runcall(func, *args)
+
+    def print_stats(self, phase: str, sort: str = "cumulative", limit: int = 20):
+        """Prints the profile of one phase."""
+        import pstats  # pylint: disable=import-outside-toplevel
+        pstats.Stats(self.profiles[phase]).sort_stats(sort).print_stats(limit)
+
+
+def count_instructions(program: list) -> int:
+    """Counts the instruction nodes of a program, repeat bodies included."""
+    total = 0
+    for instruction in program:
+        total += 1
+        body = getattr(instruction, "body", None)
+        if body:
+            total += count_instructions(body)
+    return total
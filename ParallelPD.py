@@ -0,0 +1,220 @@
+"""This module rasterizes very large PixelDraw canvases in parallel, tile by tile.
+
+The semantic analyzer runs as usual but draws into a DisplayList, which only
+records every fill as an (x, y, w, h, palette index) operation. The canvas is
+then split into square tiles, every operation is binned to the tiles its
+bounding box touches, and worker processes fill the tiles of a framebuffer
+held in shared memory. Tiles never overlap and each tile replays its
+operations in recording order, so the result is identical to drawing
+serially.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import os
+from array import array
+
+from FramebufferPD import Framebuffer
+
+TILE_CELLS = 512                  # Tile side in canvas cells
+PARALLEL_MIN_CELLS = 1 << 22      # Smaller canvases are rasterized serially
+PARALLEL_MIN_WRITES = 1 << 29     # Less drawing does not pay for shipping the operations to workers
+OP_TYPECODE = "i"                 # Recorded operations: x, y, w, h, palette index
+OP_FIELDS = 5
+
+
+class DisplayList(Framebuffer):
+    """
+    Framebuffer stand-in that records fills instead of writing cells.
+
+    It keeps the palette of a Framebuffer, so palette indices are assigned
+    in the same order as in serial execution, but stores no cells.
+    """
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.palette = [None]
+        self._palette_lookup = {}
+        self.typecode = self.WIDE_TYPECODE
+        # Flat array of OP_FIELDS integers per recorded fill
+        self.ops = array(OP_TYPECODE)
+
+    def set_pixel(self, x: int, y: int, color):
+        self.ops.extend((x, y, 1, 1, self.color_index(color)))
+
+    def fill_span(self, x: int, y: int, length: int, color):
+        if length > 0:
+            self.ops.extend((x, y, length, 1, self.color_index(color)))
+
+    def fill_rect(self, x: int, y: int, w: int, h: int, color):
+        if w > 0 and h > 0:
+            self.ops.extend((x, y, w, h, self.color_index(color)))
+
+    def clear(self):
+        # Tiles start unpainted, so nothing recorded before a clear matters
+        del self.ops[:]
+
+    def copy_from(self, source):
+        # Replay the fills of the previous canvas, clipped to this one
+        for color in source.palette[1:]:
+            self.color_index(color)
+        ops = source.ops
+        for base in range(0, len(ops), OP_FIELDS):
+            x, y, w, h, index = ops[base:base + OP_FIELDS]
+            w = min(w, self.width - x)
+            h = min(h, self.height - y)
+            if w > 0 and h > 0:
+                self.ops.extend((x, y, w, h, index))
+
+
+def bin_operations(display_list: DisplayList, tile_cells: int = TILE_CELLS) -> dict:
+    """
+    Distribute the recorded operations to the tiles they touch.
+
+    An operation covering a whole tile hides everything recorded before it
+    there, so the tile's earlier operations are dropped.
+
+    Args:
+        display_list (DisplayList): Recorded fills
+        tile_cells (int): Tile side in cells
+
+    Returns:
+        dict: (tile_x, tile_y) -> array of the tile's operations, in order
+    """
+    width = display_list.width
+    height = display_list.height
+    ops = display_list.ops
+    tiles = {}
+    for i in range(0, len(ops), OP_FIELDS):
+        op = ops[i:i + OP_FIELDS]
+        x, y, w, h, _index = op
+        for tile_y in range(y // tile_cells, (y + h - 1) // tile_cells + 1):
+            top = tile_y * tile_cells
+            covers_rows = y <= top and y + h >= min(top + tile_cells, height)
+            for tile_x in range(x // tile_cells, (x + w - 1) // tile_cells + 1):
+                left = tile_x * tile_cells
+                if covers_rows and x <= left and x + w >= min(left + tile_cells, width):
+                    tiles[tile_x, tile_y] = array(OP_TYPECODE, op)
+                else:
+                    tiles.setdefault((tile_x, tile_y), array(OP_TYPECODE)).extend(op)
+    return tiles
+
+
+# pylint: disable=too-many-arguments, too-many-locals
+def _rasterize_tile(name: str, typecode: str, width: int, bounds: tuple, data: bytes):
+    """
+    Fill one tile of the shared framebuffer (runs in a worker process).
+
+    Args:
+        name (str): Name of the shared memory block holding the cells
+        typecode (str): Array typecode of the cells
+        width (int): Canvas width in cells
+        bounds (tuple): (x0, y0, x1, y1) of the tile, end exclusive
+        data (bytes): The tile's operations as a packed OP_TYPECODE array
+    """
+    from multiprocessing import shared_memory  # pylint: disable=import-outside-toplevel
+    x0, y0, x1, y1 = bounds
+    ops = array(OP_TYPECODE)
+    ops.frombytes(data)
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        cells = block.buf.cast("B").cast(typecode)
+        try:
+            for i in range(0, len(ops), OP_FIELDS):
+                x, y, w, h, index = ops[i:i + OP_FIELDS]
+                # Clip the fill to the tile
+                left = max(x, x0)
+                right = min(x + w, x1)
+                top = max(y, y0)
+                bottom = min(y + h, y1)
+                length = right - left
+                run = array(typecode, [index]) * length
+                for start in range(top * width + left, bottom * width + left, width):
+                    cells[start:start + length] = run
+        finally:
+            cells.release()
+    finally:
+        block.close()
+
+
+class TiledRasterizer:
+    """
+    Rasterizes display lists with a pool of worker processes.
+
+    The pool is created on first use and reused until close() is called (or
+    the rasterizer is used as a context manager).
+    """
+
+    def __init__(self, workers: int = None, tile_cells: int = TILE_CELLS):
+        """
+        Args:
+            workers (int): Number of worker processes, defaults to the CPU count
+            tile_cells (int): Tile side in canvas cells
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.tile_cells = tile_cells
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut the worker pool down."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def rasterize(self, display_list: DisplayList) -> Framebuffer:
+        """
+        Turn a display list into a framebuffer, filling tiles in parallel.
+
+        Args:
+            display_list (DisplayList): Recorded fills of the final canvas
+
+        Returns:
+            Framebuffer: The same cells serial drawing would produce
+        """
+        # Process pools and shared memory are only imported when a huge canvas needs them
+        # pylint: disable=import-outside-toplevel
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import shared_memory
+
+        width = display_list.width
+        height = display_list.height
+        framebuffer = Framebuffer(0, 0)
+        framebuffer.width = width
+        framebuffer.height = height
+        for color in display_list.palette[1:]:
+            framebuffer.color_index(color)
+        # Cells are one byte unless the palette needed to be widened
+        typecode = framebuffer.typecode
+
+        size = width * height * array(typecode).itemsize
+        tiles = bin_operations(display_list, self.tile_cells)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers)
+        # Shared memory starts zeroed, i.e. every cell unpainted
+        block = shared_memory.SharedMemory(create=True, size=max(1, size))
+        try:
+            cells = self.tile_cells
+            futures = [
+                self._executor.submit(_rasterize_tile, block.name, typecode, width,
+                                      (tile_x * cells, tile_y * cells,
+                                       min((tile_x + 1) * cells, width), min((tile_y + 1) * cells, height)),
+                                      ops.tobytes())
+                for (tile_x, tile_y), ops in tiles.items()
+            ]
+            for future in futures:
+                future.result()
+            framebuffer.cells = array(typecode)
+            framebuffer.cells.frombytes(block.buf[:size])
+        finally:
+            block.close()
+            block.unlink()
+        return framebuffer
@@ -0,0 +1,97 @@
+"""This module draws PixelDraw output into a Tkinter window progressively.
+
+Creating the canvas items of a large drawing takes long enough to freeze the
+window, and Tk may only be used from the thread running its main loop. The
+drawing is therefore split into small steps (one row of cells, one grid
+line) run in time slices scheduled with root.after: each slice runs steps
+for a few milliseconds, updates the progress shown in the status line and
+gives control back to Tk, which repaints the rows drawn so far and handles
+user input before the next slice.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import time
+
+
+class ProgressiveRender:
+    """
+    Runs drawing steps in time slices of the Tk main loop.
+
+    The steps are any iterable, usually a generator that draws one row per
+    item. Rendering starts with start() and stops when the steps run out,
+    when cancel() is called (Escape in the windows of CompilerPixelDraw) or
+    when the window is closed through close().
+    """
+
+    SLICE_MS = 20                     # Time spent drawing before Tk gets control back
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, root, steps, total: int, status=None, slice_ms: int = SLICE_MS):
+        """
+        Args:
+            root (tk.Tk): Window whose main loop runs the slices
+            steps (iterable): Drawing steps, run one after the other
+            total (int): Number of steps, for the progress percentage
+            status (tk.Label): Optional label showing the progress
+            slice_ms (int): Milliseconds of drawing per slice
+        """
+        self.root = root
+        self.steps = iter(steps)
+        self.total = max(1, total)
+        self.status = status
+        self.slice_ms = slice_ms
+        self.done = 0                 # Steps run so far
+        self.finished = False         # Every step has run
+        self.cancelled = False        # Stopped by cancel() before the end
+        self._job = None              # Pending after() callback
+        self._start = None
+
+    @property
+    def progress(self) -> int:
+        """Percentage of the steps run so far."""
+        return min(100, self.done * 100 // self.total)
+
+    def start(self):
+        """Schedule the first slice; it runs as soon as the main loop is idle."""
+        self._start = time.perf_counter()
+        self._show("Rendering... 0%")
+        self._job = self.root.after_idle(self._run_slice)
+
+    def _run_slice(self):
+        """Run steps until the slice time is used up, then schedule the next slice."""
+        self._job = None
+        deadline = time.perf_counter() + self.slice_ms / 1000
+        for _step in self.steps:
+            self.done += 1
+            if time.perf_counter() >= deadline:
+                self._show(f"Rendering... {self.progress}% (Esc to cancel)")
+                # A timer rather than after_idle, so Tk repaints and handles input in between
+                self._job = self.root.after(1, self._run_slice)
+                return
+        self.finished = True
+        self._show(f"Rendered in {(time.perf_counter() - self._start) * 1000:.0f} ms")
+
+    def cancel(self):
+        """Stop rendering, keeping what was drawn so far."""
+        if self._job is not None:
+            self.root.after_cancel(self._job)
+            self._job = None
+        if not self.finished and not self.cancelled:
+            self.cancelled = True
+            close = getattr(self.steps, "close", None)
+            if close is not None:
+                close()
+            self._show(f"Rendering cancelled at {self.progress}%")
+
+    def close(self):
+        """Stop rendering and destroy the window (its WM_DELETE_WINDOW handler)."""
+        self.status = None
+        self.cancel()
+        self.root.destroy()
+
+    def _show(self, text: str):
+        """Write a message in the status line, if there is one."""
+        if self.status is not None:
+            self.status.configure(text=text)
@@ -0,0 +1,106 @@
+"""This module contains the integer rasterizers of the PixelDraw shapes.
+
+Every shape is broken into a short list of axis-aligned runs, (x, y, w, h)
+rectangles that together cover exactly its cells, so the framebuffer can
+paint it with one slice write per run instead of one write per pixel. Only
+integer arithmetic is used, so results never depend on float rounding.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+from itertools import groupby
+
+
+def _slices(major: int, minor: int) -> list:
+    """Splits the steps 0..major of a Bresenham line into its runs.
+
+    The cell at step k is offset round(k * minor / major) cells along the
+    minor axis (halves round up), so every one of the minor + 1 offsets gets
+    one run of consecutive steps.
+
+    Returns:
+        list: (first step, number of steps) of each run, in order
+    """
+    if minor == 0:
+        return [(0, major + 1)]
+    # First step whose offset reaches i: ceil((2i - 1) * major / (2 * minor))
+    starts = [0] + [-(-(2 * i - 1) * major // (2 * minor)) for i in range(1, minor + 1)] + [major + 1]
+    return [(starts[i], starts[i + 1] - starts[i]) for i in range(minor + 1)]
+
+
+def line_runs(x1: int, y1: int, x2: int, y2: int) -> list:
+    """Returns the runs of the Bresenham line between two cells, both included.
+
+    Mostly horizontal lines are made of horizontal runs, mostly vertical ones
+    of vertical runs. The line is always walked from the same end, so
+    swapping the endpoints draws the same cells.
+
+    Returns:
+        list: (x, y, w, h) runs
+    """
+    if abs(x2 - x1) >= abs(y2 - y1):
+        if x2 < x1:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        step = 1 if y2 >= y1 else -1
+        return [(x1 + start, y1 + step * i, length, 1)
+                for i, (start, length) in enumerate(_slices(x2 - x1, abs(y2 - y1)))]
+    if y2 < y1:
+        x1, y1, x2, y2 = x2, y2, x1, y1
+    step = 1 if x2 >= x1 else -1
+    return [(x1 + step * i, y1 + start, 1, length)
+            for i, (start, length) in enumerate(_slices(y2 - y1, abs(x2 - x1)))]
+
+
+def frame_runs(x: int, y: int, w: int, h: int) -> list:
+    """Returns the runs of the outline of a rectangle (none if it is empty).
+
+    Returns:
+        list: (x, y, w, h) runs - the top and bottom rows and the left and
+        right columns between them, or the whole rectangle when it has no
+        inside
+    """
+    if w <= 0 or h <= 0:
+        return []
+    if w <= 2 or h <= 2:
+        return [(x, y, w, h)]
+    return [(x, y, w, 1), (x, y + h - 1, w, 1), (x, y + 1, 1, h - 2), (x + w - 1, y + 1, 1, h - 2)]
+
+
+def circle_runs(cx: int, cy: int, radius: int) -> list:
+    """Returns the runs of a filled circle, traced with the midpoint algorithm.
+
+    The midpoint algorithm walks one octant of the outline and yields the
+    half width of every row of the disc; consecutive rows with the same
+    half width are merged into one rectangle.
+
+    Returns:
+        list: (x, y, w, h) runs from top to bottom (none for a negative radius)
+    """
+    if radius < 0:
+        return []
+    half = [0] * (radius + 1)
+    x, y = radius, 0
+    error = 1 - radius
+    while x >= y:
+        # Row y reaches column x and, by symmetry, row x reaches column y
+        half[y] = max(half[y], x)
+        half[x] = max(half[x], y)
+        y += 1
+        if error < 0:
+            error += 2 * y + 1
+        else:
+            x -= 1
+            error += 2 * (y - x) + 1
+    runs = []
+    top = cy - radius
+    for width, rows in groupby(half[:0:-1] + half):
+        height = len(list(rows))
+        runs.append((cx - width, top, 2 * width + 1, height))
+        top += height
+    return runs
+
+
+def runs_cells(runs: list) -> int:
+    """Returns the number of cells the runs of a shape cover."""
+    return sum(w * h for _x, _y, w, h in runs)
@@ -1,139 +1,379 @@
 """This module represents the behavior of a semantic analyzer for PixelDraw.
 
-The semantic analyzer processes tokens from the lexical analyzer and converts them
-into actual drawing instructions, validating the meaning and context of the commands.
+The semantic analyzer walks the instruction tree built by the syntactic analyzer
+and converts it into actual drawing operations, validating the meaning and context
+of the commands.
 
 Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
          Daniel Mateo Montoya González <20202020098>
 """
 
+from ColorsPD import hex_color, resolve_color
+from FramebufferPD import Framebuffer
+from InstructionsPD import Circle, Clear, Color, Frame, FrameBreak, Instruction, Line, Point, Rectangle, Repeat, Size
+from RasterPD import circle_runs, frame_runs, line_runs
+from SintacticPD import SintacticAnalyzerPixelDraw
+
+
 class SemanticAnalyzer:
 
     """This class represents the behavior of a semantic analyzer for PixelDraw.
     
-    The semantic analyzer takes tokens from the lexical analyzer and interprets
-    their meaning to generate the final pixel art. It handles canvas sizing,
-    color management, drawing operations, and coordinate validation.
+    The semantic analyzer takes the instruction tree from the syntactic analyzer
+    and interprets its meaning to generate the final pixel art. It handles canvas
+    sizing, color management, drawing operations, and coordinate validation.
     """
 
-    def __init__(self, tokens_input: list):
-        # Store the list of tokens to be analyzed
-        self.tokens = tokens_input
+    # pylint: disable=too-many-arguments
+    def __init__(self, program, keep_pixels: bool = False, trace=None, framebuffer_factory=Framebuffer,
+                 on_frame=None):
+        # The program is a list (or any iterable, e.g. a parser generator) of
+        # instruction nodes. A token list is still accepted and parsed here.
+        if isinstance(program, list) and program and not isinstance(program[0], Instruction):
+            program = SintacticAnalyzerPixelDraw(program, trace).parse()
+        # Store the instruction tree to be analyzed
+        self.program = program
+        
+        # Optional hook receiving one message per instruction (e.g. print or a
+        # logger method); messages are not even formatted when it is None
+        self.trace = trace
         
         # Canvas dimensions (will be set by SIZE command)
         self.canvas_width = None
         self.canvas_height = None
         
-        # List to store all pixels as (x, y, color) tuples
-        self.pixels = []
+        # Framebuffer holding the final color of every cell (created by SIZE command
+        # through the factory, e.g. ParallelPD.DisplayList to record the draws)
+        self.framebuffer = None
+        self.framebuffer_factory = framebuffer_factory
+        
+        # Optional compatibility view: every drawn pixel as (x, y, rgb) tuples
+        self.keep_pixels = keep_pixels
+        self.pixels = [] if keep_pixels else None
+        
+        # Current drawing color as packed 0xRRGGBB (defaults to black)
+        self.current_color = 0x000000
+
+        # Repeat iterations skipped because they could not change the result
+        self.skipped_iterations = 0
         
-        # Current drawing color (defaults to black)
-        self.current_color = "#000000"
+        # Number of cell writes performed
+        self.pixel_writes = 0
+
+        # Animation frames ended by "---" so far, and the optional hook called
+        # with the analyzer at every frame end (e.g. AnimationPD.AnimationRecorder)
+        self.frames = 0
+        self.on_frame = on_frame
+
+        # Handler of every instruction type
+        self._handlers = {
+            Size: self._size,
+            Color: self._color,
+            Point: self._point,
+            Rectangle: self._rectangle,
+            Repeat: self._repeat,
+            Clear: self._clear,
+            Line: self._line,
+            Frame: self._frame,
+            Circle: self._circle,
+            FrameBreak: self._frame_break,
+        }
 
     def analyze(self):
         """
-        Analyzes the tokens and returns a tuple containing:
+        Analyzes the instructions and returns a tuple containing:
             - Width and height of the canvas
-            - A list of pixels as (x, y, color) tuples
+            - The framebuffer with the final color of every cell
+            
+        When the analyzer was created with keep_pixels=True, every drawn pixel
+        is also recorded in self.pixels as (x, y, rgb) tuples, where rgb is
+        the packed 0xRRGGBB color.
             
         Returns:
-            tuple: (canvas_width, canvas_height, pixels_list)
+            tuple: (canvas_width, canvas_height, framebuffer)
             
         Raises:
             Exception: If canvas size is not defined or coordinates are invalid
         """
-        token_count = len(self.tokens)
-        i = 0  # Current token index
-
-        # Process each token sequentially
-        while i < token_count:
-            token = self.tokens[i]
-
-            # Handle SIZE command: "size WxH" - sets canvas dimensions
-            if token.type_ == "SIZE":
-                # Extract width and height from "size WxH" format
-                size_parts = token.value.split()[1].split("x")
-                self.canvas_width = int(size_parts[0])
-                self.canvas_height = int(size_parts[1])
-                print(f"Canvas size: {self.canvas_width}x{self.canvas_height}")
-                i += 1
-
-            # Handle COLOR command: "color <value>" - sets current drawing color
-            elif token.type_ == "COLOR":
-                # Extract color value (can be color name or hex code)
-                self.current_color = token.value.split()[1]
-                print(f"Current color set to: {self.current_color}")
-                i += 1
-
-            # Handle POINT command: "point X Y" - draws a single pixel
-            elif token.type_ == "POINT":
-                # Extract X and Y coordinates from "point X Y" format
-                _, x_str, y_str = token.value.split()
-                x, y = int(x_str), int(y_str)
-                
-                # Validate that coordinates are within canvas bounds
-                self._validate_coordinates(x, y)
-                
-                # Add the pixel to our drawing list
-                self.pixels.append((x, y, self.current_color))
-                print(f"Added point at ({x},{y}) with color {self.current_color}")
-                i += 1
-
-            # Handle RECTANGLE command: "rectangle X Y W H" - draws a filled rectangle
-            elif token.type_ == "RECTANGLE":
-                # Extract position (X,Y) and dimensions (W,H) from "rectangle X Y W H" format
-                parts = token.value.split()
-                x, y, w, h = map(int, parts[1:])
-                
-                # Draw each pixel in the rectangle
-                for dx in range(w):  # Iterate through width
-                    for dy in range(h):  # Iterate through height
-                        px, py = x + dx, y + dy  # Calculate pixel position
-                        self._validate_coordinates(px, py)  # Validate coordinates
-                        self.pixels.append((px, py, self.current_color))  # Add pixel
-                        
-                print(f"Added rectangle at ({x},{y}) size {w}x{h} with color {self.current_color}")
-                i += 1
-
-            # Handle REPEAT command: "repeat N { ... }" - repeats a block of commands
-            elif token.type_ == "REPEAT_INI":
-                # Extract repeat count from "repeat N {" format
-                parts = token.value.split()
-                repeat_count = int(parts[1])
-                i += 1  # Move past "repeat N {" token
-                
-                # Collect all tokens inside the repeat block
-                block_tokens = []
-                while i < token_count and self.tokens[i].type_ != "REPEAT_END":
-                    block_tokens.append(self.tokens[i])
-                    i += 1
-                    
-                # Validate that we found the closing brace
-                if i >= token_count or self.tokens[i].type_ != "REPEAT_END":
-                    raise Exception("Semantic Error: Missing closing '}' for repeat block.")
-                    
-                # Execute the block the specified number of times
-                for _ in range(repeat_count):
-                    # Create a new analyzer for the block with current context
-                    block_analyzer = SemanticAnalyzer(block_tokens)
-                    block_analyzer.canvas_width = self.canvas_width
-                    block_analyzer.canvas_height = self.canvas_height
-                    block_analyzer.current_color = self.current_color
-                    block_analyzer.analyze()
-                    
-                    # Add all pixels from the repeated block to our main pixel list
-                    self.pixels.extend(block_analyzer.pixels)
-                    
-                i += 1  # Skip the closing "}" token
-            else:
-                # Skip any unrecognized tokens (for future extensibility)
-                i += 1
+        # Process each instruction sequentially
+        self._execute(self.program)
+        return self.result()
 
+    def result(self):
+        """
+        Returns the (canvas_width, canvas_height, framebuffer) drawn so far.
+        
+        Raises:
+            Exception: If canvas size is not defined
+        """
         # Validate that canvas size was defined before returning
         if self.canvas_width is None or self.canvas_height is None:
             raise Exception("Semantic Error: Canvas size not defined with 'size'.")
 
-        return self.canvas_width, self.canvas_height, self.pixels
+        return self.canvas_width, self.canvas_height, self.framebuffer
+
+    def _execute(self, instructions):
+        """Runs a sequence of instructions in order.
+        
+        Args:
+            instructions (iterable): Instruction nodes to run; each one is
+                applied to the framebuffer as soon as it is produced
+        """
+        handlers = self._handlers
+        for instruction in instructions:
+            handlers[type(instruction)](instruction)
+
+    # Instruction handlers: unpack a node and run the matching command below
+
+    def _size(self, instruction: Size):
+        self.set_size(instruction.width, instruction.height)
+
+    def _color(self, instruction: Color):
+        """Handles "color <value>": resolves the color and makes it current.
+        
+        Raises:
+            Exception: If the color name is unknown
+        """
+        try:
+            color = resolve_color(instruction.value)
+        except ValueError as error:
+            raise Exception(f"Semantic Error: {error}.") from None
+        self.set_color(color)
+
+    def _point(self, instruction: Point):
+        self.draw_point(instruction.x, instruction.y)
+
+    def _rectangle(self, instruction: Rectangle):
+        self.draw_rectangle(instruction.x, instruction.y, instruction.width, instruction.height)
+
+    def _clear(self, instruction: Clear):  # pylint: disable=unused-argument
+        self.clear_canvas()
+
+    def _line(self, instruction: Line):
+        self.draw_line(instruction.x1, instruction.y1, instruction.x2, instruction.y2)
+
+    def _frame(self, instruction: Frame):
+        self.draw_frame(instruction.x, instruction.y, instruction.width, instruction.height)
+
+    def _circle(self, instruction: Circle):
+        self.draw_circle(instruction.x, instruction.y, instruction.radius)
+
+    def _frame_break(self, instruction: FrameBreak):  # pylint: disable=unused-argument
+        self.end_frame()
+
+    def _repeat(self, instruction: Repeat):
+        self.repeat(instruction.count, lambda: self._execute(instruction.body))
+
+    # Commands: the meaning of every instruction, with already decoded operands.
+    # They are also the entry points of loaders that do not build instruction
+    # nodes (see BytecodePD).
+
+    def set_size(self, width: int, height: int):
+        """Runs "size WxH": sets the canvas dimensions and allocates the framebuffer.
+
+        A later size keeps what was drawn: the cells that fit in the new canvas
+        are copied into it and the others are dropped, from the pixel log too.
+        Repeating the current size changes nothing.
+        """
+        self._resize(width, height)
+        if self.trace is not None:
+            self.trace(f"Canvas size: {self.canvas_width}x{self.canvas_height}")
+
+    def set_color(self, color: int):
+        """Runs "color <value>" with the value resolved to packed 0xRRGGBB."""
+        self.current_color = color
+        if self.trace is not None:
+            self.trace(f"Current color set to: {hex_color(self.current_color)}")
+
+    def draw_point(self, x: int, y: int):
+        """Runs "point X Y": draws a single pixel."""
+        # Validate that coordinates are within canvas bounds
+        self._validate_coordinates(x, y)
+        
+        # Paint the pixel into the framebuffer
+        self._draw_pixel(x, y)
+        if self.trace is not None:
+            self.trace(f"Added point at ({x},{y}) with color {hex_color(self.current_color)}")
+
+    def draw_rectangle(self, x: int, y: int, w: int, h: int):
+        """Runs "rectangle X Y W H": draws a filled rectangle."""
+        # Validate the rectangle once by its corners and fill it in bulk
+        self._draw_rectangle(x, y, w, h)
+        if self.trace is not None:
+            self.trace(f"Added rectangle at ({x},{y}) size {w}x{h} with color {hex_color(self.current_color)}")
+
+    def clear_canvas(self):
+        """Runs "clear": erases the whole canvas back to the background.
+        
+        Raises:
+            Exception: If the canvas size is not defined yet
+        """
+        if self.canvas_width is None:
+            raise Exception("Semantic Error: Cannot clear - canvas size not set.")
+        self.framebuffer.clear()
+        self.pixel_writes += self.canvas_width * self.canvas_height
+        if self.keep_pixels:
+            # The log describes the visible drawing, which is now empty
+            self.pixels.clear()
+        if self.trace is not None:
+            self.trace("Canvas cleared")
+
+    def draw_line(self, x1: int, y1: int, x2: int, y2: int):
+        """Runs "line (X1,Y1) to (X2,Y2)": draws a Bresenham line.
+        
+        Both endpoints are validated; every cell between them is then inside
+        the canvas too.
+        """
+        self._validate_coordinates(x1, y1)
+        self._validate_coordinates(x2, y2)
+        self._draw_runs(line_runs(x1, y1, x2, y2))
+        if self.trace is not None:
+            self.trace(f"Added line from ({x1},{y1}) to ({x2},{y2}) with color {hex_color(self.current_color)}")
+
+    def draw_frame(self, x: int, y: int, w: int, h: int):
+        """Runs "frame (X,Y) (W,H)": draws the outline of a rectangle."""
+        if w > 0 and h > 0:
+            self._validate_coordinates(x, y)
+            self._validate_coordinates(x + w - 1, y + h - 1)
+            self._draw_runs(frame_runs(x, y, w, h))
+        if self.trace is not None:
+            self.trace(f"Added frame at ({x},{y}) size {w}x{h} with color {hex_color(self.current_color)}")
+
+    def draw_circle(self, x: int, y: int, radius: int):
+        """Runs "circle (X,Y) radius R": draws a filled midpoint circle.
+        
+        The square enclosing the circle must lie inside the canvas.
+        """
+        self._validate_coordinates(x - radius, y - radius)
+        self._validate_coordinates(x + radius, y + radius)
+        self._draw_runs(circle_runs(x, y, radius))
+        if self.trace is not None:
+            self.trace(f"Added circle at ({x},{y}) radius {radius} with color {hex_color(self.current_color)}")
+
+    def end_frame(self):
+        """Runs "---": ends the current animation frame.
+        
+        The canvas is not touched, the next frame starts from it. Outside of
+        animations (no on_frame hook) frame breaks have no visible effect.
+        
+        Raises:
+            Exception: If the canvas size is not defined yet
+        """
+        if self.canvas_width is None:
+            raise Exception("Semantic Error: Cannot end a frame - canvas size not set.")
+        self.frames += 1
+        if self.on_frame is not None:
+            self.on_frame(self)
+        if self.trace is not None:
+            self.trace(f"Frame {self.frames} ended")
+
+    def repeat(self, count: int, run_body):
+        """Runs "repeat N { ... }": runs the body, nested blocks included.
+        
+        The body is parsed once and replayed by run_body(). Every iteration
+        starts with the current color and canvas size of the enclosing block:
+        a color or size set in the body lasts until the end of the iteration
+        and is then restored, so it never leaks into the next iteration or
+        past the block.
+        
+        Every drawing command (clear included) paints fixed cells, so the
+        effect of one iteration only depends on that state, which is the same
+        for all of them: the iterations are idempotent, the body runs once and
+        the remaining iterations are skipped. With keep_pixels=True every
+        iteration runs so the pixel log stays complete, and so does a body
+        that ends animation frames, since every iteration shows up in its own
+        frames.
+        
+        Args:
+            count (int): Number of iterations
+            run_body (callable): Runs one iteration of the body
+        """
+        if count <= 0:
+            return
+        state = (self.current_color, self.canvas_width, self.canvas_height)
+        frames = self.frames
+        run_body()
+        self._restore(*state)
+        if self.keep_pixels or self.frames != frames:
+            for _ in range(count - 1):
+                run_body()
+                self._restore(*state)
+            return
+        self.skipped_iterations += count - 1
+
+    def _resize(self, width: int, height: int):
+        """Sets the canvas dimensions, keeping the cells that fit (see set_size)."""
+        previous = self.framebuffer
+        if previous is None or (width, height) != (previous.width, previous.height):
+            self.framebuffer = self.framebuffer_factory(width, height)
+            if previous is not None:
+                self.framebuffer.copy_from(previous)
+                if self.keep_pixels:
+                    self.pixels = [pixel for pixel in self.pixels if pixel[0] < width and pixel[1] < height]
+        self.canvas_width = width
+        self.canvas_height = height
+
+    def _restore(self, color: int, width: int, height: int):
+        """Restores the color and canvas size a repeat iteration started with."""
+        self.current_color = color
+        if (width, height) == (self.canvas_width, self.canvas_height):
+            return
+        if width is None:
+            # The block ran before any size: what it drew is kept for the next size
+            self.canvas_width = self.canvas_height = None
+        else:
+            self._resize(width, height)
+
+    def _draw_pixel(self, x: int, y: int):
+        """Paints a validated cell with the current color.
+        
+        Args:
+            x (int): X coordinate of the cell
+            y (int): Y coordinate of the cell
+        """
+        self.framebuffer.set_pixel(x, y, self.current_color)
+        self.pixel_writes += 1
+        if self.keep_pixels:
+            self.pixels.append((x, y, self.current_color))
+
+    def _draw_rectangle(self, x: int, y: int, w: int, h: int):
+        """Paints a filled rectangle with the current color.
+        
+        The rectangle is validated once by its corners and then written with
+        one slice per row. Empty rectangles draw nothing.
+        
+        Args:
+            x (int): X coordinate of the top-left cell
+            y (int): Y coordinate of the top-left cell
+            w (int): Width of the rectangle
+            h (int): Height of the rectangle
+            
+        Raises:
+            Exception: If any corner lies outside the canvas bounds
+        """
+        if w <= 0 or h <= 0:
+            return
+        self._validate_coordinates(x, y)
+        self._validate_coordinates(x + w - 1, y + h - 1)
+        self.framebuffer.fill_rect(x, y, w, h, self.current_color)
+        self.pixel_writes += w * h
+        if self.keep_pixels:
+            # Compatibility view keeps the original column-major order
+            color = self.current_color
+            self.pixels.extend((x + dx, y + dy, color) for dx in range(w) for dy in range(h))
+
+    def _draw_runs(self, runs: list):
+        """Paints the validated (x, y, w, h) runs of a shape with the current color.
+        
+        Every run is written in bulk, one slice per row (see RasterPD).
+        """
+        fill_rect = self.framebuffer.fill_rect
+        color = self.current_color
+        for x, y, w, h in runs:
+            fill_rect(x, y, w, h, color)
+            self.pixel_writes += w * h
+            if self.keep_pixels:
+                self.pixels.extend((x + dx, y + dy, color) for dy in range(h) for dx in range(w))
 
     def _validate_coordinates(self, x: int, y: int):
         """Validates that the coordinates are within the canvas size.
@@ -11,11 +11,19 @@ Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
 # Grammar rules for PixelDraw language:
 # <S>           -> <instruction>
 # <instruction> -> <size> | <color> | <point> | <rectangle> | <repeat>
+#                  | <clear> | <pixel> | <line> | <frame> | <circle> | <frame_break>
 # <size>        -> "size"<space><integer>"x"<integer>
 # <color>       -> "color"<space><COLORNAME> | "color"<space><COLORHEX>
 # <point>       -> "point"<space><integer><space><integer>
 # <rectangle>   -> "rectangle"<space><integer><space><integer><space><integer><space><integer>
 # <repeat>      -> "repeat"<space><integer><space>"{" <instruction>* "}"
+# <clear>       -> "clear"
+# <pixel>       -> "pixel" <pair>
+# <line>        -> "line" <pair> "to" <pair>
+# <frame>       -> "frame" <pair> <pair>
+# <circle>      -> "circle" <pair> "radius" <integer>
+# <frame_break> -> "---"
+# <pair>        -> "(" <integer> "," <integer> ")"
 # <integer>     -> <digit>+
 # <digit>       -> "0"|"1"|"2"|"3"|"4"|"5"|"6"|"7"|"8"|"9"
 # <COLORNAME>   -> <letters>+
@@ -23,24 +31,139 @@ Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
 # <DIGITHEX>    -> <digit>|"A"..."F"|"a"..."f"
 # <letters>     -> (a-zA-Z)+
 # <space>       -> " "+
+# Spaces are optional around the punctuation of <pair>.
+
+from InstructionsPD import Circle, Clear, Color, Frame, FrameBreak, Line, Point, Rectangle, Repeat, Size
+from LexicalPd import TOKEN_KINDS
+
+# Token type names by integer kind, for error messages
+KIND_NAMES = list(TOKEN_KINDS)
+
+# Kinds of the tokens the multi-token rules expect
+REPEAT_END = TOKEN_KINDS["REPEAT_END"]
+LPAREN = TOKEN_KINDS["LPAREN"]
+RPAREN = TOKEN_KINDS["RPAREN"]
+COMMA = TOKEN_KINDS["COMMA"]
+NUMBER = TOKEN_KINDS["NUMBER"]
+TO = TOKEN_KINDS["TO"]
+RADIUS = TOKEN_KINDS["RADIUS"]
+
+
+class ParseError(SyntaxError):
+    """
+    Raised when the tokens do not follow the PixelDraw grammar.
+    
+    Besides the message, it carries what was expected and the offending
+    token with its source position (None at the end of the input).
+    """
+
+    def __init__(self, expected: str, token):
+        super().__init__(f"Sintax error: expected {expected}, but found {token}")
+        self.expected = expected      # Description of what was expected
+        self.token = token            # Token found instead, None at the end of the input
+        self.line = None if token is None else token.line
+        self.column = None if token is None else token.column
+
+
+# Most distinct numbers remembered by NUMBERS
+NUMBER_CACHE_SIZE = 4096
+
+
+class _NumberCache(dict):
+    """Integer value of the numeric lexemes seen so far.
+
+    Scripts repeat the same coordinates over and over, and a dict lookup is
+    several times faster than int(); unseen lexemes are converted with int()
+    and remembered until the cache is full.
+    """
+
+    def __missing__(self, text: str) -> int:
+        number = int(text)
+        if len(self) < NUMBER_CACHE_SIZE:
+            self[text] = number
+        return number
+
+
+NUMBERS = _NumberCache()
+
+
+# Single-token instructions: the lexer already matched their whole syntax, so
+# decoding the token value is all the validation left to do.
+
+def _size(value: str) -> Size:
+    # "size WxH" -> width and height
+    width, height = value.split()[1].split("x")
+    return Size(NUMBERS[width], NUMBERS[height])
+
+
+def _color(value: str) -> Color:
+    # "color <value>" -> color name or hex code
+    return Color(value.split()[1])
+
+
+def _point(value: str) -> Point:
+    # "point X Y" -> coordinates
+    _, x, y = value.split()
+    return Point(NUMBERS[x], NUMBERS[y])
+
+
+def _rectangle(value: str) -> Rectangle:
+    # "rectangle X Y W H" -> position and dimensions
+    _, x, y, width, height = value.split()
+    return Rectangle(NUMBERS[x], NUMBERS[y], NUMBERS[width], NUMBERS[height])
+
+
+def _clear(_value: str) -> Clear:
+    return Clear()
+
+
+def _frame_break(_value: str) -> FrameBreak:
+    return FrameBreak()
+
+
+# Decoder and trace message of every single-token instruction, indexed by token kind
+DECODERS = [None] * len(TOKEN_KINDS)
+MESSAGES = [None] * len(TOKEN_KINDS)
+for _name, _decoder, _message in (("SIZE", _size, "Detected size: {}"),
+                                  ("COLOR", _color, "Detected color: {}"),
+                                  ("POINT", _point, "Detected point: {}"),
+                                  ("RECTANGLE", _rectangle, "Detected rectangle: {}"),
+                                  ("CLEAR", _clear, "Detected clear"),
+                                  ("FRAME_BREAK", _frame_break, "Detected frame break")):
+    DECODERS[TOKEN_KINDS[_name]] = _decoder
+    MESSAGES[TOKEN_KINDS[_name]] = _message
+
 
 class SintacticAnalyzerPixelDraw:
     """
     Syntactic analyzer for PixelDraw language.
     
     This class validates that tokens from the lexical analyzer follow the correct
-    grammar structure and provides error messages for syntax violations.
+    grammar structure and provides error messages for syntax violations. While
+    validating, it builds the instruction tree (see InstructionsPD) consumed by
+    the semantic analyzer, with every numeric field already converted to int.
+    
+    Instructions are dispatched through tables indexed by the integer kind of
+    their first token: single-token instructions are decoded straight from the
+    token value (DECODERS), the others are parsed by the method in PARSERS.
     """
     
-    def __init__(self, tokens):
+    def __init__(self, tokens, trace=None):
         """
         Initialize the syntactic analyzer with a list of tokens.
         
         Args:
-            tokens (list): List of Token objects from the lexical analyzer
+            tokens (iterable): Token objects from the lexical analyzer, as a list
+                or a lazy iterator such as LexicalAnalyzer.iter_tokens()
+            trace (callable): Optional hook receiving one message per parsed
+                instruction (e.g. print or a logger method). Messages are not
+                even formatted when it is None.
         """
-        # Store the list of tokens to be parsed
+        # Store the tokens to be parsed and consume them through an iterator
         self.tokens = tokens
+        self._token_iter = iter(tokens)
+        # Optional hook for progress messages
+        self.trace = trace
         # Initialize the current token
         self.current_token = None
         # Position in the token list
@@ -55,13 +178,9 @@ class SintacticAnalyzerPixelDraw:
         Updates the current_token and position. Sets current_token to None
         when all tokens have been processed.
         """
-        # Move to the next token in the list
+        # Move to the next token; None when there are no more tokens
         self.pos += 1
-        if self.pos < len(self.tokens):
-            self.current_token = self.tokens[self.pos]
-        else:
-            # If there are no more tokens, set current_token to None
-            self.current_token = None
+        self.current_token = next(self._token_iter, None)
 
     def parse(self):
         """
@@ -69,125 +188,220 @@ class SintacticAnalyzerPixelDraw:
         
         Iterates through all tokens and validates each instruction according
         to the grammar rules. Stops when all tokens are processed.
+        
+        Returns:
+            list: Instruction nodes of the program, in source order
+            
+        Raises:
+            ParseError: If the tokens do not follow the grammar
+        """
+        return self.block(None)
+
+    def iter_instructions(self):
+        """
+        Lazily parse the program, one top-level instruction at a time.
+        
+        Tokens are only read as far as needed for the next instruction, so a
+        token stream is never materialized; only the body of the repeat block
+        being parsed is kept in memory.
+        
+        Yields:
+            Instruction: Top-level instruction nodes, in source order
         """
         # Main parsing loop: process instructions until tokens are exhausted
         while self.current_token is not None:
-            self.instruccion()
+            yield self.instruccion()
+
+    def block(self, closing):
+        """
+        Parse instructions until the end of the input or a closing token.
+        
+        This is the main loop of the parser. Single-token instructions are
+        decoded and the next token fetched without leaving the loop; the
+        token and position are only stored back in current_token and pos
+        around the methods parsing multi-token instructions.
+        
+        Args:
+            closing (int): Kind of the token ending the block (left as the
+                current token), or None for the whole input
+            
+        Returns:
+            list: The parsed instruction nodes
+        """
+        body = []
+        append = body.append
+        tokens = self._token_iter
+        trace = self.trace
+        token = self.current_token
+        pos = self.pos
+        while token is not None:
+            kind = token.kind
+            decode = DECODERS[kind]
+            if decode is not None:
+                if trace is not None:
+                    trace(MESSAGES[kind].format(token.value))
+                append(decode(token.value))
+                token = next(tokens, None)
+                pos += 1
+            elif kind == closing:
+                break
+            else:
+                parse = PARSERS[kind]
+                self.current_token = token
+                self.pos = pos
+                if parse is None:
+                    self.error("valid instruction")
+                append(parse(self))
+                token = self.current_token
+                pos = self.pos
+        self.current_token = token
+        self.pos = pos
+        return body
 
     def instruccion(self):
         """
         Parse and validate a single instruction.
         
-        Determines the type of instruction based on the current token and
-        calls the appropriate parsing method. Raises syntax error for
+        Looks the kind of the current token up in the dispatch tables and
+        decodes or parses the instruction it starts. Raises syntax error for
         unrecognized instructions.
+        
+        Returns:
+            Instruction: The parsed instruction node
         """
-        # Determine the type of instruction based on the current token
-        if self.current_token is None:
+        token = self.current_token
+        if token is None:
             self.error("valid instruction")
-        elif self.current_token.type_ == "SIZE":
-            self.size()
-        elif self.current_token.type_ == "COLOR":
-            self.color()
-        elif self.current_token.type_ == "POINT":
-            self.point()
-        elif self.current_token.type_ == "RECTANGLE":
-            self.rectangle()
-        elif self.current_token.type_ == "REPEAT_INI":
-            self.repeat()
-        else:
-            # If the token does not match any known instruction, raise an error
+        decode = DECODERS[token.kind]
+        if decode is not None:
+            if self.trace is not None:
+                self.trace(MESSAGES[token.kind].format(token.value))
+            self.advance()
+            return decode(token.value)
+        parse = PARSERS[token.kind]
+        if parse is None:
+            # If the token does not start any known instruction, raise an error
             self.error("valid instruction")
+        return parse(self)
 
-    def size(self):
+    def repeat(self):
         """
-        Parse and validate a SIZE instruction.
+        Parse and validate a REPEAT block.
+        
+        Validates the start of a repeat block, processes all instructions
+        inside the block, and ensures proper closing with REPEAT_END.
+        Raises error if block is not properly closed.
         
-        Validates that the current token is a SIZE token and advances
-        to the next token. Raises error if token type is incorrect.
+        Returns:
+            Repeat: The repeat node with its body as child instructions
         """
-        # Handle the SIZE instruction
+        if self.trace is not None:
+            self.trace(f"Repeat start: {self.current_token.value}")
+        # "repeat N {" -> repeat count
+        count = NUMBERS[self.current_token.value.split()[1]]
+        self.advance()
+        # Process instructions inside the repeat block, nested blocks included
+        body = self.block(REPEAT_END)
+        # Check for the end of the repeat block
         if self.current_token is None:
-            self.error("SIZE")
-        elif self.current_token.type_ == "SIZE":
-            print(f"Detected size: {self.current_token.value}")
-            self.advance()
-        else:
-            self.error("SIZE")
+            self.error("} (repeat block end)")
+        if self.trace is not None:
+            self.trace("Repeat end")
+        self.advance()
+        return Repeat(count, body)
 
-    def color(self):
+    def pixel(self):
         """
-        Parse and validate a COLOR instruction.
+        Parse and validate a PIXEL instruction: "pixel (X,Y)".
+        
+        A pixel is the same single-cell draw as a point, so it is decoded
+        into a Point node.
         
-        Validates that the current token is a COLOR token and advances
-        to the next token. Raises error if token type is incorrect.
+        Returns:
+            Point: The decoded instruction
         """
-        # Handle the COLOR instruction
-        if self.current_token is None:
-            self.error("COLOR")
-        elif self.current_token.type_ == "COLOR":
-            print(f"Detected color: {self.current_token.value}")
-            self.advance()
-        else:
-            self.error("COLOR")
+        self.advance()
+        x, y = self.pair()
+        if self.trace is not None:
+            self.trace(f"Detected pixel: ({x},{y})")
+        return Point(x, y)
 
-    def point(self):
+    def line(self):
         """
-        Parse and validate a POINT instruction.
+        Parse and validate a LINE instruction: "line (X1,Y1) to (X2,Y2)".
         
-        Validates that the current token is a POINT token and advances
-        to the next token. Raises error if token type is incorrect.
+        Returns:
+            Line: The decoded instruction
         """
-        # Handle the POINT instruction
-        if self.current_token is None:
-            self.error("POINT")
-        elif self.current_token.type_ == "POINT":
-            print(f"Detected point: {self.current_token.value}")
-            self.advance()
-        else:
-            self.error("POINT")
+        self.advance()
+        x1, y1 = self.pair()
+        self.expect(TO)
+        x2, y2 = self.pair()
+        if self.trace is not None:
+            self.trace(f"Detected line: ({x1},{y1}) to ({x2},{y2})")
+        return Line(x1, y1, x2, y2)
 
-    def rectangle(self):
+    def frame(self):
         """
-        Parse and validate a RECTANGLE instruction.
+        Parse and validate a FRAME instruction: "frame (X,Y) (W,H)".
         
-        Validates that the current token is a RECTANGLE token and advances
-        to the next token. Raises error if token type is incorrect.
+        Returns:
+            Frame: The decoded instruction
         """
-        # Handle the RECTANGLE instruction
-        if self.current_token is None:
-            self.error("RECTANGLE")
-        elif self.current_token.type_ == "RECTANGLE":
-            print(f"Detected rectangle: {self.current_token.value}")
-            self.advance()
-        else:
-            self.error("RECTANGLE")
+        self.advance()
+        x, y = self.pair()
+        width, height = self.pair()
+        if self.trace is not None:
+            self.trace(f"Detected frame: ({x},{y}) ({width},{height})")
+        return Frame(x, y, width, height)
 
-    def repeat(self):
+    def circle(self):
         """
-        Parse and validate a REPEAT block.
+        Parse and validate a CIRCLE instruction: "circle (X,Y) radius R".
         
-        Validates the start of a repeat block, processes all instructions
-        inside the block, and ensures proper closing with REPEAT_END.
-        Raises error if block is not properly closed.
+        Returns:
+            Circle: The decoded instruction
         """
-        # Handle the REPEAT block
-        if self.current_token is None:
-            self.error("REPEAT_INI")
-        elif self.current_token.type_ == "REPEAT_INI":
-            print(f"Repeat start: {self.current_token.value}")
-            self.advance()
-            # Process instructions inside the repeat block
-            while self.current_token is not None and self.current_token.type_ != "REPEAT_END":
-                self.instruccion()
-            # Check for the end of the repeat block
-            if self.current_token and self.current_token.type_ == "REPEAT_END":
-                print("Repeat end")
-                self.advance()
-            else:
-                self.error("} (repeat block end)")
-        else:
-            self.error("REPEAT_INI")
+        self.advance()
+        x, y = self.pair()
+        self.expect(RADIUS)
+        radius = NUMBERS[self.expect(NUMBER)]
+        if self.trace is not None:
+            self.trace(f"Detected circle: ({x},{y}) radius {radius}")
+        return Circle(x, y, radius)
+
+    def pair(self):
+        """
+        Parse a "(A,B)" pair of integers (coordinates or dimensions).
+        
+        Returns:
+            tuple: The two integers
+        """
+        self.expect(LPAREN)
+        first = NUMBERS[self.expect(NUMBER)]
+        self.expect(COMMA)
+        second = NUMBERS[self.expect(NUMBER)]
+        self.expect(RPAREN)
+        return first, second
+
+    def expect(self, kind):
+        """
+        Consume a token of the given kind.
+        
+        Args:
+            kind (int): Expected token kind (see LexicalPd.TOKEN_KINDS)
+            
+        Returns:
+            str: The value of the consumed token
+            
+        Raises:
+            ParseError: If the current token is missing or of another kind
+        """
+        token = self.current_token
+        if token is None or token.kind != kind:
+            self.error(KIND_NAMES[kind])
+        self.advance()
+        return token.value
 
     def error(self, expected):
         """
@@ -197,7 +411,17 @@ class SintacticAnalyzerPixelDraw:
             expected (str): Description of what was expected
             
         Raises:
-            SyntaxError: With detailed error message including expected and found tokens
+            ParseError: With the expected and found tokens and the source position
         """
         # Raise a syntax error with a descriptive message
-        raise SyntaxError(f"Sintax error: expected {expected}, but found {self.current_token}")
+        raise ParseError(expected, self.current_token)
+
+
+# Method parsing every multi-token instruction, indexed by the kind of its first token
+PARSERS = [None] * len(TOKEN_KINDS)
+for _name, _parser in (("REPEAT_INI", SintacticAnalyzerPixelDraw.repeat),
+                       ("PIXEL", SintacticAnalyzerPixelDraw.pixel),
+                       ("LINE", SintacticAnalyzerPixelDraw.line),
+                       ("FRAME", SintacticAnalyzerPixelDraw.frame),
+                       ("CIRCLE", SintacticAnalyzerPixelDraw.circle)):
+    PARSERS[TOKEN_KINDS[_name]] = _parser
@@ -0,0 +1,306 @@
+"""This module contains a sparse, chunked canvas for huge PixelDraw drawings.
+
+A dense Framebuffer stores every cell, which is infeasible for canvases like
+`size 100000x100000` even when only a few regions are ever drawn. The
+SparseFramebuffer splits the canvas into square chunks and stores each chunk
+either as a single palette index (uniform chunks, including the never drawn
+ones) or as a full array of cells once a draw only partly covers it.
+Materialized chunks can be kept in a memory-mapped temporary file instead of
+the Python heap.
+
+It offers the Framebuffer drawing and reading interface, plus chunks() so
+consumers can visit only the drawn regions.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+import mmap
+import tempfile
+from array import array
+
+from FramebufferPD import Framebuffer
+
+
+class _SpillFile:
+    """Fixed-size cell buffers carved out of a memory-mapped temporary file."""
+
+    # Buffers mapped at once when the file grows
+    SEGMENT_SLOTS = 64
+
+    def __init__(self, directory: str, typecode: str, slot_cells: int):
+        self.file = tempfile.TemporaryFile(dir=directory)
+        self.typecode = typecode
+        self.slot_bytes = slot_cells * array(typecode).itemsize
+        # Segments start at multiples of the mmap allocation granularity
+        granularity = mmap.ALLOCATIONGRANULARITY
+        size = self.slot_bytes * self.SEGMENT_SLOTS
+        self.segment_bytes = (size + granularity - 1) // granularity * granularity
+        self.segments = []
+        self.free = []
+
+    def allocate(self) -> memoryview:
+        """Returns a zeroed or recycled buffer of slot_cells cells."""
+        if not self.free:
+            self._grow()
+        return self.free.pop()
+
+    def release(self, buffer: memoryview):
+        """Gives a buffer back for reuse."""
+        self.free.append(buffer)
+
+    def _grow(self):
+        """Extends the file by one segment and maps it."""
+        offset = len(self.segments) * self.segment_bytes
+        self.file.truncate(offset + self.segment_bytes)
+        segment = mmap.mmap(self.file.fileno(), self.segment_bytes, offset=offset)
+        self.segments.append(segment)
+        view = memoryview(segment)
+        for start in range(0, self.segment_bytes - self.slot_bytes + 1, self.slot_bytes):
+            self.free.append(view[start:start + self.slot_bytes].cast(self.typecode))
+
+
+class SparseFramebuffer(Framebuffer):
+    """
+    Palette-indexed raster stored as lazily materialized square chunks.
+
+    Chunks map (chunk_x, chunk_y) to either an int (every cell of the chunk
+    has that palette index) or a row-major buffer of chunk_cells *
+    chunk_cells cells. Chunks that were never drawn are absent and unpainted.
+    """
+
+    CHUNK_CELLS = 256                   # Default chunk side in cells
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, width: int, height: int, chunk_cells: int = None, spill_dir: str = None):
+        """
+        Initialize an empty sparse canvas.
+
+        Args:
+            width (int): Width of the canvas in cells
+            height (int): Height of the canvas in cells
+            chunk_cells (int): Chunk side in cells
+            spill_dir (str): Directory of the memory-mapped file holding the
+                materialized chunks, None to keep them in memory
+        """
+        self.width = width
+        self.height = height
+        self.chunk_cells = chunk_cells or self.CHUNK_CELLS
+        self.palette = [None]
+        self._palette_lookup = {}
+        # Chunks keep 16-bit cells so spill slots never change size
+        self.typecode = self.WIDE_TYPECODE
+        self._chunks = {}
+        side = self.chunk_cells
+        self._spill = None if spill_dir is None else _SpillFile(spill_dir, self.typecode, side * side)
+
+    @property
+    def materialized(self) -> int:
+        """Number of chunks stored as full cell buffers."""
+        return sum(1 for chunk in self._chunks.values() if not isinstance(chunk, int))
+
+    def _extent(self, chunk_x: int, chunk_y: int) -> tuple:
+        """Returns the (width, height) of a chunk that lies inside the canvas."""
+        side = self.chunk_cells
+        return min(side, self.width - chunk_x * side), min(side, self.height - chunk_y * side)
+
+    def _materialize(self, index: int):
+        """Returns a new cell buffer of one chunk filled with a palette index."""
+        side = self.chunk_cells
+        if self._spill is None:
+            return array(self.typecode, [index]) * (side * side)
+        buffer = self._spill.allocate()
+        buffer[:] = array(self.typecode, [index]) * (side * side)
+        return buffer
+
+    def _store(self, key: tuple, index: int):
+        """Makes a chunk uniform, releasing its cell buffer."""
+        chunk = self._chunks.get(key)
+        if self._spill is not None and chunk is not None and not isinstance(chunk, int):
+            self._spill.release(chunk)
+        self._chunks[key] = index
+
+    # pylint: disable=too-many-arguments
+    def _fill_chunk(self, key: tuple, x: int, y: int, w: int, h: int, index: int):
+        """Paints a rectangle given in chunk coordinates inside one chunk."""
+        chunk = self._chunks.get(key, 0)
+        chunk_width, chunk_height = self._extent(*key)
+        if x == 0 and y == 0 and w >= chunk_width and h >= chunk_height:
+            # The whole chunk gets one color
+            self._store(key, index)
+            return
+        if isinstance(chunk, int):
+            if chunk == index:
+                return
+            chunk = self._chunks[key] = self._materialize(chunk)
+        side = self.chunk_cells
+        if x == 0 and w == side:
+            chunk[y * side:(y + h) * side] = array(self.typecode, [index]) * (w * h)
+            return
+        run = array(self.typecode, [index]) * w
+        for start in range(y * side + x, (y + h) * side, side):
+            chunk[start:start + w] = run
+
+    def fill_rect(self, x: int, y: int, w: int, h: int, color):
+        """Paints a filled rectangle chunk by chunk.
+
+        Chunks the rectangle covers completely become uniform; the others are
+        materialized and written with one slice per row.
+        """
+        if w <= 0 or h <= 0:
+            return
+        index = self.color_index(color)
+        side = self.chunk_cells
+        for chunk_y in range(y // side, (y + h - 1) // side + 1):
+            top = max(y, chunk_y * side)
+            bottom = min(y + h, (chunk_y + 1) * side)
+            for chunk_x in range(x // side, (x + w - 1) // side + 1):
+                left = max(x, chunk_x * side)
+                right = min(x + w, (chunk_x + 1) * side)
+                self._fill_chunk((chunk_x, chunk_y), left - chunk_x * side, top - chunk_y * side,
+                                 right - left, bottom - top, index)
+
+    def fill_span(self, x: int, y: int, length: int, color):
+        """Paints a horizontal run of cells."""
+        self.fill_rect(x, y, length, 1, color)
+
+    def set_pixel(self, x: int, y: int, color):
+        """Paints a single cell."""
+        self.fill_rect(x, y, 1, 1, color)
+
+    def clear(self):
+        """Marks every cell as unpainted by dropping all chunks."""
+        if self._spill is not None:
+            for chunk in self._chunks.values():
+                if not isinstance(chunk, int):
+                    self._spill.release(chunk)
+        self._chunks = {}
+
+    def get_pixel(self, x: int, y: int):
+        """Returns the color of a cell, or None if it was never painted."""
+        side = self.chunk_cells
+        chunk = self._chunks.get((x // side, y // side), 0)
+        if isinstance(chunk, int):
+            return self.palette[chunk]
+        return self.palette[chunk[(y % side) * side + x % side]]
+
+    def row(self, y: int, x0: int = 0, x1: int = None):
+        """Returns the palette indices of one row, or part of it, as an array."""
+        x1 = self.width if x1 is None else x1
+        side = self.chunk_cells
+        chunk_y = y // side
+        offset = (y % side) * side
+        cells = array(self.typecode)
+        x = x0
+        while x < x1:
+            chunk_x = x // side
+            end = min(x1, (chunk_x + 1) * side)
+            chunk = self._chunks.get((chunk_x, chunk_y), 0)
+            if isinstance(chunk, int):
+                cells += array(self.typecode, [chunk]) * (end - x)
+            else:
+                start = offset + x - chunk_x * side
+                cells.frombytes(chunk[start:start + end - x].tobytes())
+            x = end
+        return cells
+
+    def uniform_index(self, x0: int, y0: int, x1: int, y1: int):
+        """Returns the palette index of a region whose cells all share it, else None.
+
+        Only uniform chunks are inspected, so a region is reported uniform
+        when every chunk it touches is stored as the same single index.
+        """
+        side = self.chunk_cells
+        found = None
+        for chunk_y in range(y0 // side, (y1 - 1) // side + 1):
+            for chunk_x in range(x0 // side, (x1 - 1) // side + 1):
+                chunk = self._chunks.get((chunk_x, chunk_y), 0)
+                if not isinstance(chunk, int) or found not in (None, chunk):
+                    return None
+                found = chunk
+        return found
+
+    def _region(self, key: tuple) -> array:
+        """Returns the cells of a chunk that lie inside the canvas, row-major."""
+        chunk = self._chunks[key]
+        chunk_width, chunk_height = self._extent(*key)
+        if isinstance(chunk, int):
+            return array(self.typecode, [chunk]) * (chunk_width * chunk_height)
+        side = self.chunk_cells
+        cells = array(self.typecode)
+        if chunk_width == side:
+            cells.frombytes(chunk[:side * chunk_height].tobytes())
+            return cells
+        for start in range(0, chunk_height * side, side):
+            cells.frombytes(chunk[start:start + chunk_width].tobytes())
+        return cells
+
+    def chunks(self):
+        """Yields the drawn chunks in row-major order, skipping untouched ones.
+
+        Yields:
+            tuple: (x, y, width, height, index_or_cells) where the last item is
+            an int for uniform chunks, or an array of width * height palette
+            indices for materialized ones
+        """
+        side = self.chunk_cells
+        for key in sorted(self._chunks, key=lambda key: (key[1], key[0])):
+            chunk_width, chunk_height = self._extent(*key)
+            chunk = self._chunks[key]
+            value = chunk if isinstance(chunk, int) else self._region(key)
+            yield key[0] * side, key[1] * side, chunk_width, chunk_height, value
+
+    def compact(self) -> int:
+        """Turns materialized chunks whose cells all share one index into uniform chunks.
+
+        Returns:
+            int: Number of chunks released
+        """
+        released = 0
+        for key, chunk in list(self._chunks.items()):
+            if isinstance(chunk, int):
+                continue
+            cells = self._region(key)
+            if cells.count(cells[0]) == len(cells):
+                self._store(key, cells[0])
+                released += 1
+        return released
+
+    def painted_cells(self) -> int:
+        """Returns how many cells were painted."""
+        total = 0
+        for _x, _y, width, height, value in self.chunks():
+            if isinstance(value, int):
+                total += width * height if value else 0
+            else:
+                total += len(value) - value.count(0)
+        return total
+
+    def pixels(self):
+        """Yields the painted pixels as (x, y, color) tuples, chunk by chunk.
+
+        Untouched chunks are skipped; inside a chunk pixels are row-major.
+        """
+        palette = self.palette
+        for x0, y0, width, height, value in self.chunks():
+            if isinstance(value, int):
+                if value:
+                    color = palette[value]
+                    for y in range(y0, y0 + height):
+                        for x in range(x0, x0 + width):
+                            yield x, y, color
+                continue
+            for offset, index in enumerate(value):
+                if index:
+                    yield x0 + offset % width, y0 + offset // width, palette[index]
+
+    def to_bytes(self) -> bytes:
+        """Serializes the canvas in the dense format of Framebuffer.to_bytes()."""
+        dense = Framebuffer(0, 0)
+        dense.width = self.width
+        dense.height = self.height
+        for color in self.palette[1:]:
+            dense.color_index(color)
+        for y in range(self.height):
+            dense.cells += array(dense.typecode, self.row(y))
+        return dense.to_bytes()
@@ -0,0 +1,220 @@
+"""This module contains a scrollable, tiled Tkinter viewer for large PixelDraw canvases.
+
+Instead of drawing the whole canvas up front, the viewer splits it into square
+tiles and only turns the tiles inside the visible viewport into images. Tiles
+are kept in a bounded LRU cache and dropped from the Tk canvas once the cache
+is full and they are out of view, so startup time and Tk memory depend on the
+window size rather than on the image size.
+
+Authors: Nicolás Alberto Rodríguez Delgado <20202020019>
+         Daniel Mateo Montoya González <20202020098>
+"""
+
+from collections import OrderedDict
+
+import tkinter as tk
+
+from ColorsPD import hex_color
+
+
+class TiledViewer:
+    """
+    Scrollable and zoomable viewer that materializes tiles on demand.
+
+    Tiles are built from the compiled framebuffer the first time they become
+    visible. Keyboard shortcuts: "+" and "-" change the zoom level, the mouse
+    wheel scrolls vertically (horizontally with Shift, zooms with Control).
+    """
+
+    TILE_CELLS = 64                             # Tile side in canvas cells
+    ZOOM_LEVELS = (1, 2, 4, 8, 16, 20, 32)      # Available pixel sizes
+    GRID_MIN_ZOOM = 4                           # Smallest pixel size that shows the grid
+
+    def __init__(self, root, framebuffer, pixel_size: int = 20, viewport=(500, 500),
+                 max_tiles: int = 256, show_grid: bool = True):
+        """
+        Create the viewer widgets inside a Tk window.
+
+        Args:
+            root (tk.Tk): Parent window
+            framebuffer (Framebuffer): Compiled canvas to display
+            pixel_size (int): Initial size of each cell in screen pixels
+            viewport (tuple): Initial (width, height) of the visible area in pixels
+            max_tiles (int): Maximum number of tiles kept in the cache
+            show_grid (bool): Whether to draw the gray grid at large zoom levels
+        """
+        self.root = root
+        self.framebuffer = framebuffer
+        self.pixel_size = pixel_size
+        self.max_tiles = max(1, max_tiles)
+        self.show_grid = show_grid
+
+        # Cached tiles: (tile_x, tile_y) -> (image, canvas item ids)
+        self._tiles = OrderedDict()
+        self._refresh_pending = False
+
+        # Unpainted cells use the canvas background color
+        self._colors = ["white" if color is None else hex_color(color) for color in framebuffer.palette]
+
+        frame = tk.Frame(root)
+        frame.pack(fill="both", expand=True)
+        self.canvas = tk.Canvas(frame, width=viewport[0], height=viewport[1], bg="white")
+        hbar = tk.Scrollbar(frame, orient="horizontal", command=self._xview)
+        vbar = tk.Scrollbar(frame, orient="vertical", command=self._yview)
+        self.canvas.configure(xscrollcommand=hbar.set, yscrollcommand=vbar.set)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        vbar.grid(row=0, column=1, sticky="ns")
+        hbar.grid(row=1, column=0, sticky="ew")
+        frame.rowconfigure(0, weight=1)
+        frame.columnconfigure(0, weight=1)
+
+        # Redraw whenever the visible area changes
+        self.canvas.bind("<Configure>", lambda _event: self.schedule_refresh())
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Shift-MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Control-MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", self._on_wheel)
+        self.canvas.bind("<Button-5>", self._on_wheel)
+        root.bind("<plus>", lambda _event: self.zoom(1))
+        root.bind("<minus>", lambda _event: self.zoom(-1))
+
+        self._update_scrollregion()
+
+    def _update_scrollregion(self):
+        """Resize the scrollable area to the full canvas at the current zoom."""
+        self.canvas.configure(scrollregion=(0, 0,
+                                            self.framebuffer.width * self.pixel_size,
+                                            self.framebuffer.height * self.pixel_size))
+
+    def _xview(self, *args):
+        """Scroll horizontally and refresh the visible tiles."""
+        self.canvas.xview(*args)
+        self.schedule_refresh()
+
+    def _yview(self, *args):
+        """Scroll vertically and refresh the visible tiles."""
+        self.canvas.yview(*args)
+        self.schedule_refresh()
+
+    def _on_wheel(self, event):
+        """Scroll or zoom with the mouse wheel."""
+        step = -1 if event.num == 4 or getattr(event, "delta", 0) > 0 else 1
+        if event.state & 0x0004:
+            # Control held: zoom in when scrolling up
+            self.zoom(-step)
+            return
+        if event.state & 0x0001:
+            self.canvas.xview_scroll(step, "units")
+        else:
+            self.canvas.yview_scroll(step, "units")
+        self.schedule_refresh()
+
+    def zoom(self, direction: int):
+        """
+        Move to the next (direction > 0) or previous zoom level.
+
+        The cell at the center of the viewport stays centered.
+        """
+        levels = self.ZOOM_LEVELS
+        current = min(range(len(levels)), key=lambda i: abs(levels[i] - self.pixel_size))
+        target = max(0, min(len(levels) - 1, current + direction))
+        if levels[target] == self.pixel_size:
+            return
+
+        # Remember the center of the view in cell coordinates
+        view_width = self.canvas.winfo_width()
+        view_height = self.canvas.winfo_height()
+        center_x = (self.canvas.canvasx(0) + view_width / 2) / self.pixel_size
+        center_y = (self.canvas.canvasy(0) + view_height / 2) / self.pixel_size
+
+        self.pixel_size = levels[target]
+        self.clear_tiles()
+        self._update_scrollregion()
+
+        full_width = self.framebuffer.width * self.pixel_size
+        full_height = self.framebuffer.height * self.pixel_size
+        self.canvas.xview_moveto(max(0.0, (center_x * self.pixel_size - view_width / 2) / full_width))
+        self.canvas.yview_moveto(max(0.0, (center_y * self.pixel_size - view_height / 2) / full_height))
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        """Refresh the visible tiles once the pending Tk events are processed."""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.root.after_idle(self.refresh)
+
+    def visible_tiles(self):
+        """Return the (tile_x, tile_y) keys of the tiles inside the viewport."""
+        tile_span = self.TILE_CELLS * self.pixel_size
+        left = max(0, int(self.canvas.canvasx(0)) // tile_span)
+        top = max(0, int(self.canvas.canvasy(0)) // tile_span)
+        right = int(self.canvas.canvasx(self.canvas.winfo_width())) // tile_span
+        bottom = int(self.canvas.canvasy(self.canvas.winfo_height())) // tile_span
+        right = min(right, (self.framebuffer.width - 1) // self.TILE_CELLS)
+        bottom = min(bottom, (self.framebuffer.height - 1) // self.TILE_CELLS)
+        return [(tx, ty) for ty in range(top, bottom + 1) for tx in range(left, right + 1)]
+
+    def refresh(self):
+        """Materialize the visible tiles and evict the least recently used ones."""
+        self._refresh_pending = False
+        visible = self.visible_tiles()
+        for key in visible:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+            else:
+                self._tiles[key] = self._build_tile(*key)
+
+        # Evict old tiles, never the ones currently on screen
+        visible_keys = set(visible)
+        while len(self._tiles) > max(self.max_tiles, len(visible_keys)):
+            key = next(iter(self._tiles))
+            if key in visible_keys:
+                self._tiles.move_to_end(key)
+                continue
+            self._drop_tile(key)
+
+    def _build_tile(self, tile_x: int, tile_y: int):
+        """
+        Turn one tile of the framebuffer into a zoomed image on the canvas.
+
+        Returns:
+            tuple: (image, canvas item ids) of the new tile
+        """
+        cells = self.TILE_CELLS
+        x0 = tile_x * cells
+        y0 = tile_y * cells
+        x1 = min(x0 + cells, self.framebuffer.width)
+        y1 = min(y0 + cells, self.framebuffer.height)
+
+        # One put() for the whole tile; a uniform region is filled in one go
+        colors = self._colors
+        image = tk.PhotoImage(width=x1 - x0, height=y1 - y0)
+        uniform = self.framebuffer.uniform_index(x0, y0, x1, y1)
+        if uniform is not None:
+            image.put(colors[uniform], to=(0, 0, x1 - x0, y1 - y0))
+        else:
+            rows = ["{" + " ".join([colors[index] for index in self.framebuffer.row(y, x0, x1)]) + "}"
+                    for y in range(y0, y1)]
+            image.put(" ".join(rows), to=(0, 0))
+        if self.pixel_size > 1:
+            image = image.zoom(self.pixel_size)
+
+        size = self.pixel_size
+        items = [self.canvas.create_image(x0 * size, y0 * size, anchor="nw", image=image)]
+        if self.show_grid and size >= self.GRID_MIN_ZOOM:
+            for x in range(x0, x1 + 1):
+                items.append(self.canvas.create_line(x * size, y0 * size, x * size, y1 * size, fill="gray"))
+            for y in range(y0, y1 + 1):
+                items.append(self.canvas.create_line(x0 * size, y * size, x1 * size, y * size, fill="gray"))
+        return image, items
+
+    def _drop_tile(self, key):
+        """Remove a tile from the cache and its items from the canvas."""
+        _image, items = self._tiles.pop(key)
+        for item in items:
+            self.canvas.delete(item)
+
+    def clear_tiles(self):
+        """Drop every cached tile (e.g. after a zoom change)."""
+        for key in list(self._tiles):
+            self._drop_tile(key)
@@ -0,0 +1,6 @@
+"""Test configuration: the PixelDraw modules live at the repository root."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
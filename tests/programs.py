@@ -0,0 +1,35 @@
+"""Random PixelDraw programs shared by the differential tests."""
+
+import random
+
+COLORS = ("red", "blue", "#00FF00", "yellow")
+
+
+def random_statements(rng: random.Random, depth: int = 0, count: int = None) -> list:
+    """Returns random statements, mostly in bounds of a 12x12 canvas."""
+    statements = []
+    for _ in range(count or rng.randint(1, 8)):
+        kind = rng.random()
+        if kind < 0.15:
+            statements.append(f"color {rng.choice(COLORS)}")
+        elif kind < 0.4:
+            statements.append(f"point {rng.randint(0, 12)} {rng.randint(0, 12)}")
+        elif kind < 0.8:
+            statements.append(f"rectangle {rng.randint(0, 10)} {rng.randint(0, 10)} "
+                              f"{rng.randint(0, 6)} {rng.randint(0, 6)}")
+        elif kind < 0.81:
+            statements.append("clear")
+        elif kind < 0.84:
+            statements.append(f"line ({rng.randint(0, 13)},{rng.randint(0, 12)}) to "
+                              f"({rng.randint(0, 12)},{rng.randint(0, 12)})")
+        elif kind < 0.86:
+            statements.append(f"frame ({rng.randint(0, 10)},{rng.randint(0, 10)}) "
+                              f"({rng.randint(0, 6)},{rng.randint(0, 6)})")
+        elif kind < 0.88:
+            statements.append(f"circle ({rng.randint(0, 12)},{rng.randint(0, 12)}) radius {rng.randint(0, 5)}")
+        elif kind < 0.9:
+            statements.append(f"size {rng.randint(8, 13)}x{rng.randint(8, 13)}")
+        elif depth < 2:
+            body = " ".join(random_statements(rng, depth + 1))
+            statements.append(f"repeat {rng.randint(0, 3)} {{ {body} }}")
+    return statements
@@ -0,0 +1,131 @@
+"""Tests of the GIF export: the LZW image data and whole GIFs decode back to the drawn frames."""
+
+import io
+import random
+import re
+import struct
+from array import array
+
+import pytest
+
+from AnimationPD import _scaled_indices, lzw_encode, write_gif
+from CompilerPD import CompilerPixelDraw
+from programs import random_statements
+
+
+def lzw_decode(data: bytes, min_code_size: int) -> bytes:
+    """Decodes GIF LZW image data, as a GIF reader does."""
+    clear = 1 << min_code_size
+    end = clear + 1
+    output = bytearray()
+    table = previous = None
+    code_size = min_code_size + 1
+    bits = bit_count = position = 0
+    while True:
+        while bit_count < code_size:
+            bits |= data[position] << bit_count
+            position += 1
+            bit_count += 8
+        code = bits & ((1 << code_size) - 1)
+        bits >>= code_size
+        bit_count -= code_size
+        if code == clear:
+            table = [bytes((index,)) for index in range(clear)] + [b"", b""]
+            code_size = min_code_size + 1
+            previous = None
+            continue
+        if code == end:
+            break
+        if code < len(table):
+            entry = table[code]
+        else:
+            # The code being defined by this very step (KwKwK)
+            assert previous is not None and code == len(table)
+            entry = previous + previous[:1]
+        if previous is not None and len(table) < 1 << 12:
+            table.append(previous + entry[:1])
+            if len(table) == 1 << code_size and code_size < 12:
+                code_size += 1
+        output += entry
+        previous = entry
+    assert position == len(data), "data after the end code"
+    return bytes(output)
+
+
+def read_gif(data: bytes) -> tuple:
+    """Returns the size and the canvas of every frame of a GIF written by write_gif()."""
+    assert data[:6] == b"GIF89a"
+    width, height, flags = struct.unpack_from("<HHB", data, 6)
+    position = 13 + 3 * (2 << (flags & 7))
+    canvas = bytearray(width * height)
+    frames = []
+    while data[position] != 0x3B:
+        if data[position] == 0x21:
+            # Extension: label, then sub-blocks
+            position += 2
+            while data[position]:
+                position += data[position] + 1
+            position += 1
+            continue
+        assert data[position] == 0x2C
+        left, top, frame_width, frame_height, _flags = struct.unpack_from("<HHHHB", data, position + 1)
+        min_code_size = data[position + 10]
+        position += 11
+        image = bytearray()
+        while data[position]:
+            image += data[position + 1:position + 1 + data[position]]
+            position += data[position] + 1
+        position += 1
+        indices = lzw_decode(bytes(image), min_code_size)
+        assert len(indices) == frame_width * frame_height
+        for row in range(frame_height):
+            start = (top + row) * width + left
+            canvas[start:start + frame_width] = indices[row * frame_width:(row + 1) * frame_width]
+        frames.append(bytes(canvas))
+    return width, height, frames
+
+
+@pytest.mark.parametrize("min_code_size", [2, 3, 5, 8])
+def test_lzw_round_trip(min_code_size):
+    rng = random.Random(min_code_size)
+    symbols = 1 << min_code_size
+    cases = [b"", bytes((symbols - 1,)), bytes(5000), bytes(range(symbols)) * 40]
+    for _ in range(40):
+        used = rng.randint(1, symbols)
+        # Long inputs fill the 12-bit code table, so the encoder has to clear it
+        cases.append(bytes(rng.randrange(used) for _ in range(rng.choice((10, 300, 20000)))))
+    for data in cases:
+        assert lzw_decode(lzw_encode(data, min_code_size), min_code_size) == data
+
+
+def test_wide_cells_are_scaled_by_value():
+    cells = array("H", [1, 255, 0, 7])
+    assert _scaled_indices(cells, 2, 2, 1) == bytes((1, 255, 0, 7))
+    assert _scaled_indices(cells, 2, 2, 2) == bytes((1, 1, 255, 255)) * 2 + bytes((0, 0, 7, 7)) * 2
+
+
+@pytest.mark.parametrize("pixel_size", [1, 3])
+def test_gif_frames_decode_to_the_animation(pixel_size):
+    checked = 0
+    for case in range(60):
+        rng = random.Random(case)
+        frames = [" ".join(random_statements(rng, count=rng.randint(0, 6))) for _ in range(rng.randint(1, 5))]
+        # Every frame draws on the same canvas
+        code = re.sub(r"size \d+x\d+", "size 14x14", "size 14x14 " + "\n---\n".join(frames))
+        try:
+            animation = CompilerPixelDraw().animate(code)
+        except Exception:  # pylint: disable=broad-except
+            # Circles may leave the canvas
+            continue
+        checked += 1
+        stream = io.BytesIO()
+        write_gif(animation, stream, pixel_size)
+        width, height, decoded = read_gif(stream.getvalue())
+        assert (width, height) == (14 * pixel_size, 14 * pixel_size)
+        expected = []
+        for number, framebuffer in enumerate(animation.framebuffers()):
+            # Frames without changes lengthen the GIF frame before them
+            if number == 0 or animation.frames[number].cells is not None:
+                expected.append(_scaled_indices(framebuffer.cells, 14, 14, pixel_size))
+        assert decoded == expected, code
+    assert checked >= 30
@@ -0,0 +1,78 @@
+"""Tests of batch compilation: every script of a batch gets its own image."""
+
+import io
+import os
+import pickle
+from pathlib import Path
+
+import pytest
+
+from BatchPD import compile_many
+from CachePD import CompileCache
+from CompilerPD import CompilerPixelDraw, main
+
+
+def direct_image(code: str) -> bytes:
+    """Returns the PNG a compiler writes for a script."""
+    stream = io.BytesIO()
+    CompilerPixelDraw().compile_to_image(code, stream, "png")
+    return stream.getvalue()
+
+
+@pytest.mark.parametrize("workers", [0, 1])
+def test_sources_with_the_same_name_get_their_own_images(tmp_path, workers):
+    codes = {
+        "a/logo.pd": "size 2x2\ncolor red\npoint 0 0",
+        "b/logo.pd": "size 3x2\ncolor blue\npoint 1 1",
+        "b/LOGO.pd": "size 4x2\ncolor yellow\npoint 2 1",
+        "c/2.pd": "size 2x3\npoint 1 2",
+    }
+    sources = []
+    for name, code in codes.items():
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_text(code, encoding="utf-8")
+        sources.append(path)
+    # Inline code is named after its batch index, like c/2.pd
+    inline = "size 5x1\npoint 4 0"
+    sources.insert(2, inline)
+    output_dir = tmp_path / "out"
+    results = list(compile_many(sources, str(output_dir), workers))
+
+    assert all(result.error is None for result in results)
+    outputs = [result.output for result in results]
+    assert len(set(outputs)) == len(outputs)
+    assert sorted(os.listdir(output_dir)) == sorted(os.path.basename(output) for output in outputs)
+    for source, output in zip(sources, outputs):
+        code = source if isinstance(source, str) else Path(source).read_text(encoding="utf-8")
+        assert Path(output).read_bytes() == direct_image(code), output
+    assert [os.path.basename(output) for output in outputs] == [
+        "logo.png", "logo-1.png", "2.png", "LOGO-3.png", "2-4.png"]
+
+
+def test_workers_share_the_disk_cache(tmp_path):
+    template = CompilerPixelDraw()
+    template.cache = CompileCache(directory=str(tmp_path / "cache"))
+    template.cache.put("unrelated", b"entry")
+    sources = [f"size {2 + index}x2\npoint 1 1" for index in range(4)]
+    assert all(result.error is None for result in compile_many(sources, workers=1, compiler=template))
+    # The workers started with empty memory tiers and wrote their rasters to disk
+    assert len(os.listdir(tmp_path / "cache")) == 1 + len(sources)
+    compiler = CompilerPixelDraw()
+    compiler.cache = CompileCache(directory=str(tmp_path / "cache"))
+    compiler.rasterize(sources[0])
+    assert compiler.cache.disk_hits == 1
+
+
+def test_cache_sent_to_a_worker_starts_empty(tmp_path):
+    cache = CompileCache(1000, str(tmp_path), 5000)
+    cache.put("key", b"entry")
+    copy = pickle.loads(pickle.dumps(cache))
+    assert len(copy) == 0
+    assert (copy.max_bytes, copy.directory, copy.max_disk_bytes) == (1000, str(tmp_path), 5000)
+    assert copy.get("key") == b"entry"
+
+
+def test_raster_jobs_are_rejected_in_batch_mode(tmp_path):
+    with pytest.raises(SystemExit):
+        main(["a.pd", "b.pd", "-o", str(tmp_path), "--raster-jobs", "2"])
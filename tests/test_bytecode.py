@@ -0,0 +1,126 @@
+"""Tests of the bytecode format: replayed programs draw like the parsed ones, malformed files are rejected."""
+
+import random
+import struct
+
+import pytest
+
+import BytecodePD
+from BytecodePD import BytecodeProgram
+from CompilerPD import CompilerPixelDraw
+from CostPD import Budget, BudgetExceededError, estimate_cost
+from LexicalPd import LexicalAnalyzer
+from programs import random_statements
+from SemanticPD import SemanticAnalyzer
+from SintacticPD import SintacticAnalyzerPixelDraw
+
+
+def parse(code: str) -> list:
+    """Returns the instruction tree of a source."""
+    return SintacticAnalyzerPixelDraw(LexicalAnalyzer.lex(code)).parse()
+
+
+def compile_bytes(code: str) -> bytearray:
+    """Returns the bytecode of a source, as a buffer the tests can tamper with."""
+    program = parse(code)
+    return bytearray(BytecodePD.encode(program, estimate_cost(program)))
+
+
+def run(program: list, keep_pixels: bool, loaded: BytecodeProgram = None):
+    """Returns the canvas, pixels and log of a parsed or replayed program, or its error message."""
+    analyzer = SemanticAnalyzer([] if loaded else program, keep_pixels=keep_pixels)
+    try:
+        width, height, framebuffer = loaded.replay(analyzer) if loaded else analyzer.analyze()
+    except Exception as error:  # pylint: disable=broad-except
+        return str(error)
+    return width, height, sorted(framebuffer.pixels()), analyzer.pixels
+
+
+def patch(data: bytearray, record: int, field: int, value: int) -> bytearray:
+    """Overwrites one operand (or the opcode, field 0) of one record."""
+    colors = BytecodePD.HEADER.unpack_from(data)[3]
+    offset = BytecodePD.HEADER.size + BytecodePD.COST.size + 4 * colors
+    struct.pack_into("<i", data, offset + 4 * (record * BytecodePD.RECORD_FIELDS + field), value)
+    return data
+
+
+@pytest.mark.parametrize("keep_pixels", [False, True])
+def test_replay_draws_like_the_parsed_program(keep_pixels):
+    for case in range(300):
+        rng = random.Random(case)
+        code = "size 12x12 " + " ".join(random_statements(rng, count=rng.randint(3, 20)))
+        program = parse(code)
+        loaded = BytecodeProgram(BytecodePD.encode(program, estimate_cost(program)))
+        assert run(program, keep_pixels, loaded) == run(program, keep_pixels), code
+        assert run(loaded.decode(), keep_pixels) == run(program, keep_pixels), code
+
+
+def test_loaded_cost_matches_the_decoded_program():
+    extras = ("repeat 0 { size 90x90 color #111111 }", "---", "clear", "size 20x30", "repeat 3 { --- point 1 1 }",
+              "repeat 2 { repeat 0 { --- } point 0 0 }")
+    for case in range(500):
+        rng = random.Random(case)
+        statements = random_statements(rng, count=rng.randint(1, 15))
+        for _ in range(rng.randint(0, 3)):
+            statements.insert(rng.randint(0, len(statements)), rng.choice(extras))
+        code = "size 12x12 " + " ".join(statements)
+        loaded = BytecodeProgram(compile_bytes(code))
+        assert vars(loaded.cost) == vars(estimate_cost(loaded.decode())), code
+
+
+def test_loaded_cost_is_recomputed():
+    program = parse("size 8x8 repeat 3 { color red point 1 1 --- }")
+    data = bytearray(BytecodePD.encode(program, estimate_cost(program)))
+    data[BytecodePD.HEADER.size:BytecodePD.HEADER.size + BytecodePD.COST.size] = bytes(BytecodePD.COST.size)
+    assert vars(BytecodeProgram(data).cost) == vars(estimate_cost(program))
+
+
+def test_forged_cost_does_not_get_past_the_budget():
+    data = compile_bytes("size 30000x30000 point 1 1")
+    data[BytecodePD.HEADER.size:BytecodePD.HEADER.size + BytecodePD.COST.size] = bytes(BytecodePD.COST.size)
+    compiler = CompilerPixelDraw()
+    compiler.budget = Budget(max_canvas_bytes=1000)
+    with pytest.raises(BudgetExceededError):
+        compiler.rasterize_bytecode(BytecodeProgram(data))
+
+
+@pytest.mark.parametrize("record, field, value, message", [
+    (1, 2, -1, "repeat body of record 1 leaves its block"),
+    (1, 2, 5, "repeat body of record 1 leaves its block"),
+    (2, 2, 4, "repeat body of record 2 leaves its block"),
+    (4, 1, 7, "color 7 of record 4 is not in the palette"),
+    (4, 1, -1, "color -1 of record 4 is not in the palette"),
+    (5, 0, 99, "unknown opcode 99 in record 5"),
+])
+def test_malformed_records_are_rejected(record, field, value, message):
+    # Records: size, repeat (4 records), repeat (1 record), point, color, point
+    data = compile_bytes("size 4x4 repeat 2 { repeat 2 { point 0 0 } color red point 1 1 }")
+    with pytest.raises(ValueError, match=message):
+        BytecodeProgram(patch(data, record, field, value))
+
+
+def test_palette_entries_must_be_colors():
+    data = compile_bytes("size 4x4 color red point 1 1")
+    struct.pack_into("<I", data, BytecodePD.HEADER.size + BytecodePD.COST.size, 0x1000000)
+    with pytest.raises(ValueError, match="palette entry 0 is not an RGB color"):
+        BytecodeProgram(data)
+
+
+def test_deeply_nested_repeats_are_rejected():
+    depth = BytecodePD.MAX_DEPTH + 1
+    data = compile_bytes("size 4x4 point 0 0")
+    colors = BytecodePD.HEADER.unpack_from(data)[3]
+    # Wrap the point in depth nested "repeat 1" blocks
+    offset = BytecodePD.HEADER.size + BytecodePD.COST.size + 4 * colors + 4 * BytecodePD.RECORD_FIELDS
+    data[offset:offset] = b"".join(struct.pack("<5i", BytecodePD.OP_REPEAT, 1, depth - level, 0, 0)
+                                   for level in range(depth))
+    struct.pack_into("<I", data, BytecodePD.HEADER.size - 4, 2 + depth)
+    with pytest.raises(ValueError, match=f"nested more than {BytecodePD.MAX_DEPTH} deep"):
+        BytecodeProgram(data)
+
+
+def test_deepest_accepted_nesting_replays():
+    depth = BytecodePD.MAX_DEPTH
+    code = "size 4x4 " + "repeat 1 { " * depth + "--- point 1 1" + " }" * depth
+    loaded = BytecodeProgram(compile_bytes(code))
+    assert run(parse(code), True, loaded) == run(parse(code), True)
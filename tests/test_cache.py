@@ -0,0 +1,49 @@
+"""Tests of the compile cache."""
+
+import zlib
+
+from CachePD import CompileCache, cache_key
+from CompilerPD import CompilerPixelDraw
+
+CODE = "size 4x4 color red rectangle 0 0 2 2 color blue rectangle 0 0 4 4"
+
+
+def test_repeated_compile_is_served_from_the_cache():
+    compiler = CompilerPixelDraw()
+    compiler.cache = CompileCache()
+    _width, _height, first = compiler.rasterize(CODE)
+    _width, _height, second = compiler.rasterize(CODE)
+    assert first is not second
+    assert second.to_bytes() == first.to_bytes()
+    assert len(compiler.cache) == 1
+
+
+def test_raster_options_are_part_of_the_key():
+    compiler = CompilerPixelDraw()
+    compiler.cache = CompileCache()
+    _width, _height, plain = compiler.rasterize(CODE)
+    compiler.optimize = True
+    _width, _height, optimized = compiler.rasterize(CODE)
+    # The hidden red rectangle is dropped, so red is not in the palette
+    assert len(compiler.cache) == 2
+    assert plain.palette != optimized.palette
+    assert sorted(plain.pixels()) == sorted(optimized.pixels())
+
+
+def test_key_ignores_blanks_between_tokens():
+    assert cache_key("size 2x2  point 0 0") == cache_key("size 2x2 point\t0 0")
+    assert cache_key("size 2x2 point 0 0") != cache_key("size 2x2 point 0 1")
+
+
+def test_corrupted_entries_are_compiled_again():
+    compiler = CompilerPixelDraw()
+    compiler.cache = CompileCache()
+    _width, _height, first = compiler.rasterize(CODE)
+    key = cache_key(CODE, compiler.raster_options())
+    entry = bytearray(zlib.decompress(compiler.cache.get(key)))
+    # A cell index past the end of the palette
+    entry[-1] = 200
+    compiler.cache.put(key, zlib.compress(bytes(entry)))
+    _width, _height, second = compiler.rasterize(CODE)
+    assert second.to_bytes() == first.to_bytes()
+    assert zlib.decompress(compiler.cache.get(key)).endswith(first.to_bytes())
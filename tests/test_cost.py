@@ -0,0 +1,46 @@
+"""Tests of the cost estimate and of budgets enforced while streaming."""
+
+import io
+
+import pytest
+
+from CompilerPD import CompilerPixelDraw, main
+from CostPD import Budget, BudgetExceededError, CostEstimate, add_cost, estimate_cost
+from LexicalPd import LexicalAnalyzer
+from SintacticPD import SintacticAnalyzerPixelDraw
+
+PROGRAM = ("size 20x20 color red rectangle 0 0 5 5 clear repeat 3 { point 1 1 clear } "
+           + " ".join(f"color #{index:06X} point 0 0" for index in range(300)))
+
+
+def parse(code: str) -> list:
+    """Returns the instruction tree of a source."""
+    return SintacticAnalyzerPixelDraw(LexicalAnalyzer.lex(code)).parse()
+
+
+def test_running_estimate_equals_whole_program_estimate():
+    program = parse(PROGRAM)
+    total = CostEstimate()
+    colors = set()
+    for instruction in program:
+        add_cost(total, [instruction], colors)
+    assert repr(total) == repr(estimate_cost(program))
+    # The clears are bounded by the 20x20 canvas and 300 colors need 16-bit cells
+    assert total.canvas_bytes == 20 * 20 * 2
+
+
+def test_streaming_budget_counts_clears():
+    compiler = CompilerPixelDraw()
+    compiler.streaming = True
+    compiler.budget = Budget(max_pixel_writes=1000)
+    with pytest.raises(BudgetExceededError):
+        compiler.rasterize(io.StringIO("size 20x20 clear clear clear"))
+    compiler.budget = Budget(max_pixel_writes=1200)
+    compiler.rasterize(io.StringIO("size 20x20 clear clear clear"))
+
+
+def test_zero_limit_is_enforced_from_the_command_line(tmp_path, capsys):
+    source = tmp_path / "drawing.pd"
+    source.write_text("size 2x2 point 0 0")
+    assert main([str(source), "-o", str(tmp_path / "drawing.ppm"), "--max-pixel-writes", "0"]) == 1
+    assert "Budget exceeded" in capsys.readouterr().err
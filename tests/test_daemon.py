@@ -0,0 +1,168 @@
+"""Tests of the compile daemon: HTTP requests answer the images a direct compile writes."""
+
+import http.client
+import io
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from CompilerPD import CompilerPixelDraw
+from DaemonPD import CompileDaemon, CompileFailed, request_compile, serve
+
+SOURCES = [f"size {8 + i}x8\ncolor red\nrectangle 1 1 {i % 5} 3\npoint 0 0" for i in range(6)]
+
+
+@pytest.fixture(name="daemon")
+def fixture_daemon():
+    """A daemon without workers, served on a free port."""
+    daemon = CompileDaemon()
+    server = serve(daemon, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    daemon.port = server.server_address[1]
+    yield daemon
+    server.shutdown()
+    server.server_close()
+    daemon.close()
+
+
+def direct_image(code: str, image_format: str, pixel_size: int, grid: bool) -> bytes:
+    """Returns the image a compiler writes for a script."""
+    compiler = CompilerPixelDraw()
+    compiler.pixel_size = pixel_size
+    stream = io.BytesIO()
+    compiler.compile_to_image(code, stream, image_format, grid)
+    return stream.getvalue()
+
+
+def post(port: int, headers: dict, body: bytes = b"") -> tuple:
+    """Sends a raw /compile request and returns (status, decoded JSON body)."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.putrequest("POST", "/compile")
+        for name, value in headers.items():
+            connection.putheader(name, value)
+        connection.endheaders(body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_concurrent_requests_answer_the_direct_images(daemon):
+    requests = [(code, image_format, pixel_size, grid) for code in SOURCES
+                for image_format in ("png", "ppm") for pixel_size in (1, 3) for grid in (False, True)]
+    answers = {}
+
+    def client(offset):
+        for request in requests[offset::4] + requests[offset::4]:
+            answers.setdefault(request, set()).add(request_compile(*request, port=daemon.port))
+
+    threads = [threading.Thread(target=client, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(answers) == len(requests)
+    for request, images in answers.items():
+        assert images == {direct_image(*request)}, request
+    assert daemon.stats()["image_cache"]["hits"] >= len(requests)
+
+
+def test_compile_errors_are_reported(daemon):
+    with pytest.raises(CompileFailed) as error:
+        request_compile("size 2x2\nbogus", port=daemon.port)
+    assert error.value.error_type == "ParseError"
+    with pytest.raises(CompileFailed) as error:
+        request_compile("size 2x2", image_format="bmp", port=daemon.port)
+    assert error.value.error_type == "ValueError"
+
+
+def test_default_budget_rejects_huge_canvases(daemon):
+    with pytest.raises(CompileFailed) as error:
+        request_compile("size 60000x60000\npoint 1 1", port=daemon.port)
+    assert error.value.error_type == "BudgetExceededError"
+
+
+@pytest.mark.parametrize("length", ["-1", "abc"])
+def test_invalid_content_length_is_rejected(daemon, length):
+    status, body = post(daemon.port, {"Content-Length": length})
+    assert status == 400
+    assert body["error"] == f"Invalid Content-Length: {length}"
+
+
+def test_slow_requests_time_out(daemon, monkeypatch):
+    compile_here = daemon._compile_here  # pylint: disable=protected-access
+
+    def slow_compile(requests):
+        time.sleep(0.5)
+        compile_here(requests)
+
+    monkeypatch.setattr(daemon, "_compile_here", slow_compile)
+    daemon.request_timeout = 0.05
+    status, body = post(daemon.port, {"Content-Length": "8"}, b"size 2x2")
+    assert status == 503
+    assert body["type"] == "TimeoutError"
+
+
+def test_dead_workers_are_replaced():
+    large = "size 64x64\n" + "\n".join(f"point {i % 64} {i // 64 % 64}" for i in range(9000))
+    daemon = CompileDaemon(workers=1)
+    try:
+        assert daemon.compile(large)
+        for process in multiprocessing.active_children():
+            os.kill(process.pid, signal.SIGKILL)
+        # The batch that finds the pool broken may fail; the next one runs on a new pool
+        for attempt in range(2):
+            try:
+                image = daemon.compile(large + f"\npoint {attempt} 1")
+                break
+            except CompileFailed as error:
+                assert error.error_type == "BrokenProcessPool"
+        else:
+            pytest.fail("the worker pool was not replaced")
+        assert image == direct_image(large + f"\npoint {attempt} 1", "png", 1, False)
+        assert daemon.stats()["restarts"] == 1
+    finally:
+        daemon.close()
+
+
+def test_oversize_images_are_rejected(daemon):
+    with pytest.raises(CompileFailed) as error:
+        request_compile("size 1000x1000\npoint 1 1", pixel_size=64, port=daemon.port)
+    assert error.value.error_type == "ValueError"
+    assert "limit" in str(error.value)
+    with pytest.raises(CompileFailed):
+        request_compile("size 1000x1000\npoint 1 1\n---\npoint 2 2", "gif", 64, port=daemon.port)
+    assert request_compile("size 1000x1000\npoint 1 1", pixel_size=2, port=daemon.port)
+
+
+def test_failing_batches_do_not_stop_the_daemon(monkeypatch):
+    large = "size 64x64\n" + "\n".join(f"point {i % 64} {i // 64 % 64}" for i in range(9000))
+    daemon = CompileDaemon(workers=1)
+    try:
+        submit = ProcessPoolExecutor.submit
+        failures = []
+
+        def broken_submit(executor, *args):
+            # The submit and its retry on a new pool both fail
+            if len(failures) < 2:
+                failures.append(args)
+                raise BrokenProcessPool("A child process terminated abruptly")
+            return submit(executor, *args)
+
+        monkeypatch.setattr(ProcessPoolExecutor, "submit", broken_submit)
+        with pytest.raises(CompileFailed) as error:
+            daemon.submit(large).result(timeout=10)
+        assert error.value.error_type == "BrokenProcessPool"
+        assert daemon.submit("size 2x2\npoint 1 1").result(timeout=10)
+        assert daemon.submit(large).result(timeout=10) == direct_image(large, "png", 1, False)
+        assert daemon.stats()["restarts"] == 1
+    finally:
+        daemon.close()
@@ -0,0 +1,52 @@
+"""Tests of the palette-indexed framebuffer."""
+
+import pytest
+
+from CompilerPD import CompilerPixelDraw
+from FramebufferPD import Framebuffer
+
+@pytest.mark.parametrize("draw", ["rectangle 1 1 2 2", "rectangle 0 1 4 2", "point 1 1",
+                                  "line (0,1) to (3,1)", "circle (2,2) radius 1"])
+def test_more_than_255_colors_widen_the_cells(draw):
+    # Every color is added to the palette by a draw, the 256th one widens the cells
+    code = "size 4x4 " + " ".join(f"color #{index:06X} {draw}" for index in range(1, 301))
+    compiler = CompilerPixelDraw()
+    compiler.optimize = False
+    _width, _height, framebuffer = compiler.rasterize(code)
+    assert framebuffer.typecode == Framebuffer.WIDE_TYPECODE
+    assert len(framebuffer.palette) == 301
+    assert (2, 2, 300) in set(framebuffer.pixels()) or (1, 1, 300) in set(framebuffer.pixels())
+
+
+def test_widening_keeps_the_drawn_cells():
+    framebuffer = Framebuffer(3, 1)
+    for index in range(1, 256):
+        framebuffer.fill_span(0, 0, 1, index)
+    framebuffer.fill_span(1, 0, 2, 0xABCDEF)
+    assert framebuffer.typecode == Framebuffer.WIDE_TYPECODE
+    assert list(framebuffer.pixels()) == [(0, 0, 255), (1, 0, 0xABCDEF), (2, 0, 0xABCDEF)]
+    assert Framebuffer.from_bytes(framebuffer.to_bytes()).cells == framebuffer.cells
+
+
+def test_serialization_round_trip():
+    framebuffer = Framebuffer(5, 4)
+    framebuffer.fill_rect(1, 1, 3, 2, 0xFF0000)
+    framebuffer.set_pixel(4, 3, 0x00FF00)
+    copy = Framebuffer.from_bytes(framebuffer.to_bytes())
+    assert (copy.width, copy.height, copy.palette) == (5, 4, framebuffer.palette)
+    assert copy.cells == framebuffer.cells
+    with pytest.raises(ValueError):
+        Framebuffer.from_bytes(framebuffer.to_bytes()[:-1])
+
+
+def test_truncated_or_out_of_palette_data_is_rejected():
+    framebuffer = Framebuffer(3, 2)
+    framebuffer.fill_span(0, 0, 2, 0xFF0000)
+    data = framebuffer.to_bytes()
+    for cut in (0, Framebuffer.HEADER.size - 1, Framebuffer.HEADER.size + 1, len(data) - 1):
+        with pytest.raises(ValueError):
+            Framebuffer.from_bytes(data[:cut])
+    corrupted = bytearray(data)
+    corrupted[-1] = 2
+    with pytest.raises(ValueError, match="cell index 2 for 2 colors"):
+        Framebuffer.from_bytes(bytes(corrupted))
@@ -0,0 +1,66 @@
+"""Tests of the lexical analyzer: chunked streams lex exactly like whole strings."""
+
+import io
+import random
+
+import pytest
+
+from LexicalPd import LexicalAnalyzer
+
+# Fragments covering every token type, with the whitespace between them
+FRAGMENTS = (
+    "size 10x10", "size  12x8", "color red", "color #A0b1C2", "color\tblue", "point 1 2",
+    "point 3\n4", "rectangle 1 2 3 4", "rectangle 0 0\n 5 5", "repeat 3 {", "repeat\n2 {", "}",
+    "---", "clear", "pixel (1,2)", "line (0,0) to (3, 4)", "frame ( 1 , 2 ) (3,4)",
+    "circle (5,5) radius 2", "# a comment\n", "#00FF00", "123", "(", ")", ",", "red",
+)
+SEPARATORS = (" ", "  ", "\n", "\t", "\n\n", " \n ")
+
+
+def random_source(rng: random.Random) -> str:
+    """Returns a random source made of valid fragments."""
+    parts = []
+    for _ in range(rng.randint(1, 40)):
+        parts.append(rng.choice(FRAGMENTS))
+        parts.append(rng.choice(SEPARATORS))
+    return "".join(parts)
+
+
+def tokens(source, chunk_size: int = None) -> list:
+    """Returns the tokens of a source as comparable tuples."""
+    return [(token.type_, token.value, token.line, token.column)
+            for token in LexicalAnalyzer.iter_tokens(source, chunk_size)]
+
+
+def tokens_or_error(source, chunk_size: int = None):
+    """Returns the tokens of a source, or the message of its lexical error."""
+    try:
+        return tokens(source, chunk_size)
+    except RuntimeError as error:
+        return str(error)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 16, 1 << 16])
+def test_chunked_stream_matches_whole_string(chunk_size):
+    rng = random.Random(chunk_size)
+    for _ in range(200):
+        source = random_source(rng)
+        assert tokens_or_error(io.StringIO(source), chunk_size) == tokens_or_error(source), source
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 16])
+def test_chunked_stream_reports_the_same_error(chunk_size):
+    source = "size 4x4\npoint 1 1\n  point 2 $"
+    with pytest.raises(RuntimeError) as whole:
+        tokens(source)
+    with pytest.raises(RuntimeError) as chunked:
+        tokens(io.StringIO(source), chunk_size)
+    assert str(chunked.value) == str(whole.value) == "Unexpected token: '$' at line 3, column 11"
+
+
+def test_token_positions():
+    assert tokens("size 2x2\n  point 1 1 # comment\n}") == [
+        ("SIZE", "size 2x2", 1, 1),
+        ("POINT", "point 1 1", 2, 3),
+        ("REPEAT_END", "}", 3, 1),
+    ]
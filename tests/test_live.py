@@ -0,0 +1,104 @@
+"""Tests of live sessions: every edit leaves the canvas a full compile would draw."""
+
+import random
+
+import pytest
+
+from LexicalPd import LexicalAnalyzer
+from LivePD import LiveSession
+from SemanticPD import SemanticAnalyzer
+from SintacticPD import SintacticAnalyzerPixelDraw
+
+COLORS = ("red", "blue", "#00FF00", "black", "#123456")
+
+
+def random_line(rng: random.Random) -> str:
+    """Returns one random source line; repeat blocks may end up unbalanced."""
+    kind = rng.randrange(7)
+    if kind == 0:
+        return f"color {rng.choice(COLORS)}"
+    if kind == 1:
+        return f"point {rng.randrange(8)} {rng.randrange(8)}"
+    if kind == 2:
+        return f"rectangle {rng.randrange(6)} {rng.randrange(6)} {rng.randint(1, 3)} {rng.randint(1, 3)}"
+    if kind == 3:
+        return f"repeat {rng.randint(1, 3)} {{"
+    if kind == 4:
+        return "}"
+    if kind == 5:
+        return rng.choice(["clear", "---", "line (0,0) to (4,3)", "circle (3,3) radius 2"])
+    return rng.choice(["", "size 6x9", "size 8x8", "size 10x5"])
+
+
+def canvas(width: int, height: int, framebuffer) -> tuple:
+    """Returns the size and the color of every cell of a canvas."""
+    return width, height, [framebuffer.palette[index] for index in framebuffer.cells]
+
+
+def full_compile(code: str):
+    """Returns the canvas of a full compile, or the type of its error."""
+    try:
+        program = SintacticAnalyzerPixelDraw(LexicalAnalyzer.lex(code)).parse()
+        return canvas(*SemanticAnalyzer(program).analyze())
+    except Exception as error:  # pylint: disable=broad-except
+        return type(error)
+
+
+def live_update(session: LiveSession, code: str):
+    """Returns the canvas of a live session after an update, or the type of its error."""
+    try:
+        session.update(code)
+    except Exception as error:  # pylint: disable=broad-except
+        return type(error)
+    return canvas(session.width, session.height, session.framebuffer)
+
+
+def outside(box, width: int, height: int):
+    """Yields the offsets of the cells outside a (x0, y0, x1, y1) box."""
+    x0, y0, x1, y1 = box or (0, 0, 0, 0)
+    for y in range(height):
+        for x in range(width):
+            if not (x0 <= x < x1 and y0 <= y < y1):
+                yield y * width + x
+
+
+@pytest.mark.parametrize("seed", range(0, 400, 100))
+def test_edits_draw_like_a_full_compile(seed):
+    for case in range(seed, seed + 100):
+        rng = random.Random(case)
+        session = LiveSession()
+        # Small intervals so edits land between checkpoints
+        session.interval = session.MIN_CHECKPOINT_INTERVAL = 2
+        lines = ["size 8x8"] + [random_line(rng) for _ in range(20)]
+        for _ in range(15):
+            index = rng.randint(1, len(lines))
+            edit = rng.randrange(3)
+            if edit == 0 or index == len(lines):
+                lines.insert(index, random_line(rng))
+            elif edit == 1:
+                lines[index] = random_line(rng)
+            else:
+                del lines[index]
+            code = "\n".join(lines)
+            assert live_update(session, code) == full_compile(code), (case, code)
+
+
+def test_changed_box_covers_every_changed_cell():
+    for case in range(200):
+        rng = random.Random(case)
+        session = LiveSession()
+        session.interval = session.MIN_CHECKPOINT_INTERVAL = 2
+        lines = ["size 8x8"] + [random_line(rng) for _ in range(10)]
+        previous = None
+        for _ in range(10):
+            lines.insert(rng.randint(1, len(lines)), random_line(rng))
+            try:
+                box = session.update("\n".join(lines))
+            except Exception:  # pylint: disable=broad-except
+                previous = None
+                continue
+            current = canvas(session.width, session.height, session.framebuffer)
+            if previous is not None and previous[:2] == current[:2]:
+                for offset in outside(box, session.width, session.height):
+                    assert previous[2][offset] == current[2][offset], (case, lines)
+            previous = current
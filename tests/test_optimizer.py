@@ -0,0 +1,55 @@
+"""Tests of the occlusion optimizer: optimized programs draw the same framebuffer."""
+
+import random
+
+import pytest
+
+from CompilerPD import CompilerPixelDraw
+from LexicalPd import LexicalAnalyzer
+from OptimizerPD import OcclusionOptimizer
+from programs import random_statements
+from SemanticPD import SemanticAnalyzer
+from SintacticPD import SintacticAnalyzerPixelDraw
+
+
+def run(program: list):
+    """Returns the canvas size and painted pixels of a program, or its error message."""
+    try:
+        width, height, framebuffer = SemanticAnalyzer(program).analyze()
+    except Exception as error:  # pylint: disable=broad-except
+        return str(error)
+    return width, height, sorted(framebuffer.pixels())
+
+
+@pytest.mark.parametrize("seed", range(0, 600, 100))
+def test_optimized_programs_draw_the_same_canvas(seed):
+    saved = 0
+    for case in range(seed, seed + 100):
+        rng = random.Random(case)
+        code = "size 12x12 " + " ".join(random_statements(rng, count=rng.randint(3, 20)))
+        program = SintacticAnalyzerPixelDraw(LexicalAnalyzer.lex(code)).parse()
+        optimizer = OcclusionOptimizer()
+        optimized = optimizer.optimize(program)
+        assert run(optimized) == run(program), code
+        saved += optimizer.saved_writes
+    assert saved > 0
+
+
+def test_hidden_rectangle_is_dropped():
+    code = "size 4x4 color red rectangle 1 1 2 2 color blue rectangle 0 0 4 4"
+    program = SintacticAnalyzerPixelDraw(LexicalAnalyzer.lex(code)).parse()
+    optimizer = OcclusionOptimizer()
+    optimized = optimizer.optimize(program)
+    assert optimizer.saved_writes == 4
+    assert len(optimized) == len(program) - 1
+
+
+def test_optimizer_is_opt_in():
+    compiler = CompilerPixelDraw()
+    assert not compiler.optimize
+    code = "size 4x4 rectangle 1 1 2 2 rectangle 0 0 4 4"
+    compiler.rasterize(code)
+    assert compiler.saved_writes == 0
+    compiler.optimize = True
+    compiler.rasterize(code)
+    assert compiler.saved_writes == 4
@@ -0,0 +1,82 @@
+"""Tests of tiled rasterization: tiles give the same cells as serial drawing."""
+
+import random
+
+import pytest
+
+import CompilerPD
+from CompilerPD import CompilerPixelDraw
+from FramebufferPD import Framebuffer
+from LexicalPd import LexicalAnalyzer
+from ParallelPD import DisplayList, TiledRasterizer
+from SemanticPD import SemanticAnalyzer
+from SintacticPD import SintacticAnalyzerPixelDraw
+
+
+def random_program(rng: random.Random) -> list:
+    """Returns the instruction tree of a random drawing, resized between 32x24 and 40x30."""
+    statements = ["size 40x30"]
+    for _ in range(rng.randint(1, 60)):
+        kind = rng.random()
+        if kind < 0.2:
+            statements.append(f"color #{rng.randrange(1 << 24):06X}")
+        elif kind < 0.7:
+            x, y = rng.randrange(32), rng.randrange(24)
+            statements.append(f"rectangle {x} {y} {rng.randint(1, 32 - x)} {rng.randint(1, 24 - y)}")
+        elif kind < 0.8:
+            statements.append(f"point {rng.randrange(32)} {rng.randrange(24)}")
+        elif kind < 0.85:
+            statements.append(f"circle (16,12) radius {rng.randint(0, 11)}")
+        elif kind < 0.9:
+            start = f"({rng.randrange(32)},{rng.randrange(24)})"
+            statements.append(f"line {start} to ({rng.randrange(32)},{rng.randrange(24)})")
+        elif kind < 0.93:
+            statements.append("clear")
+        else:
+            statements.append(f"size {rng.randint(32, 40)}x{rng.randint(24, 30)}")
+    return SintacticAnalyzerPixelDraw(LexicalAnalyzer.lex(" ".join(statements))).parse()
+
+
+@pytest.fixture(scope="module")
+def rasterizer():
+    with TiledRasterizer(2, tile_cells=8) as tiled:
+        yield tiled
+
+
+def test_tiles_match_serial_drawing(rasterizer):  # pylint: disable=redefined-outer-name
+    for seed in range(60):
+        program = random_program(random.Random(seed))
+        _width, _height, serial = SemanticAnalyzer(program).analyze()
+        _width, _height, display_list = SemanticAnalyzer(program, framebuffer_factory=DisplayList).analyze()
+        tiled = rasterizer.rasterize(display_list)
+        assert (tiled.width, tiled.height) == (serial.width, serial.height)
+        assert tiled.palette == serial.palette
+        assert tiled.cells == serial.cells, seed
+
+
+def test_compiler_reuses_the_pool(monkeypatch):
+    monkeypatch.setattr(CompilerPD, "PARALLEL_MIN_CELLS", 0)
+    monkeypatch.setattr(CompilerPD, "PARALLEL_MIN_WRITES", 0)
+    monkeypatch.setattr(CompilerPD.os, "cpu_count", lambda: 2)
+    compiler = CompilerPixelDraw()
+    compiler.raster_workers = 2
+    try:
+        _width, _height, first = compiler.rasterize("size 8x8 color red rectangle 0 0 8 4")
+        rasterizer = compiler._rasterizer  # pylint: disable=protected-access
+        _width, _height, second = compiler.rasterize("size 8x8 color blue rectangle 0 4 8 4")
+        assert compiler._rasterizer is rasterizer  # pylint: disable=protected-access
+    finally:
+        compiler.close()
+    assert isinstance(first, Framebuffer) and not isinstance(first, DisplayList)
+    assert first.get_pixel(0, 0) == 0xFF0000 and second.get_pixel(0, 7) == 0x0000FF
+
+
+def test_single_cpu_draws_serially(monkeypatch):
+    monkeypatch.setattr(CompilerPD, "PARALLEL_MIN_CELLS", 0)
+    monkeypatch.setattr(CompilerPD, "PARALLEL_MIN_WRITES", 0)
+    monkeypatch.setattr(CompilerPD.os, "cpu_count", lambda: 1)
+    compiler = CompilerPixelDraw()
+    compiler.raster_workers = 2
+    compiler.rasterize("size 8x8 rectangle 0 0 8 8")
+    assert not compiler.use_tiles()
+    assert compiler._rasterizer is None  # pylint: disable=protected-access
@@ -0,0 +1,79 @@
+"""Tests of the syntactic analyzer: instruction trees, error positions and the lazy parser."""
+
+import random
+
+import pytest
+
+from InstructionsPD import Circle, Clear, Color, Frame, FrameBreak, Line, Point, Rectangle, Repeat, Size
+from LexicalPd import LexicalAnalyzer
+from programs import random_statements
+from SintacticPD import ParseError, SintacticAnalyzerPixelDraw
+
+# Fragments that are not whole instructions, to get parse errors
+FRAGMENTS = ("(", ")", ",", "5", "to", "radius", "red", "pixel", "line (1,2)", "circle (1,1) radius",
+             "frame (1,1)", "}", "repeat 2 {")
+
+
+def parser(code: str, trace=None) -> SintacticAnalyzerPixelDraw:
+    """Returns a parser of a source."""
+    return SintacticAnalyzerPixelDraw(LexicalAnalyzer.lex(code), trace)
+
+
+def parse_all(code: str, lazy: bool) -> tuple:
+    """Returns (nodes or error message, trace messages) of parse() or iter_instructions()."""
+    messages = []
+    analyzer = parser(code, messages.append)
+    try:
+        nodes = list(analyzer.iter_instructions()) if lazy else analyzer.parse()
+    except ParseError as error:
+        return str(error), messages
+    return nodes, messages
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("size 10x5", [Size(10, 5)]),
+    ("color red color #AaBbCc", [Color("red"), Color("#AaBbCc")]),
+    ("point 1 2 rectangle 1 2 3 4", [Point(1, 2), Rectangle(1, 2, 3, 4)]),
+    ("clear ---", [Clear(), FrameBreak()]),
+    ("pixel ( 3 , 4 ) pixel (5,6)", [Point(3, 4), Point(5, 6)]),
+    ("line (1,2) to (3,4)", [Line(1, 2, 3, 4)]),
+    ("frame (1,1) (2,3)", [Frame(1, 1, 2, 3)]),
+    ("circle (3,3) radius 2", [Circle(3, 3, 2)]),
+    ("repeat 2 { point 0 0 repeat 0 { } } point 1 1", [Repeat(2, [Point(0, 0), Repeat(0, [])]), Point(1, 1)]),
+    ("# only a comment\n", []),
+])
+def test_instruction_trees(code, expected):
+    assert parser(code).parse() == expected
+    assert list(parser(code).iter_instructions()) == expected
+
+
+@pytest.mark.parametrize("code, expected, found, line, column", [
+    ("size 2x2\n  )", "valid instruction", ")", 2, 3),
+    ("}", "valid instruction", "}", 1, 1),
+    ("pixel (1 2)", "COMMA", "2", 1, 10),
+    ("size 2x2\nline (1,2) (3,4)", "TO", "(", 2, 12),
+    ("frame (1,1)\n  red", "LPAREN", "red", 2, 3),
+    ("repeat 2 {\n point 1 1", "} (repeat block end)", None, None, None),
+    ("line (1,2)", "TO", None, None, None),
+    ("circle (1,1) radius\n", "NUMBER", None, None, None),
+])
+def test_errors_report_what_was_expected_and_where(code, expected, found, line, column):
+    with pytest.raises(ParseError) as error:
+        parser(code).parse()
+    assert error.value.expected == expected
+    assert (error.value.line, error.value.column) == (line, column)
+    if found is None:
+        assert error.value.token is None
+    else:
+        assert error.value.token.value == found
+    assert str(error.value) == f"Sintax error: expected {expected}, but found {error.value.token}"
+
+
+def test_lazy_parser_matches_parse():
+    for case in range(2000):
+        rng = random.Random(case)
+        statements = random_statements(rng, count=rng.randint(0, 12))
+        if rng.random() < 0.5:
+            statements.insert(rng.randint(0, len(statements)), rng.choice(FRAGMENTS))
+        code = "\n".join(statements)
+        assert parse_all(code, lazy=True) == parse_all(code, lazy=False), code
@@ -0,0 +1,56 @@
+"""Tests of the semantic analyzer of PixelDraw."""
+
+from LexicalPd import LexicalAnalyzer
+from SemanticPD import SemanticAnalyzer
+from SintacticPD import SintacticAnalyzerPixelDraw
+
+RED = 0xFF0000
+
+
+def analyze(code: str, **options):
+    """Runs a source through the three phases, returns (analyzer, width, height, framebuffer)."""
+    program = SintacticAnalyzerPixelDraw(LexicalAnalyzer.lex(code)).parse()
+    analyzer = SemanticAnalyzer(program, **options)
+    width, height, framebuffer = analyzer.analyze()
+    return analyzer, width, height, framebuffer
+
+
+def test_second_size_keeps_the_cells_that_fit():
+    code = "size 6x6 color red rectangle 0 0 6 6 size 4x8 point 0 7"
+    analyzer, width, height, framebuffer = analyze(code, keep_pixels=True)
+    assert (width, height) == (4, 8)
+    pixels = {(x, y): color for x, y, color in framebuffer.pixels()}
+    assert pixels == {**{(x, y): RED for x in range(4) for y in range(6)}, (0, 7): RED}
+    # The pixel log agrees with the framebuffer
+    assert {(x, y): color for x, y, color in analyzer.pixels} == pixels
+
+
+def test_repeating_the_size_changes_nothing():
+    _analyzer, _width, _height, framebuffer = analyze("size 3x3 point 1 1 size 3x3")
+    assert list(framebuffer.pixels()) == [(1, 1, 0x000000)]
+
+
+def test_shrinking_drops_the_cells_outside():
+    _analyzer, _width, _height, framebuffer = analyze("size 5x5 point 4 4 point 0 0 size 2x2 size 5x5")
+    assert list(framebuffer.pixels()) == [(0, 0, 0x000000)]
+
+
+def test_repeat_restores_the_color_after_every_iteration():
+    code = "size 3x3 repeat 2 { color white point 0 2 color #00FF00 } point 0 0"
+    for keep_pixels in (False, True):
+        _analyzer, _width, _height, framebuffer = analyze(code, keep_pixels=keep_pixels)
+        assert framebuffer.get_pixel(0, 0) == 0x000000
+        assert framebuffer.get_pixel(0, 2) == 0xFFFFFF
+
+
+def test_repeat_restores_the_canvas_size():
+    code = "size 4x4 repeat 2 { size 2x2 point 1 1 } point 3 3"
+    _analyzer, width, height, framebuffer = analyze(code)
+    assert (width, height) == (4, 4)
+    assert sorted(framebuffer.pixels()) == [(1, 1, 0x000000), (3, 3, 0x000000)]
+
+
+def test_idempotent_iterations_are_skipped():
+    analyzer, _width, _height, _framebuffer = analyze("size 4x4 repeat 5 { color red point 1 1 }")
+    assert analyzer.skipped_iterations == 4
+    assert analyzer.pixel_writes == 1
@@ -0,0 +1,69 @@
+"""Tests of sparse canvases: they hold the same cells as dense framebuffers."""
+
+import random
+
+import pytest
+
+from CompilerPD import CompilerPixelDraw
+from FramebufferPD import Framebuffer
+from LexicalPd import LexicalAnalyzer
+from SemanticPD import SemanticAnalyzer
+from SintacticPD import SintacticAnalyzerPixelDraw
+from SparsePD import SparseFramebuffer
+
+
+def random_program(rng: random.Random) -> list:
+    """Returns the instruction tree of a random drawing on a 50x35 canvas."""
+    statements = ["size 50x35"]
+    for _ in range(rng.randint(1, 40)):
+        kind = rng.random()
+        if kind < 0.2:
+            statements.append(f"color {rng.choice(['red', 'blue', 'white', '#123456'])}")
+        elif kind < 0.7:
+            x, y = rng.randrange(50), rng.randrange(35)
+            statements.append(f"rectangle {x} {y} {rng.randint(1, 50 - x)} {rng.randint(1, 35 - y)}")
+        elif kind < 0.85:
+            statements.append(f"point {rng.randrange(50)} {rng.randrange(35)}")
+        elif kind < 0.9:
+            corner = f"({rng.randrange(25)},{rng.randrange(17)})"
+            statements.append(f"frame {corner} ({rng.randint(1, 25)},{rng.randint(1, 18)})")
+        elif kind < 0.93:
+            statements.append("clear")
+        else:
+            statements.append(f"circle (25,17) radius {rng.randint(0, 17)}")
+    return SintacticAnalyzerPixelDraw(LexicalAnalyzer.lex(" ".join(statements))).parse()
+
+
+@pytest.mark.parametrize("chunk_cells", [1, 4, 16, 64])
+def test_sparse_matches_dense(chunk_cells, tmp_path):
+    for seed in range(40):
+        program = random_program(random.Random(seed))
+        _width, _height, dense = SemanticAnalyzer(program).analyze()
+        spill_dir = str(tmp_path) if seed % 2 else None
+        _width, _height, sparse = SemanticAnalyzer(
+            program, framebuffer_factory=lambda w, h: SparseFramebuffer(w, h, chunk_cells, spill_dir)).analyze()
+        expected = [dense.row(y) for y in range(dense.height)]
+        assert [list(sparse.row(y)) for y in range(35)] == [list(row) for row in expected], seed
+        assert sorted(sparse.pixels()) == sorted(dense.pixels())
+        assert sparse.painted_cells() == dense.painted_cells()
+        sparse.compact()
+        assert sparse.to_bytes() == Framebuffer.from_bytes(sparse.to_bytes()).to_bytes()
+        assert sorted(Framebuffer.from_bytes(sparse.to_bytes()).pixels()) == sorted(dense.pixels())
+
+
+def test_untouched_chunks_are_not_stored():
+    canvas = SparseFramebuffer(1 << 20, 1 << 20, chunk_cells=256)
+    canvas.fill_rect(1000, 1000, 600, 2, 0xFF0000)
+    assert canvas.materialized == 4
+    assert canvas.get_pixel(1599, 1001) == 0xFF0000
+    assert canvas.get_pixel(0, 0) is None
+    canvas.fill_rect(768, 768, 256, 256, 0x00FF00)
+    assert canvas.uniform_index(768, 768, 1024, 1024) == canvas.color_index(0x00FF00)
+
+
+def test_compiler_uses_a_sparse_canvas_above_the_dense_limit():
+    compiler = CompilerPixelDraw()
+    compiler.max_dense_cells = 100
+    _width, _height, framebuffer = compiler.rasterize("size 100x100 color red point 99 99")
+    assert isinstance(framebuffer, SparseFramebuffer)
+    assert list(framebuffer.pixels()) == [(99, 99, 0xFF0000)]